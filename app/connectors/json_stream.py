@@ -0,0 +1,87 @@
+# app/connectors/json_stream.py
+import codecs
+import json
+import os
+from typing import Any, List
+
+# A single array element larger than this is treated as a malformed export rather than buffered
+MAX_ELEMENT_BYTES = int(os.getenv("ONEROSTER_STREAM_MAX_ELEMENT_MB", "16")) * 1024 * 1024
+
+_WHITESPACE = " \t\n\r"
+_NUMBER_CHARS = frozenset("0123456789+-.eE")
+_decoder = json.JSONDecoder()
+
+
+class JsonArrayParser:
+    """
+    Incremental parser for a top-level JSON array: feed it the body chunk by chunk and it hands
+    back each element as soon as its last byte has arrived. Only the unparsed tail (at most one
+    partial element plus one chunk) is buffered, so memory doesn't grow with the payload.
+    Elements are decoded by json's C scanner (raw_decode); only the gaps between them are
+    walked in Python.
+    """
+
+    def __init__(self, max_element_bytes: int = MAX_ELEMENT_BYTES):
+        self.max_element_bytes = max_element_bytes
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._state = "start"  # start -> first (after '[') -> separator <-> element -> done
+        self.count = 0
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """Parses another chunk of the body; returns the elements completed by it."""
+        self._buffer += self._text.decode(chunk)
+        return self._parse(final=False)
+
+    def close(self) -> List[Any]:
+        """Ends the body; returns any last elements. Raises ValueError if the array isn't complete."""
+        self._buffer += self._text.decode(b"", final=True)
+        elements = self._parse(final=True)
+        if self._state != "done":
+            raise ValueError(f"JSON array ended early after {self.count} elements")
+        return elements
+
+    def _parse(self, final: bool) -> List[Any]:
+        elements: List[Any] = []
+        buffer, pos, end = self._buffer, 0, len(self._buffer)
+        while True:
+            while pos < end and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos == end:
+                break
+            char = buffer[pos]
+            if self._state == "done":
+                raise ValueError(f"Unexpected data after the JSON array at element {self.count}")
+            if self._state == "start":
+                if char != "[":
+                    raise ValueError("Expected a JSON array")
+                self._state, pos = "first", pos + 1
+            elif self._state == "separator" or (self._state == "first" and char == "]"):
+                if char == "]":
+                    self._state, pos = "done", pos + 1
+                elif char == "," and self._state == "separator":
+                    self._state, pos = "element", pos + 1
+                else:
+                    raise ValueError(f"Expected ',' or ']' after JSON array element {self.count}")
+            else:
+                try:
+                    value, value_end = _decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if final:
+                        raise
+                    break  # Element not complete yet
+                # A number may continue in the next chunk: raw_decode takes the longest valid prefix,
+                # so "1." or "1.5e" decode as 1 and 1.5 with the rest of the number still to come
+                if not final and isinstance(value, (int, float)) and not isinstance(value, bool):
+                    tail = value_end
+                    while tail < end and buffer[tail] in _NUMBER_CHARS:
+                        tail += 1
+                    if tail == end:
+                        break
+                elements.append(value)
+                self.count += 1
+                self._state, pos = "separator", value_end
+        self._buffer = buffer[pos:]
+        if len(self._buffer) > self.max_element_bytes:
+            raise ValueError(f"JSON array element {self.count} exceeds {self.max_element_bytes} bytes")
+        return elements
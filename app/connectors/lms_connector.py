@@ -1,71 +1,45 @@
 # app/connectors/lms_connector.py
-import httpx
-from typing import List, Dict, Any, Tuple
+import asyncio
+from typing import List, Dict, Any, Optional
+from app.connectors.source_transport import get_transport
 from app.models.oneroster_models import User, Course, RoleType, StatusType
+from app.models.change_models import SourceChangeEvent, ChangeOperation
 
 # We might not create all OneRoster entities from LMS if SIS is primary.
 # For example, LMS might just give us users and its own course view.
 
-# Base URL for your FastAPI app (where mock services are running)
-MOCK_API_BASE_URL = "http://127.0.0.1:8006"  # Or your actual port
 
-
-async def fetch_lms_data() -> Tuple[List[Dict], List[Dict]]:
-    """Fetches all necessary data from the mock LMS."""
-    async with httpx.AsyncClient() as client:
-        print(f"Fetching LMS users from: {MOCK_API_BASE_URL}/mock/lms/users")
-        users_resp = await client.get(f"{MOCK_API_BASE_URL}/mock/lms/users")
-        print(f"LMS Users response status: {users_resp.status_code}")
-        print(f"LMS Users response content: {users_resp.text}")
-        users_resp.raise_for_status()
-
-        print(f"Fetching LMS courses from: {MOCK_API_BASE_URL}/mock/lms/courses")
-        courses_resp = await client.get(f"{MOCK_API_BASE_URL}/mock/lms/courses")
-        print(f"LMS Courses response status: {courses_resp.status_code}")
-        print(f"LMS Courses response content: {courses_resp.text}")
-        courses_resp.raise_for_status()
-
-        try:
-            lms_users = users_resp.json()
-            lms_courses = courses_resp.json()
-        except Exception as e:
-            print(f"LMS JSON parsing error: {e}")
-            raise
-
-        return lms_users, lms_courses
+def transform_lms_user(lms_user: Dict) -> User:
+    # Determine OneRoster role from LMS role
+    role = RoleType.STUDENT  # Default
+    if lms_user.get("role", "").lower() == "instructor":
+        role = RoleType.TEACHER
+    elif lms_user.get("role", "").lower() == "student":
+        role = RoleType.STUDENT
+
+    # Simple name parsing if full_name is provided
+    given_name = lms_user.get("full_name", "").split(" ")[0] if lms_user.get("full_name") else "Unknown"
+    family_name = " ".join(lms_user.get("full_name", "").split(" ")[1:]) if lms_user.get(
+        "full_name") and " " in lms_user.get("full_name") else "User"
+
+    return User(
+        sourcedId=f"lms_user_{lms_user['lms_username']}",  # Use LMS username for sourcedId prefix
+        username=lms_user['lms_username'],
+        givenName=given_name,
+        familyName=family_name,
+        email=lms_user.get('email'),
+        role=role,
+        identifier=lms_user['lms_username'],  # Could be different in a real scenario
+        status=StatusType.ACTIVE,
+        # agentSourcedIds and grades would typically come from SIS,
+        # unless LMS is authoritative for some school/program.
+        # For now, we leave them empty or default.
+        agentSourcedIds=[],
+    )
 
 
 def transform_lms_users(lms_users_data: List[Dict]) -> List[User]:
-    oneroster_lms_users: List[User] = []
-    for lms_user in lms_users_data:
-        # Determine OneRoster role from LMS role
-        role = RoleType.STUDENT  # Default
-        if lms_user.get("role", "").lower() == "instructor":
-            role = RoleType.TEACHER
-        elif lms_user.get("role", "").lower() == "student":
-            role = RoleType.STUDENT
-
-        # Simple name parsing if full_name is provided
-        given_name = lms_user.get("full_name", "").split(" ")[0] if lms_user.get("full_name") else "Unknown"
-        family_name = " ".join(lms_user.get("full_name", "").split(" ")[1:]) if lms_user.get(
-            "full_name") and " " in lms_user.get("full_name") else "User"
-
-        user = User(
-            sourcedId=f"lms_user_{lms_user['lms_username']}",  # Use LMS username for sourcedId prefix
-            username=lms_user['lms_username'],
-            givenName=given_name,
-            familyName=family_name,
-            email=lms_user.get('email'),
-            role=role,
-            identifier=lms_user['lms_username'],  # Could be different in a real scenario
-            status=StatusType.ACTIVE,
-            # agentSourcedIds and grades would typically come from SIS,
-            # unless LMS is authoritative for some school/program.
-            # For now, we leave them empty or default.
-            agentSourcedIds=[],
-        )
-        oneroster_lms_users.append(user)
-    return oneroster_lms_users
+    return [transform_lms_user(lms_user) for lms_user in lms_users_data]
 
 
 def transform_lms_courses(lms_courses_data: List[Dict]) -> List[Course]:
@@ -100,19 +74,92 @@ def transform_lms_courses(lms_courses_data: List[Dict]) -> List[Course]:
     return oneroster_lms_courses
 
 
+def transform_lms_memberships(lms_courses_data: List[Dict]) -> List[Dict[str, Any]]:
+    """
+    Flattens LMS course rosters (teacher + enrolled students) into membership rows.
+    These can't become OneRoster enrollments on their own (the LMS doesn't know SIS classes);
+    the reconciliation stage links them to SIS classes and users.
+    """
+    memberships: List[Dict[str, Any]] = []
+    for lms_course in lms_courses_data:
+        roster = [(username, RoleType.STUDENT) for username in lms_course.get("student_usernames_enrolled", [])]
+        if lms_course.get("lms_teacher_username"):
+            roster.insert(0, (lms_course["lms_teacher_username"], RoleType.TEACHER))
+        for username, role in roster:
+            memberships.append({
+                "lmsCourseId": lms_course["lms_course_id"],
+                "lmsCourseSourcedId": f"lms_course_{lms_course['lms_course_id']}",
+                "lmsUsername": username,
+                "lmsUserSourcedId": f"lms_user_{username}",
+                "role": role,
+            })
+    return memberships
+
+
 async def process_lms_to_oneroster_like_data() -> Dict[str, List[Any]]:
     """
     Main function for LMS connector: fetches and transforms LMS data
     into a structure resembling OneRoster entities.
     """
-    lms_users_data, lms_courses_data = await fetch_lms_data()
-
-    oneroster_like_lms_users = transform_lms_users(lms_users_data)
+    transport = get_transport("lms")
+    oneroster_like_lms_users: List[User] = []
+
+    async def stream_users() -> None:
+        # Users are the bulk of the export: transform each one as soon as it has been parsed
+        async for lms_user in transport.iter_json_array("/mock/lms/users"):
+            oneroster_like_lms_users.append(transform_lms_user(lms_user))
+
+    # Courses are walked twice below (courses and rosters), so they are read as a whole
+    _, lms_courses_data = await asyncio.gather(stream_users(), transport.get_json("/mock/lms/courses"))
+    print(f"Fetched {len(oneroster_like_lms_users)} LMS users and {len(lms_courses_data)} LMS courses "
+          f"via {transport.name} transport.")
     oneroster_like_lms_courses = transform_lms_courses(lms_courses_data)
 
-    # For this phase, we're not creating LMS-specific OneRoster enrollments or classes
-    # as SIS is considered primary for those. This data is mostly for potential user/course matching.
+    # We're not creating LMS-specific OneRoster classes, as SIS is considered primary for those.
+    # LMS course rosters are handed over as memberships and reconciled against SIS classes.
+    # Already validated while transforming; handed over as models, not re-validated dicts
     return {
-        "users": [user.model_dump() for user in oneroster_like_lms_users],
-        "courses": [course.model_dump() for course in oneroster_like_lms_courses],
-    }
\ No newline at end of file
+        "users": oneroster_like_lms_users,
+        "courses": oneroster_like_lms_courses,
+        "memberships": transform_lms_memberships(lms_courses_data),
+    }
+
+
+async def fetch_lms_roster(lms_data: Optional[Dict[str, List[Any]]] = None) -> Dict[str, List[Any]]:
+    """
+    Everything the LMS provides refreshes as roster data: its course records carry the course
+    rosters (memberships), which change as often as the users do.
+    """
+    return await process_lms_to_oneroster_like_data()
+
+
+def apply_lms_changes(lms_data: Dict[str, List[Any]], events: List[SourceChangeEvent]) -> Dict[str, List[Any]]:
+    """
+    Applies record-level LMS change events to previously transformed LMS data
+    (the output of process_lms_to_oneroster_like_data), re-transforming only the affected records.
+    Returns a new dict; the input lists are not modified.
+    """
+    dropped_user_ids, dropped_course_ids = set(), set()
+    upserted_users: List[Dict] = []
+    upserted_courses: List[Dict] = []
+
+    for event in events:
+        is_upsert = event.operation == ChangeOperation.UPSERT and event.record is not None
+        if event.entity == "users":
+            dropped_user_ids.add(f"lms_user_{event.key}")
+            if is_upsert:
+                upserted_users.append(event.record)
+        elif event.entity == "courses":
+            dropped_course_ids.add(f"lms_course_{event.key}")
+            if is_upsert:
+                upserted_courses.append(event.record)
+        else:
+            print(f"Warning: Ignoring LMS change for unknown entity '{event.entity}'")
+
+    users = [u for u in lms_data.get("users", []) if u.sourcedId not in dropped_user_ids]
+    users += transform_lms_users(upserted_users)
+    courses = [c for c in lms_data.get("courses", []) if c.sourcedId not in dropped_course_ids]
+    courses += transform_lms_courses(upserted_courses)
+    memberships = [m for m in lms_data.get("memberships", []) if m["lmsCourseSourcedId"] not in dropped_course_ids]
+    memberships += transform_lms_memberships(upserted_courses)
+    return {"users": users, "courses": courses, "memberships": memberships}
\ No newline at end of file
@@ -1,8 +1,93 @@
 # app/connectors/oneroster_processor.py
-from typing import Dict, List, Any
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 from app.connectors import sis_connector
 from app.connectors import lms_connector  # Import the new LMS connector
+from app.connectors.reconciliation import reconcile_lms_with_sis
 from app.models.oneroster_models import ProcessedOneRosterData, User as OneRosterUser, Course as OneRosterCourse
+from app.models.change_models import SourceChangeEvent
+
+
+# Counts from the last SIS/LMS reconciliation run (see reconcile_lms_with_sis)
+last_reconciliation_report: Dict[str, Any] = {}
+
+# Inputs and outputs of each merge stage in the last merge. A stage whose inputs are the very same
+# lists again (their segment wasn't refreshed) hands back its previous outputs, so e.g. a roster
+# refresh doesn't re-run anything that only depends on orgs, and reused output records are also
+# what lets the stamping skip re-hashing them.
+_stage_memo: Dict[str, Tuple[Tuple[Any, ...], Any]] = {}
+
+
+def _memoized(stage: str, inputs: Tuple[Any, ...], compute: Callable[[Optional[Any]], Any]) -> Any:
+    # compute gets the stage's previous outputs (None on the first run), to reuse what is unchanged
+    memo = _stage_memo.get(stage)
+    if memo is not None and len(memo[0]) == len(inputs) and all(a is b for a, b in zip(memo[0], inputs)):
+        return memo[1]
+    result = compute(memo[1] if memo is not None else None)
+    _stage_memo[stage] = (inputs, result)
+    return result
+
+# Fetch-and-transform entry point of each source system's connector
+SOURCE_PROCESSORS = {
+    "sis": sis_connector.process_sis_to_oneroster,  # Considered primary for OneRoster structure
+    "lms": lms_connector.process_lms_to_oneroster_like_data,  # OneRoster-like structures for matching
+}
+
+
+# Refresh segments: groups of entity types that change at a similar rate and are refetched on
+# their own schedule (reference: orgs/academicSessions, catalog: courses/classes, roster:
+# users/enrollments). Per source, the fetch-and-transform of each segment it provides; each one
+# gets the source's current data (for lookups into other segments) and returns the lists it replaces.
+SOURCE_SEGMENTS: Dict[str, Dict[str, Callable[..., Awaitable[Dict[str, List[Any]]]]]] = {
+    "sis": {
+        "reference": sis_connector.fetch_sis_reference,
+        "catalog": sis_connector.fetch_sis_catalog,
+        "roster": sis_connector.fetch_sis_roster,
+    },
+    "lms": {"roster": lms_connector.fetch_lms_roster},
+}
+
+
+async def fetch_source(source: str) -> Dict[str, List[Any]]:
+    """Fetches and transforms the data of a single source system."""
+    return await SOURCE_PROCESSORS[source]()
+
+
+async def fetch_source_segment(source: str, segment: str, current: Dict[str, List[Any]]) -> Dict[str, List[Any]]:
+    """
+    Fetches one refresh segment of a source: the entity lists that replace those in `current`.
+    The lists of the other segments stay the very same objects, which is what lets
+    merge_source_data() skip the stages that only depend on them.
+    """
+    return await SOURCE_SEGMENTS[source][segment](current)
+
+
+async def fetch_source_data() -> Dict[str, Dict[str, List[Any]]]:
+    """
+    Fetches and transforms data from every source system, keyed by source name.
+    The result is what merge_source_data() consolidates, and what incremental
+    change events are applied to between full syncs.
+    """
+    sources = list(SOURCE_PROCESSORS)
+    results = await asyncio.gather(*(fetch_source(source) for source in sources))
+    return dict(zip(sources, results))
+
+
+def apply_source_events(
+        source_data: Dict[str, Dict[str, List[Any]]], events: List[SourceChangeEvent]
+) -> Dict[str, Dict[str, List[Any]]]:
+    """
+    Applies pushed record-level change events to the per-source data from fetch_source_data(),
+    without refetching anything. Feed the result to merge_source_data() for a new snapshot.
+    """
+    updated = dict(source_data)
+    sis_events = [e for e in events if e.source == "sis"]
+    lms_events = [e for e in events if e.source == "lms"]
+    if sis_events:
+        updated["sis"] = sis_connector.apply_sis_changes(source_data.get("sis", {}), sis_events)
+    if lms_events:
+        updated["lms"] = lms_connector.apply_lms_changes(source_data.get("lms", {}), lms_events)
+    return updated
 
 
 async def get_processed_oneroster_data() -> ProcessedOneRosterData:
@@ -10,14 +95,20 @@ async def get_processed_oneroster_data() -> ProcessedOneRosterData:
     Orchestrates fetching and transforming data from all source systems
     and returns a consolidated OneRoster dataset.
     """
-    # Fetch and transform SIS data (considered primary for OneRoster structure)
-    sis_oneroster_data_dict = await sis_connector.process_sis_to_oneroster()
+    return merge_source_data(await fetch_source_data())
 
-    # Fetch and transform LMS data into OneRoster-like structures
-    lms_oneroster_like_data_dict = await lms_connector.process_lms_to_oneroster_like_data()
 
-    lms_users: List[OneRosterUser] = [OneRosterUser(**u) for u in lms_oneroster_like_data_dict.get("users", [])]
-    lms_courses: List[OneRosterCourse] = [OneRosterCourse(**c) for c in lms_oneroster_like_data_dict.get("courses", [])]
+def merge_source_data(source_data: Dict[str, Dict[str, List[Any]]]) -> ProcessedOneRosterData:
+    """
+    Consolidates the per-source OneRoster data into a single dataset (SIS is primary).
+    """
+    sis_oneroster_data_dict = source_data.get("sis", {})
+    lms_oneroster_like_data_dict = source_data.get("lms", {})
+
+    # Connectors validate at the source boundary and hand over typed models, which are
+    # trusted from here on: no re-parsing, and the container is built with model_construct.
+    lms_users: List[OneRosterUser] = lms_oneroster_like_data_dict.get("users", [])
+    lms_courses: List[OneRosterCourse] = lms_oneroster_like_data_dict.get("courses", [])
 
     print(f"Retrieved {len(lms_users)} users from LMS connector.")
     print(f"Retrieved {len(lms_courses)} courses from LMS connector.")
@@ -26,38 +117,66 @@ async def get_processed_oneroster_data() -> ProcessedOneRosterData:
     # This is where you would implement logic to:
     # 1. Match users from SIS and LMS (e.g., by email, or a common identifier).
     # 2. Merge or augment user profiles (e.g., add LMS username to SIS user metadata).
-    # 3. Match courses between SIS and LMS.
+    # 3. Match courses between SIS and LMS (done by reconcile_lms_with_sis below).
     # 4. Decide on the authoritative source for conflicting information.
     #
     # For this PoC phase, we will primarily use the SIS-derived OneRoster data as the base.
-    # The LMS data is fetched and transformed but not deeply integrated into the final output yet.
-    # We could, for example, add LMS metadata to SIS users if a match is found.
+    # LMS users are matched to SIS users, and LMS courses/rosters are reconciled against SIS classes.
 
     # Example: Add LMS username as metadata to matched SIS users (very basic matching by email)
-    final_users_list = []
-    sis_users_from_dict = sis_oneroster_data_dict.get("users", [])
+    sis_users: List[OneRosterUser] = sis_oneroster_data_dict.get("users", [])
+    final_users_list, sis_user_id_by_lms_user_id = _memoized(
+        "users", (sis_users, lms_users), lambda previous: _match_users(sis_users, lms_users))
 
-    for sis_user_dict in sis_users_from_dict:
-        sis_user_obj = OneRosterUser(**sis_user_dict)
-        matched_lms_user = next((lms_u for lms_u in lms_users if
-                                 lms_u.email and sis_user_obj.email and lms_u.email.lower() == sis_user_obj.email.lower()),
-                                None)
-        if matched_lms_user:
-            if sis_user_obj.metadata is None:
-                sis_user_obj.metadata = {}
-            sis_user_obj.metadata["lms_username"] = matched_lms_user.username
-            sis_user_obj.metadata["lms_sourcedId"] = matched_lms_user.sourcedId
-            print(f"Matched SIS user {sis_user_obj.sourcedId} with LMS user {matched_lms_user.sourcedId} by email.")
-        final_users_list.append(sis_user_obj.model_dump())  # Convert back to dict for ProcessedOneRosterData
+    # Link LMS courses and rosters to SIS courses/classes and merge LMS-only enrollments
+    global last_reconciliation_report
+    reconciliation_inputs = (
+        sis_oneroster_data_dict.get("courses", []),
+        sis_oneroster_data_dict.get("classes", []),
+        sis_oneroster_data_dict.get("enrollments", []),
+        lms_courses,
+        lms_oneroster_like_data_dict.get("memberships", []),
+        sis_user_id_by_lms_user_id,
+    )
+    courses, classes, enrollments, last_reconciliation_report, _ = _memoized(
+        "reconciliation", reconciliation_inputs,
+        lambda previous: reconcile_lms_with_sis(*reconciliation_inputs, previous=previous[4] if previous else None))
+    print(f"SIS/LMS reconciliation: {last_reconciliation_report}")
 
     # For other entities, we're still using SIS as primary for now
-    processed_data = ProcessedOneRosterData(
-        orgs=sis_oneroster_data_dict.get("orgs", []),
+    processed_data = ProcessedOneRosterData.model_construct(
+        orgs=list(sis_oneroster_data_dict.get("orgs", [])),
         users=final_users_list,  # Use the potentially augmented user list
-        courses=sis_oneroster_data_dict.get("courses", []),  # Could also try to merge/augment courses
-        classes=sis_oneroster_data_dict.get("classes", []),
-        enrollments=sis_oneroster_data_dict.get("enrollments", []),
-        academicSessions=sis_oneroster_data_dict.get("academicSessions", [])
+        courses=courses,
+        classes=classes,
+        enrollments=enrollments,
+        academicSessions=list(sis_oneroster_data_dict.get("academicSessions", []))
     )
 
-    return processed_data
\ No newline at end of file
+    return processed_data
+
+def _match_users(sis_users: List[OneRosterUser],
+                 lms_users: List[OneRosterUser]) -> Tuple[List[OneRosterUser], Dict[str, str]]:
+    """
+    SIS users, with the LMS username and sourcedId added to the metadata of those matched to an
+    LMS user by email, plus the LMS user -> SIS user match index (also used for LMS rosters).
+    """
+    # Index LMS users by email once, instead of scanning all of them for every SIS user
+    lms_users_by_email = {lms_u.email.lower(): lms_u for lms_u in reversed(lms_users) if lms_u.email}
+    final_users_list = []
+    sis_user_id_by_lms_user_id: Dict[str, str] = {}
+    matched_count = 0
+
+    for sis_user_obj in sis_users:
+        matched_lms_user = lms_users_by_email.get(sis_user_obj.email.lower()) if sis_user_obj.email else None
+        if matched_lms_user:
+            # Copy instead of mutating: the per-source user is reused by later merges
+            metadata = dict(sis_user_obj.metadata or {})
+            metadata["lms_username"] = matched_lms_user.username
+            metadata["lms_sourcedId"] = matched_lms_user.sourcedId
+            sis_user_obj = sis_user_obj.model_copy(update={"metadata": metadata})
+            sis_user_id_by_lms_user_id.setdefault(matched_lms_user.sourcedId, sis_user_obj.sourcedId)
+            matched_count += 1
+        final_users_list.append(sis_user_obj)
+    print(f"Matched {matched_count} SIS users with LMS users by email.")
+    return final_users_list, sis_user_id_by_lms_user_id
@@ -0,0 +1,201 @@
+# app/connectors/reconciliation.py
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+from app.connectors.sis_connector import course_code_of_sis_class
+from app.models.oneroster_models import Course, Class, Enrollment, StatusType
+
+
+class ReconciledRecords:
+    """
+    The annotated copies and LMS-only enrollments one reconciliation run handed out. The next
+    run gets them back (the merge keeps them with the stage's outputs) and returns the very
+    same objects where the inputs are the same. Most records come out of reconciliation the
+    same way every merge, and reusing the object keeps it identical to the previous snapshot,
+    so stamping doesn't rehash it either.
+    """
+
+    def __init__(self, previous: Optional["ReconciledRecords"] = None):
+        # (type, sourcedId) -> (source record, extra metadata, copy)
+        self.copies: Dict[Tuple[str, str], Tuple[Any, Dict[str, Any], Any]] = {}
+        # LMS-only enrollment sourcedId -> (the fields it was built from, enrollment)
+        self.lms_enrollments: Dict[str, Tuple[Tuple[Any, ...], Enrollment]] = {}
+        self._previous_copies = previous.copies if previous is not None else {}
+        self._previous_lms_enrollments = previous.lms_enrollments if previous is not None else {}
+
+    def with_metadata(self, record: Any, extra: Dict[str, Any]) -> Any:
+        # Copy instead of mutating: per-source records are reused by later merges
+        key = (type(record).__name__, record.sourcedId)
+        previous = self._previous_copies.get(key)
+        if previous is not None and previous[0] is record and previous[1] == extra:
+            copy = previous[2]
+        else:
+            copy = record.model_copy(update={"metadata": {**(record.metadata or {}), **extra}})
+        self.copies[key] = (record, extra, copy)
+        return copy
+
+    def lms_only_enrollment(self, membership: Dict[str, Any], user_id: str, cl: Class) -> Enrollment:
+        sourced_id = f"lms_enr_{membership['lmsCourseId']}_{membership['lmsUsername']}"
+        fields = (user_id, cl.sourcedId, cl.schoolSourcedId, membership["role"], membership["lmsCourseId"])
+        previous = self._previous_lms_enrollments.get(sourced_id)
+        if previous is not None and previous[0] == fields:
+            enrollment = previous[1]
+        else:
+            enrollment = Enrollment(
+                sourcedId=sourced_id,
+                userSourcedId=user_id,
+                classSourcedId=cl.sourcedId,
+                schoolSourcedId=cl.schoolSourcedId,
+                role=membership["role"],
+                status=StatusType.ACTIVE,
+                metadata={"sources": ["lms"], "lms_course_id": membership["lmsCourseId"], "drift": "lms_only"},
+            )
+        self.lms_enrollments[sourced_id] = (fields, enrollment)
+        return enrollment
+
+    def done(self) -> "ReconciledRecords":
+        # Only this run's records are needed by the next one
+        self._previous_copies, self._previous_lms_enrollments = {}, {}
+        return self
+
+
+def reconcile_lms_with_sis(
+        sis_courses: List[Course],
+        sis_classes: List[Class],
+        sis_enrollments: List[Enrollment],
+        lms_courses: List[Course],
+        lms_memberships: List[Dict[str, Any]],
+        sis_user_id_by_lms_user_id: Dict[str, str],
+        previous: Optional[ReconciledRecords] = None,
+) -> Tuple[List[Course], List[Class], List[Enrollment], Dict[str, Any], ReconciledRecords]:
+    """
+    Links LMS courses to SIS courses (and through them to SIS classes) by course code, and
+    LMS course memberships to SIS users through the user match index. Then:
+    - enrollments the LMS has but the SIS doesn't are merged in as LMS-sourced enrollments (not
+      when the SIS enrolls the user in another section of the course, even one it has no class for),
+    - SIS/LMS membership drift is flagged on the class and enrollment metadata,
+    - linked courses/classes and drifted enrollments get per-source provenance in metadata["sources"]
+      (enrollments confirmed by both sources stay untouched; their class says sources=["sis", "lms"]).
+    Every step is a hash lookup, so the stage is linear in courses + classes + enrollments + memberships.
+    `previous` is what the last run returned, to hand back its records where nothing changed.
+    Returns (courses, classes, enrollments, report, records for the next run).
+    """
+    reconciled = ReconciledRecords(previous)
+
+    report = {
+        "linkedLmsCourses": 0, "lmsOnlyCourses": 0, "matchedEnrollments": 0, "lmsOnlyEnrollments": 0,
+        "sisOnlyEnrollments": 0, "unmatchedLmsMemberships": 0, "ambiguousLmsMemberships": 0,
+    }
+
+    # --- Indexes (one pass over each input) ---
+    sis_course_by_code: Dict[str, Course] = {}
+    for course in sis_courses:
+        if course.courseCode:
+            sis_course_by_code.setdefault(course.courseCode, course)
+    classes_by_course: Dict[str, List[Class]] = defaultdict(list)
+    for cl in sis_classes:
+        classes_by_course[cl.courseSourcedId].append(cl)
+    enrollments_by_class: Dict[str, List[Enrollment]] = defaultdict(list)
+    for enr in sis_enrollments:
+        enrollments_by_class[enr.classSourcedId].append(enr)
+    # SIS user -> course codes of every section the SIS enrolls them in, including sections that
+    # have no class record (dangling enrollments): their course code comes from the class sourcedId
+    course_code_by_course_id = {course.sourcedId: course.courseCode for course in sis_courses}
+    course_code_by_class_id = {cl.sourcedId: course_code_by_course_id.get(cl.courseSourcedId) for cl in sis_classes}
+    sis_course_codes_by_user: Dict[str, Set[str]] = defaultdict(set)
+    for class_id, class_enrollments in enrollments_by_class.items():
+        code = course_code_by_class_id[class_id] if class_id in course_code_by_class_id \
+            else course_code_of_sis_class(class_id)
+        if code:
+            for enr in class_enrollments:
+                sis_course_codes_by_user[enr.userSourcedId].add(code)
+    memberships_by_lms_course: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for membership in lms_memberships:
+        memberships_by_lms_course[membership["lmsCourseSourcedId"]].append(membership)
+
+    # --- Link LMS courses to SIS courses ---
+    lms_courses_by_sis_course: Dict[str, List[Course]] = defaultdict(list)
+    lms_only_courses: List[Course] = []
+    for lms_course in lms_courses:
+        sis_course = sis_course_by_code.get(lms_course.courseCode) if lms_course.courseCode else None
+        if sis_course is None:
+            lms_only_courses.append(reconciled.with_metadata(lms_course, {"sources": ["lms"]}))
+            report["lmsOnlyCourses"] += 1
+        else:
+            lms_courses_by_sis_course[sis_course.sourcedId].append(lms_course)
+            report["linkedLmsCourses"] += 1
+
+    # --- Compare rosters of each linked SIS course ---
+    enrollment_metadata: Dict[str, Dict[str, Any]] = {}  # SIS enrollment sourcedId -> metadata to add
+    class_metadata: Dict[str, Dict[str, Any]] = {}  # SIS class sourcedId -> metadata to add
+    lms_only_enrollments: List[Enrollment] = []
+
+    for sis_course_id, linked_lms_courses in lms_courses_by_sis_course.items():
+        candidate_classes = classes_by_course.get(sis_course_id, [])
+        lms_course_ids = [c.sourcedId for c in linked_lms_courses]
+        for cl in candidate_classes:
+            class_metadata[cl.sourcedId] = {
+                "sources": ["sis", "lms"], "lms_course_ids": lms_course_ids,
+                "membership_drift": {"sis_only": [], "lms_only": []},
+            }
+        sis_members: Dict[Tuple[str, str], Enrollment] = {
+            (enr.userSourcedId, cl.sourcedId): enr
+            for cl in candidate_classes for enr in enrollments_by_class.get(cl.sourcedId, [])
+        }
+        # SIS user -> the course's section they're enrolled in (the first one, if several)
+        sis_class_by_user: Dict[str, str] = {}
+        for user_id, class_id in sis_members:
+            sis_class_by_user.setdefault(user_id, class_id)
+        confirmed: Set[Tuple[str, str]] = set()
+
+        for lms_course in linked_lms_courses:
+            for membership in memberships_by_lms_course.get(lms_course.sourcedId, []):
+                user_id = sis_user_id_by_lms_user_id.get(membership["lmsUserSourcedId"])
+                if user_id is None:
+                    report["unmatchedLmsMemberships"] += 1
+                    continue
+                sis_class_id = sis_class_by_user.get(user_id)
+                if sis_class_id is not None:
+                    member_key = (user_id, sis_class_id)
+                    # Matched enrollments are left as they are (their class carries the provenance);
+                    # copying each one would dominate the merge on a roster that's in sync
+                    if member_key not in confirmed:
+                        confirmed.add(member_key)
+                        report["matchedEnrollments"] += 1
+                elif lms_course.courseCode in sis_course_codes_by_user.get(user_id, ()):
+                    # The SIS has them in a section of this course it has no class record for: that
+                    # enrollment is the SIS's answer, don't add a second one to another section
+                    member_key = (user_id, lms_course.courseCode)
+                    if member_key not in confirmed:
+                        confirmed.add(member_key)
+                        report["matchedEnrollments"] += 1
+                elif len(candidate_classes) == 1:
+                    # Only one class the membership can belong to: merge it in as an LMS-only enrollment
+                    cl = candidate_classes[0]
+                    member_key = (user_id, cl.sourcedId)
+                    if member_key in confirmed:
+                        continue
+                    confirmed.add(member_key)
+                    lms_only_enrollments.append(reconciled.lms_only_enrollment(membership, user_id, cl))
+                    class_metadata[cl.sourcedId]["membership_drift"]["lms_only"].append(user_id)
+                    report["lmsOnlyEnrollments"] += 1
+                else:
+                    # Several sections and the SIS has the user in none of them: can't tell which one
+                    report["ambiguousLmsMemberships"] += 1
+
+        for member_key, enr in sis_members.items():
+            if member_key not in confirmed:
+                enrollment_metadata[enr.sourcedId] = {"sources": ["sis"], "drift": "sis_only"}
+                class_metadata[member_key[1]]["membership_drift"]["sis_only"].append(enr.userSourcedId)
+                report["sisOnlyEnrollments"] += 1
+
+    # --- Apply (one pass over each output list) ---
+    courses = [
+        reconciled.with_metadata(c, {"sources": ["sis", "lms"], "lms_course_ids": [lc.sourcedId for lc in lms_courses_by_sis_course[c.sourcedId]]})
+        if c.sourcedId in lms_courses_by_sis_course else c
+        for c in sis_courses
+    ] + lms_only_courses
+    classes = [reconciled.with_metadata(cl, class_metadata[cl.sourcedId]) if cl.sourcedId in class_metadata else cl
+               for cl in sis_classes]
+    enrollments = [reconciled.with_metadata(e, enrollment_metadata[e.sourcedId]) if e.sourcedId in enrollment_metadata else e
+                   for e in sis_enrollments] + lms_only_enrollments
+    return courses, classes, enrollments, report, reconciled.done()
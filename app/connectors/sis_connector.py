@@ -1,36 +1,12 @@
 # app/connectors/sis_connector.py
-import httpx
-from typing import List, Dict, Any, Tuple
+import asyncio
+from typing import List, Dict, Any, Callable, Optional, Tuple
+from app.connectors.source_transport import get_transport
 from app.models.oneroster_models import Org, User, Course, Class, Enrollment, AcademicSession, RoleType, OrgType, \
     ClassType, StatusType
-import uuid
+from app.models.change_models import SourceChangeEvent, ChangeOperation
 from datetime import datetime
 
-# Base URL for your FastAPI app (where mock services are running)
-# Ensure this matches the port you are running Uvicorn on for Phase 1
-MOCK_API_BASE_URL = "http://127.0.0.1:8006"  # Or 8001, etc.
-
-
-async def fetch_sis_data() -> Tuple[List[Dict], List[Dict], List[Dict], List[Dict]]:
-    """Fetches all necessary data from the mock SIS."""
-    async with httpx.AsyncClient() as client:
-        orgs_resp = await client.get(f"{MOCK_API_BASE_URL}/mock/sis/orgs")
-        students_resp = await client.get(f"{MOCK_API_BASE_URL}/mock/sis/students")
-        teachers_resp = await client.get(f"{MOCK_API_BASE_URL}/mock/sis/teachers")
-        courses_resp = await client.get(f"{MOCK_API_BASE_URL}/mock/sis/courses")  # SIS "course offerings"
-
-        orgs_resp.raise_for_status()
-        students_resp.raise_for_status()
-        teachers_resp.raise_for_status()
-        courses_resp.raise_for_status()
-
-        return (
-            orgs_resp.json(),
-            students_resp.json(),
-            teachers_resp.json(),
-            courses_resp.json(),
-        )
-
 
 def transform_sis_orgs(sis_orgs_data: List[Dict]) -> List[Org]:
     oneroster_orgs: List[Org] = []
@@ -48,6 +24,104 @@ def transform_sis_orgs(sis_orgs_data: List[Dict]) -> List[Org]:
     return oneroster_orgs
 
 
+def _school_by_course_code(sis_courses_data: List[Dict]) -> Dict[str, str]:
+    # course_code -> school sourcedId (first offering wins), built once instead of scanning per person
+    school_by_course_code: Dict[str, str] = {}
+    for sis_course in sis_courses_data:
+        school_by_course_code.setdefault(sis_course["course_code"], f"sis_org_{sis_course['school_id']}")
+    return school_by_course_code
+
+
+def course_code_of_sis_class(class_sourced_id: str) -> Optional[str]:
+    """
+    The course code in a SIS class sourcedId (sis_class_<course code>_<section>). Works for
+    sections the SIS enrolls people in without listing them as a course offering, too.
+    """
+    if not class_sourced_id.startswith("sis_class_"):
+        return None
+    code, separator, _ = class_sourced_id[len("sis_class_"):].rpartition("_")
+    return code if separator else None
+
+
+def transform_sis_student(sis_student: Dict, school_by_course_code: Dict[str, str]) -> Tuple[User, List[Enrollment]]:
+    oneroster_enrollments: List[Enrollment] = []
+    # Find the school the student is primarily associated with (e.g., via a course enrollment)
+    # This is a simplification; a real SIS might have direct school association.
+    student_school_id = None
+    if sis_student.get("enrollments"):
+        first_class_id = sis_student["enrollments"][0]["class_id"]
+        student_school_id = school_by_course_code.get(first_class_id)
+
+    user = User(
+        sourcedId=f"sis_user_student_{sis_student['sis_student_id']}",
+        username=f"{sis_student['first_name'][0].lower()}{sis_student['last_name'].lower()}",
+        # Simple username generation
+        givenName=sis_student['first_name'],
+        familyName=sis_student['last_name'],
+        email=sis_student.get('email_address'),
+        role=RoleType.STUDENT,
+        identifier=sis_student['sis_student_id'],
+        agentSourcedIds=[student_school_id] if student_school_id else [],
+        grades=[sis_student['grade_level']] if sis_student.get('grade_level') else None,
+        status=StatusType.ACTIVE
+    )
+
+    for enrollment in sis_student.get("enrollments", []):
+        class_sourced_id = f"sis_class_{enrollment['class_id']}_{enrollment['section']}"  # Create a unique class sourcedId
+        school_sourced_id_for_enrollment = student_school_id  # Assume enrollment school is student's school
+
+        if school_sourced_id_for_enrollment:  # Only create enrollment if school is known
+            enr = Enrollment(
+                sourcedId=f"sis_enr_stu_{sis_student['sis_student_id']}_{enrollment['class_id']}_{enrollment['section']}",
+                userSourcedId=user.sourcedId,
+                classSourcedId=class_sourced_id,
+                schoolSourcedId=school_sourced_id_for_enrollment,
+                role=RoleType.STUDENT,
+                primary=True,  # Assuming primary for simplicity
+                status=StatusType.ACTIVE
+            )
+            oneroster_enrollments.append(enr)
+    return user, oneroster_enrollments
+
+
+def transform_sis_teacher(sis_teacher: Dict, school_by_course_code: Dict[str, str]) -> Tuple[User, List[Enrollment]]:
+    oneroster_enrollments: List[Enrollment] = []
+    teacher_school_id = None  # Simplification: Assume teacher might teach at multiple schools
+    # Or derive from their first assigned class.
+    if sis_teacher.get("assigned_classes"):
+        first_class_id = sis_teacher["assigned_classes"][0]["class_id"]
+        teacher_school_id = school_by_course_code.get(first_class_id)
+
+    user = User(
+        sourcedId=f"sis_user_teacher_{sis_teacher['sis_teacher_id']}",
+        username=f"{sis_teacher['staff_first_name'][0].lower()}{sis_teacher['staff_last_name'].lower()}",
+        givenName=sis_teacher['staff_first_name'],
+        familyName=sis_teacher['staff_last_name'],
+        email=sis_teacher.get('primary_email'),
+        role=RoleType.TEACHER,
+        identifier=sis_teacher['sis_teacher_id'],
+        agentSourcedIds=[teacher_school_id] if teacher_school_id else [],
+        status=StatusType.ACTIVE
+    )
+
+    for assignment in sis_teacher.get("assigned_classes", []):
+        class_sourced_id = f"sis_class_{assignment['class_id']}_{assignment['section']}"
+        school_sourced_id_for_enrollment = teacher_school_id
+
+        if school_sourced_id_for_enrollment:
+            enr = Enrollment(
+                sourcedId=f"sis_enr_tea_{sis_teacher['sis_teacher_id']}_{assignment['class_id']}_{assignment['section']}",
+                userSourcedId=user.sourcedId,
+                classSourcedId=class_sourced_id,
+                schoolSourcedId=school_sourced_id_for_enrollment,  # School where the class is taught
+                role=RoleType.TEACHER,
+                primary=(assignment.get("role", "").lower() == "primary"),
+                status=StatusType.ACTIVE
+            )
+            oneroster_enrollments.append(enr)
+    return user, oneroster_enrollments
+
+
 def transform_sis_users_and_enrollments(
         sis_students_data: List[Dict],
         sis_teachers_data: List[Dict],
@@ -55,90 +129,15 @@ def transform_sis_users_and_enrollments(
 ) -> Tuple[List[User], List[Enrollment]]:
     oneroster_users: List[User] = []
     oneroster_enrollments: List[Enrollment] = []
-
-    # Process students
+    school_by_course_code = _school_by_course_code(sis_courses_data)
     for sis_student in sis_students_data:
-        # Find the school the student is primarily associated with (e.g., via a course enrollment)
-        # This is a simplification; a real SIS might have direct school association.
-        student_school_id = None
-        if sis_student.get("enrollments"):
-            first_class_id = sis_student["enrollments"][0]["class_id"]
-            for sis_course in sis_courses_data:
-                if sis_course["course_code"] == first_class_id:
-                    student_school_id = f"sis_org_{sis_course['school_id']}"
-                    break
-
-        user = User(
-            sourcedId=f"sis_user_student_{sis_student['sis_student_id']}",
-            username=f"{sis_student['first_name'][0].lower()}{sis_student['last_name'].lower()}",
-            # Simple username generation
-            givenName=sis_student['first_name'],
-            familyName=sis_student['last_name'],
-            email=sis_student.get('email_address'),
-            role=RoleType.STUDENT,
-            identifier=sis_student['sis_student_id'],
-            agentSourcedIds=[student_school_id] if student_school_id else [],
-            grades=[sis_student['grade_level']] if sis_student.get('grade_level') else None,
-            status=StatusType.ACTIVE
-        )
+        user, enrollments = transform_sis_student(sis_student, school_by_course_code)
         oneroster_users.append(user)
-
-        for enrollment in sis_student.get("enrollments", []):
-            class_sourced_id = f"sis_class_{enrollment['class_id']}_{enrollment['section']}"  # Create a unique class sourcedId
-            school_sourced_id_for_enrollment = student_school_id  # Assume enrollment school is student's school
-
-            if school_sourced_id_for_enrollment:  # Only create enrollment if school is known
-                enr = Enrollment(
-                    sourcedId=f"sis_enr_stu_{sis_student['sis_student_id']}_{enrollment['class_id']}_{enrollment['section']}",
-                    userSourcedId=user.sourcedId,
-                    classSourcedId=class_sourced_id,
-                    schoolSourcedId=school_sourced_id_for_enrollment,
-                    role=RoleType.STUDENT,
-                    primary=True,  # Assuming primary for simplicity
-                    status=StatusType.ACTIVE
-                )
-                oneroster_enrollments.append(enr)
-
-    # Process teachers
+        oneroster_enrollments.extend(enrollments)
     for sis_teacher in sis_teachers_data:
-        teacher_school_id = None  # Simplification: Assume teacher might teach at multiple schools
-        # Or derive from their first assigned class.
-        if sis_teacher.get("assigned_classes"):
-            first_class_id = sis_teacher["assigned_classes"][0]["class_id"]
-            for sis_course in sis_courses_data:
-                if sis_course["course_code"] == first_class_id:
-                    teacher_school_id = f"sis_org_{sis_course['school_id']}"
-                    break
-
-        user = User(
-            sourcedId=f"sis_user_teacher_{sis_teacher['sis_teacher_id']}",
-            username=f"{sis_teacher['staff_first_name'][0].lower()}{sis_teacher['staff_last_name'].lower()}",
-            givenName=sis_teacher['staff_first_name'],
-            familyName=sis_teacher['staff_last_name'],
-            email=sis_teacher.get('primary_email'),
-            role=RoleType.TEACHER,
-            identifier=sis_teacher['sis_teacher_id'],
-            agentSourcedIds=[teacher_school_id] if teacher_school_id else [],
-            status=StatusType.ACTIVE
-        )
+        user, enrollments = transform_sis_teacher(sis_teacher, school_by_course_code)
         oneroster_users.append(user)
-
-        for assignment in sis_teacher.get("assigned_classes", []):
-            class_sourced_id = f"sis_class_{assignment['class_id']}_{assignment['section']}"
-            school_sourced_id_for_enrollment = teacher_school_id
-
-            if school_sourced_id_for_enrollment:
-                enr = Enrollment(
-                    sourcedId=f"sis_enr_tea_{sis_teacher['sis_teacher_id']}_{assignment['class_id']}_{assignment['section']}",
-                    userSourcedId=user.sourcedId,
-                    classSourcedId=class_sourced_id,
-                    schoolSourcedId=school_sourced_id_for_enrollment,  # School where the class is taught
-                    role=RoleType.TEACHER,
-                    primary=(assignment.get("role", "").lower() == "primary"),
-                    status=StatusType.ACTIVE
-                )
-                oneroster_enrollments.append(enr)
-
+        oneroster_enrollments.extend(enrollments)
     return oneroster_users, oneroster_enrollments
 
 
@@ -159,6 +158,9 @@ def transform_sis_courses_and_classes(sis_courses_data: List[Dict]) -> Tuple[Lis
     # Create unique OneRoster Courses from SIS course_codes
     # (e.g., MATH5A might be taught in multiple sections, but it's one OneRoster Course)
     unique_course_codes = {c['course_code']: c for c in sis_courses_data}
+    offerings_by_code: Dict[str, List[Dict]] = {}
+    for c in sis_courses_data:
+        offerings_by_code.setdefault(c['course_code'], []).append(c)
 
     for code, sis_course_offering_example in unique_course_codes.items():
         # Create a general OneRoster Course
@@ -175,7 +177,7 @@ def transform_sis_courses_and_classes(sis_courses_data: List[Dict]) -> Tuple[Lis
         oneroster_courses.append(course)
 
         # Now create OneRoster Classes for each specific offering/section from the original sis_courses_data
-        for sis_class_offering in [c for c in sis_courses_data if c['course_code'] == code]:
+        for sis_class_offering in offerings_by_code[code]:
             # SIS "course_code" might map to a OneRoster "classCode" if sections are implied
             # Or generate a unique class sourcedId
             class_sourced_id = f"sis_class_{sis_class_offering['course_code']}_{sis_class_offering.get('section', '001')}"  # Assuming section if present
@@ -222,25 +224,133 @@ def get_default_academic_sessions() -> List[AcademicSession]:
     ]
 
 
+async def _stream_sis_people(path: str, transform: Callable[[Dict, Dict[str, str]], Tuple[User, List[Enrollment]]],
+                             school_by_course_code: Dict[str, str], users: List[User], enrollments: List[Enrollment]) -> None:
+    # Each record is transformed as soon as the transport has parsed it, so the raw export is
+    # never held in memory as a whole: only the models built from it are kept
+    async for record in get_transport("sis").iter_json_array(path):
+        user, user_enrollments = transform(record, school_by_course_code)
+        users.append(user)
+        enrollments.extend(user_enrollments)
+
+
+async def fetch_sis_reference(sis_data: Optional[Dict[str, List[Any]]] = None) -> Dict[str, List[Any]]:
+    """Orgs and academic sessions: slow-changing reference data (a few changes a year)."""
+    sis_orgs_data = await get_transport("sis").get_json("/mock/sis/orgs")
+    return {"orgs": transform_sis_orgs(sis_orgs_data), "academicSessions": get_default_academic_sessions()}
+
+
+async def fetch_sis_catalog(sis_data: Optional[Dict[str, List[Any]]] = None) -> Dict[str, List[Any]]:
+    """Courses and the classes (sections) generated from the SIS course offerings."""
+    sis_courses_data = await get_transport("sis").get_json("/mock/sis/courses")  # SIS "course offerings"
+    oneroster_courses, oneroster_classes = transform_sis_courses_and_classes(sis_courses_data)
+    return {"courses": oneroster_courses, "classes": oneroster_classes}
+
+
+async def fetch_sis_roster(sis_data: Optional[Dict[str, List[Any]]] = None) -> Dict[str, List[Any]]:
+    """
+    Users and enrollments, streamed. A person's school is resolved through the courses of
+    `sis_data` (the current catalog), so the course offerings are only fetched without one.
+    """
+    if sis_data and sis_data.get("courses"):
+        sis_courses_data = _sis_course_lookup(sis_data["courses"])
+    else:
+        sis_courses_data = await get_transport("sis").get_json("/mock/sis/courses")
+    school_by_course_code = _school_by_course_code(sis_courses_data)
+    student_users: List[User] = []
+    student_enrollments: List[Enrollment] = []
+    teacher_users: List[User] = []
+    teacher_enrollments: List[Enrollment] = []
+    await asyncio.gather(
+        _stream_sis_people("/mock/sis/students", transform_sis_student, school_by_course_code,
+                           student_users, student_enrollments),
+        _stream_sis_people("/mock/sis/teachers", transform_sis_teacher, school_by_course_code,
+                           teacher_users, teacher_enrollments),
+    )
+    return {"users": student_users + teacher_users, "enrollments": student_enrollments + teacher_enrollments}
+
+
 async def process_sis_to_oneroster() -> Dict[str, List[Any]]:
     """
     Main function for SIS connector: fetches, transforms, and returns OneRoster data.
     """
-    sis_orgs_data, sis_students_data, sis_teachers_data, sis_courses_data = await fetch_sis_data()
+    reference, catalog = await asyncio.gather(fetch_sis_reference(), fetch_sis_catalog())
+    # The roster needs the catalog to place people in schools
+    roster = await fetch_sis_roster(catalog)
 
-    oneroster_orgs = transform_sis_orgs(sis_orgs_data)
-    oneroster_courses, oneroster_classes = transform_sis_courses_and_classes(sis_courses_data)
-    # Pass sis_courses_data to help resolve school for enrollments in this simplified model
-    oneroster_users, oneroster_enrollments = transform_sis_users_and_enrollments(
-        sis_students_data, sis_teachers_data, sis_courses_data
-    )
-    oneroster_academic_sessions = get_default_academic_sessions()
+    # Models were validated when built from the SIS records above; hand them over as-is
+    # rather than dumping to dicts that the processor would have to validate again.
+    return {**reference, **catalog, **roster}
+
+
+def _sis_course_lookup(oneroster_courses: List[Course]) -> List[Dict]:
+    """
+    Rebuilds the minimal SIS course shape transform_sis_users_and_enrollments() needs
+    to resolve a person's school, from already transformed OneRoster courses.
+    """
+    return [
+        {"course_code": c.courseCode, "school_id": c.orgSourcedId[len("sis_org_"):]}
+        for c in oneroster_courses
+        if c.courseCode and c.orgSourcedId
+    ]
+
+
+def apply_sis_changes(sis_data: Dict[str, List[Any]], events: List[SourceChangeEvent]) -> Dict[str, List[Any]]:
+    """
+    Applies record-level SIS change events to previously transformed SIS data
+    (the output of process_sis_to_oneroster), re-transforming only the affected records.
+    Returns a new dict; the input lists are not modified.
+    """
+    dropped_org_ids, dropped_course_ids, dropped_user_ids = set(), set(), set()
+    new_orgs: List[Org] = []
+    new_courses: List[Course] = []
+    new_classes: List[Class] = []
+    upserted_students: List[Dict] = []
+    upserted_teachers: List[Dict] = []
+
+    for event in events:
+        is_upsert = event.operation == ChangeOperation.UPSERT and event.record is not None
+        if event.entity == "orgs":
+            dropped_org_ids.add(f"sis_org_{event.key}")
+            if is_upsert:
+                new_orgs.extend(transform_sis_orgs([event.record]))
+        elif event.entity == "courses":
+            # A course change replaces the course and every class generated from it
+            dropped_course_ids.add(f"sis_course_{event.key}")
+            if is_upsert:
+                courses, classes = transform_sis_courses_and_classes([event.record])
+                new_courses.extend(courses)
+                new_classes.extend(classes)
+        elif event.entity == "students":
+            # A person change replaces the user and all of their enrollments
+            dropped_user_ids.add(f"sis_user_student_{event.key}")
+            if is_upsert:
+                upserted_students.append(event.record)
+        elif event.entity == "teachers":
+            dropped_user_ids.add(f"sis_user_teacher_{event.key}")
+            if is_upsert:
+                upserted_teachers.append(event.record)
+        else:
+            print(f"Warning: Ignoring SIS change for unknown entity '{event.entity}'")
+
+    orgs = [o for o in sis_data.get("orgs", []) if o.sourcedId not in dropped_org_ids] + new_orgs
+    courses = [c for c in sis_data.get("courses", []) if c.sourcedId not in dropped_course_ids] + new_courses
+    classes = [cl for cl in sis_data.get("classes", []) if cl.courseSourcedId not in dropped_course_ids] + new_classes
+    users = [u for u in sis_data.get("users", []) if u.sourcedId not in dropped_user_ids]
+    enrollments = [e for e in sis_data.get("enrollments", []) if e.userSourcedId not in dropped_user_ids]
+
+    if upserted_students or upserted_teachers:
+        new_users, new_enrollments = transform_sis_users_and_enrollments(
+            upserted_students, upserted_teachers, _sis_course_lookup(courses)
+        )
+        users += new_users
+        enrollments += new_enrollments
 
     return {
-        "orgs": [org.model_dump() for org in oneroster_orgs],
-        "users": [user.model_dump() for user in oneroster_users],
-        "courses": [course.model_dump() for course in oneroster_courses],
-        "classes": [cl.model_dump() for cl in oneroster_classes],
-        "enrollments": [enr.model_dump() for enr in oneroster_enrollments],
-        "academicSessions": [acad_session.model_dump() for acad_session in oneroster_academic_sessions],
+        "orgs": orgs,
+        "users": users,
+        "courses": courses,
+        "classes": classes,
+        "enrollments": enrollments,
+        "academicSessions": list(sis_data.get("academicSessions", [])),
     }
\ No newline at end of file
@@ -0,0 +1,179 @@
+# app/connectors/source_transport.py
+import asyncio
+import os
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+import httpx
+from app.connectors.json_stream import JsonArrayParser
+
+# How connectors reach their source system, per source:
+#   inprocess - call the mock system's functions directly (source lives in this deployment)
+#   asgi      - go through the mock routers in-process via httpx.ASGITransport (no sockets, but
+#               same routing/serialization as HTTP; handy for testing the HTTP contract)
+#   http      - real HTTP to ONEROSTER_<SOURCE>_BASE_URL (source runs elsewhere)
+# ONEROSTER_SOURCE_TRANSPORT sets the default, ONEROSTER_<SOURCE>_TRANSPORT overrides it per source.
+DEFAULT_TRANSPORT = os.getenv("ONEROSTER_SOURCE_TRANSPORT", "inprocess")
+DEFAULT_BASE_URL = "http://127.0.0.1:8006"  # Where the mock routers are served when going over HTTP
+HTTP_TIMEOUT_SECONDS = float(os.getenv("ONEROSTER_SOURCE_HTTP_TIMEOUT_SECONDS", "30"))
+# Parse bulk exports record by record while the body streams in, instead of buffering the whole
+# body and building the full object tree with resp.json(); turn off to fall back to the latter
+STREAM_JSON = os.getenv("ONEROSTER_SOURCE_STREAM_JSON", "1").lower() not in ("0", "false", "no")
+STREAM_CHUNK_BYTES = 64 * 1024
+# Records handed out from an in-memory list between turns of the event loop: connectors transform
+# each record as it comes, and without a pause a large roster would hold up request handlers
+YIELD_EVERY_RECORDS = 256
+
+
+class SourceTransport:
+    """Reads JSON resources from a source system by path, e.g. '/mock/sis/students'."""
+
+    name = "base"
+
+    async def get_json(self, path: str) -> Any:
+        raise NotImplementedError
+
+    async def iter_json_array(self, path: str) -> AsyncIterator[Any]:
+        """The records of a JSON array resource, one at a time. Transports that can stream override this."""
+        for i, record in enumerate(await self.get_json(path), 1):
+            yield record
+            if i % YIELD_EVERY_RECORDS == 0:
+                await asyncio.sleep(0)
+
+    async def close(self) -> None:
+        pass
+
+
+class InProcessTransport(SourceTransport):
+    """Direct function calls into a source system running in this process. No JSON, no sockets."""
+
+    name = "inprocess"
+
+    def __init__(self, routes: Dict[str, Callable[[], Any]]):
+        self.routes = routes
+
+    async def get_json(self, path: str) -> Any:
+        handler = self.routes.get(path)
+        if handler is None:
+            raise LookupError(f"No in-process handler for source path {path}")
+        # Copy the list: the mock systems replace records in place when simulating changes
+        return list(handler())
+
+
+class HttpTransport(SourceTransport):
+    """HTTP client for a source system. One pooled client per transport, reused across syncs."""
+
+    name = "http"
+
+    def __init__(self, base_url: str, client_factory: Optional[Callable[[], httpx.AsyncClient]] = None):
+        self.base_url = base_url
+        self._client_factory = client_factory or (
+            lambda: httpx.AsyncClient(base_url=self.base_url, timeout=HTTP_TIMEOUT_SECONDS)
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = self._client_factory()
+        return self._client
+
+    async def get_json(self, path: str) -> Any:
+        resp = await self._get_client().get(path)
+        resp.raise_for_status()
+        return resp.json()
+
+    async def iter_json_array(self, path: str) -> AsyncIterator[Any]:
+        """
+        Streams the response body through an incremental parser and yields each array element as
+        soon as it is complete, so memory stays at about one chunk however large the export is.
+        """
+        if not STREAM_JSON:
+            async for record in super().iter_json_array(path):
+                yield record
+            return
+        parser = JsonArrayParser()
+        async with self._get_client().stream("GET", path) as resp:
+            resp.raise_for_status()
+            async for chunk in resp.aiter_bytes(STREAM_CHUNK_BYTES):
+                for record in parser.feed(chunk):
+                    yield record
+        for record in parser.close():
+            yield record
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class AsgiTransport(HttpTransport):
+    """HTTP semantics without the network: requests are handled by the mock routers in-process."""
+
+    name = "asgi"
+
+    def __init__(self):
+        super().__init__("http://sources", client_factory=self._make_client)
+
+    def _make_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=_mock_sources_app()), base_url=self.base_url,
+            timeout=HTTP_TIMEOUT_SECONDS,
+        )
+
+
+def _mock_sources_app():
+    # Only the mock source routers, not the whole API (no admission control, compression etc.)
+    from fastapi import FastAPI
+    from app.routers import mock_sis_router, mock_lms_router
+    app = FastAPI()
+    app.include_router(mock_sis_router.router)
+    app.include_router(mock_lms_router.router)
+    return app
+
+
+def _in_process_routes(source: str) -> Dict[str, Callable[[], Any]]:
+    from app.mock_systems import sis, lms
+    routes = {
+        "sis": {
+            "/mock/sis/orgs": sis.get_sis_orgs,
+            "/mock/sis/students": sis.get_sis_students,
+            "/mock/sis/teachers": sis.get_sis_teachers,
+            "/mock/sis/courses": sis.get_sis_courses,
+        },
+        "lms": {
+            "/mock/lms/users": lms.get_lms_users,
+            "/mock/lms/courses": lms.get_lms_courses,
+        },
+    }
+    return routes[source]
+
+
+def _create_transport(source: str) -> SourceTransport:
+    kind = os.getenv(f"ONEROSTER_{source.upper()}_TRANSPORT", DEFAULT_TRANSPORT).lower()
+    if kind == "inprocess":
+        return InProcessTransport(_in_process_routes(source))
+    if kind == "asgi":
+        return AsgiTransport()
+    if kind == "http":
+        return HttpTransport(os.getenv(f"ONEROSTER_{source.upper()}_BASE_URL", DEFAULT_BASE_URL))
+    raise ValueError(f"Unknown transport '{kind}' for source '{source}' (expected inprocess, asgi or http)")
+
+
+_transports: Dict[str, SourceTransport] = {}
+
+
+def get_transport(source: str) -> SourceTransport:
+    """The configured transport of a source system ('sis' or 'lms'), created on first use."""
+    if source not in _transports:
+        _transports[source] = _create_transport(source)
+        print(f"Source '{source}' is read through the {_transports[source].name} transport.")
+    return _transports[source]
+
+
+def set_transport(source: str, transport: SourceTransport) -> None:
+    """Overrides the transport of a source (e.g. benchmarks feeding generated data in-process)."""
+    _transports[source] = transport
+
+
+async def close_transports() -> None:
+    for transport in _transports.values():
+        await transport.close()
+    _transports.clear()
@@ -0,0 +1,182 @@
+# app/middleware/admission.py
+import asyncio
+import math
+import os
+import time
+from typing import Dict, Optional, Tuple
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# Bulkheads: bulk/list requests and point lookups get separate concurrency pools, so a few
+# full dumps can't take every slot (or the whole event loop) away from LTI launch lookups.
+BULK_MAX_CONCURRENCY = int(os.getenv("ONEROSTER_BULK_MAX_CONCURRENCY", "2"))
+BULK_MAX_QUEUE = int(os.getenv("ONEROSTER_BULK_MAX_QUEUE", "8"))  # Waiting requests beyond this are shed
+LOOKUP_MAX_CONCURRENCY = int(os.getenv("ONEROSTER_LOOKUP_MAX_CONCURRENCY", "64"))
+LOOKUP_MAX_QUEUE = int(os.getenv("ONEROSTER_LOOKUP_MAX_QUEUE", "256"))
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("ONEROSTER_ADMISSION_QUEUE_TIMEOUT_SECONDS", "10"))
+
+# Per-client token buckets (requests/second sustained, burst size), per pool
+BULK_RATE_PER_CLIENT = float(os.getenv("ONEROSTER_BULK_RATE_PER_CLIENT", "10"))
+BULK_BURST_PER_CLIENT = float(os.getenv("ONEROSTER_BULK_BURST_PER_CLIENT", "20"))
+LOOKUP_RATE_PER_CLIENT = float(os.getenv("ONEROSTER_LOOKUP_RATE_PER_CLIENT", "100"))
+LOOKUP_BURST_PER_CLIENT = float(os.getenv("ONEROSTER_LOOKUP_BURST_PER_CLIENT", "200"))
+MAX_TRACKED_CLIENTS = 10_000
+
+V1P1_PREFIX = "/ims/oneroster/v1p1/"
+CUSTOM_PREFIX = "/api/v1/oneroster/"
+SEARCH_PATH = "/api/v1/oneroster/search"  # Type-ahead: one small indexed read per keystroke
+
+
+def classify_request(method: str, path: str) -> Optional[str]:
+    """
+    Returns the pool a request belongs to: "lookup" for /ims/oneroster/v1p1/{collection}/{sourcedId},
+    and the type-ahead search, "bulk" for collection lists, nested lists and the custom full dump, or None
+    (not admission controlled).
+    """
+    if method != "GET":
+        return None
+    if path == SEARCH_PATH:
+        return "lookup"
+    if path.startswith(CUSTOM_PREFIX):
+        return "bulk"
+    if not path.startswith(V1P1_PREFIX):
+        return None
+    segments = [s for s in path[len(V1P1_PREFIX):].split("/") if s]
+    return "lookup" if len(segments) == 2 else "bulk"
+
+
+def client_key(scope: Scope) -> str:
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class Bulkhead:
+    """A concurrency pool with a bounded wait queue. Requests that can't even queue are shed."""
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, queue_timeout: float = QUEUE_TIMEOUT_SECONDS):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        self.shed = 0
+        self.timed_out = 0
+
+    async def acquire(self) -> bool:
+        if self._semaphore.locked() and self.queued >= self.max_queue:
+            self.shed += 1
+            return False
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            return False
+        finally:
+            self.queued -= 1
+        self.active += 1
+        self.admitted += 1
+        return True
+
+    def release(self) -> None:
+        self.active -= 1
+        self._semaphore.release()
+
+    def retry_after_seconds(self) -> int:
+        # Rough guess: half a queue timeout for the backlog to drain (a queued request waits at most a full one)
+        return max(1, math.ceil(self.queue_timeout / 2))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "maxConcurrency": self.max_concurrency, "maxQueue": self.max_queue, "active": self.active,
+            "queued": self.queued, "admitted": self.admitted, "shed": self.shed, "timedOut": self.timed_out,
+        }
+
+
+class ClientQuotas:
+    """Token bucket per client: `rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[str, Tuple[float, float]] = {}  # client -> (tokens, last refill time)
+        self.rejected = 0
+
+    def try_take(self, client: str, now: Optional[float] = None) -> float:
+        """Takes one token. Returns 0 if allowed, otherwise the seconds until a token is available."""
+        now = time.monotonic() if now is None else now
+        tokens, last = self._buckets.get(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens < 1:
+            self._buckets[client] = (tokens, now)
+            self.rejected += 1
+            return (1 - tokens) / self.rate
+        if client not in self._buckets and len(self._buckets) >= MAX_TRACKED_CLIENTS:
+            self._prune(now)
+        self._buckets[client] = (tokens - 1, now)
+        return 0.0
+
+    def _prune(self, now: float) -> None:
+        # Buckets that have refilled completely carry no state worth keeping
+        self._buckets = {
+            c: (t, last) for c, (t, last) in self._buckets.items() if t + (now - last) * self.rate < self.burst
+        }
+
+    def stats(self) -> Dict[str, float]:
+        return {"ratePerSecond": self.rate, "burst": self.burst, "trackedClients": len(self._buckets),
+                "rejected": self.rejected}
+
+
+bulkheads: Dict[str, Bulkhead] = {
+    "bulk": Bulkhead("bulk", BULK_MAX_CONCURRENCY, BULK_MAX_QUEUE),
+    "lookup": Bulkhead("lookup", LOOKUP_MAX_CONCURRENCY, LOOKUP_MAX_QUEUE),
+}
+client_quotas: Dict[str, ClientQuotas] = {
+    "bulk": ClientQuotas(BULK_RATE_PER_CLIENT, BULK_BURST_PER_CLIENT),
+    "lookup": ClientQuotas(LOOKUP_RATE_PER_CLIENT, LOOKUP_BURST_PER_CLIENT),
+}
+
+
+def admission_stats() -> Dict[str, Dict[str, Dict[str, float]]]:
+    return {pool: {"bulkhead": bulkheads[pool].stats(), "clientQuota": client_quotas[pool].stats()} for pool in bulkheads}
+
+
+class AdmissionControlMiddleware:
+    """
+    Per-client quota (429) and per-pool bulkhead (503 when the queue is full or the wait
+    times out) in front of the OneRoster read API. Both rejections carry Retry-After.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        pool = classify_request(scope.get("method", ""), scope.get("path", "")) if scope["type"] == "http" else None
+        if pool is None:
+            await self.app(scope, receive, send)
+            return
+
+        wait_seconds = client_quotas[pool].try_take(client_key(scope))
+        if wait_seconds > 0:
+            response = JSONResponse(
+                status_code=429, content={"detail": f"Too many {pool} requests from this client"},
+                headers={"Retry-After": str(math.ceil(wait_seconds))},
+            )
+            await response(scope, receive, send)
+            return
+
+        bulkhead = bulkheads[pool]
+        if not await bulkhead.acquire():
+            response = JSONResponse(
+                status_code=503, content={"detail": f"Server is busy with {pool} requests, try again later"},
+                headers={"Retry-After": str(bulkhead.retry_after_seconds())},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            bulkhead.release()
@@ -0,0 +1,216 @@
+# app/middleware/compression.py
+import asyncio
+import gzip
+import os
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.services.snapshot_generations import GENERATION_HEADER
+
+# Brotli and zstd are optional: if the package isn't installed the encoding just isn't offered
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("ONEROSTER_COMPRESSION_MIN_SIZE", "1024"))  # Bytes; smaller bodies go out as-is
+GZIP_LEVEL = int(os.getenv("ONEROSTER_GZIP_LEVEL", "6"))  # 1-9
+BROTLI_QUALITY = int(os.getenv("ONEROSTER_BROTLI_QUALITY", "5"))  # 0-11, 5 is about gzip -6 speed but smaller
+ZSTD_LEVEL = int(os.getenv("ONEROSTER_ZSTD_LEVEL", "3"))  # 1-22
+# Total size of the compressed bodies kept for reuse
+COMPRESSED_CACHE_MAX_BYTES = int(os.getenv("ONEROSTER_COMPRESSED_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Bodies larger than this are compressed in a worker thread so big roster pages don't stall the event loop
+OFFLOAD_MIN_SIZE = 256 * 1024
+
+# Roster data served from the in-memory snapshot: the same bytes are requested over and over
+# until the next snapshot, so their compressed bodies are worth keeping. Only responses that
+# name the snapshot they were read from (the generation header) are cached.
+CACHEABLE_PATH_PREFIXES = ("/ims/oneroster/", "/api/v1/oneroster/")
+EXCLUDED_CONTENT_TYPES = ("text/event-stream",)  # SSE has to be flushed event by event
+
+
+def _compressors() -> Dict[str, Callable[[bytes], bytes]]:
+    compressors: Dict[str, Callable[[bytes], bytes]] = {}
+    if brotli is not None:
+        compressors["br"] = lambda body: brotli.compress(body, quality=BROTLI_QUALITY)
+    if zstandard is not None:
+        compressors["zstd"] = lambda body: zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    # mtime=0 keeps the output deterministic for identical bodies
+    compressors["gzip"] = lambda body: gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    return compressors
+
+
+# Server preference order, best ratio first; used to break ties between equal q-values
+COMPRESSORS = _compressors()
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Picks the content coding for an Accept-Encoding header: highest q-value wins, ties go
+    to the server's preference order. Returns None for identity (nothing acceptable).
+    """
+    q_values: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        q_values[coding] = q
+
+    best, best_q = None, 0.0
+    for coding in COMPRESSORS:
+        q = q_values.get(coding, q_values.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+CacheKey = Tuple[str, str, str]  # (snapshot generation token, path + query string, encoding)
+
+
+class CompressedBodyCache:
+    """
+    LRU of compressed bodies keyed by (generation token, path + query, encoding). A
+    generation is immutable, so an entry can never be stale: a new snapshot has a new
+    token and therefore new keys, and the old generation's entries just age out.
+    """
+
+    def __init__(self, max_bytes: int = COMPRESSED_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[CacheKey, bytes]" = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: CacheKey) -> Optional[bytes]:
+        body = self._entries.get(key)
+        if body is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return body
+
+    def put(self, key: CacheKey, body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._size -= len(old)
+        self._entries[key] = body
+        self._size += len(body)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "bytes": self._size, "hits": self.hits, "misses": self.misses}
+
+
+compressed_body_cache = CompressedBodyCache()
+
+# (path + query, encoding) of the request being handled, when its response may be cached. Set by
+# the middleware so route handlers can look up the compressed body before building the response.
+_cacheable_request: ContextVar[Optional[Tuple[str, str]]] = ContextVar("cacheable_request", default=None)
+
+
+def cached_compressed_body(generation_token: str) -> Optional[Tuple[bytes, str]]:
+    """
+    (compressed body, encoding) of an earlier identical request read from the same snapshot
+    generation, or None. A handler that gets one sends it with a Content-Encoding header,
+    which the middleware passes through untouched.
+    """
+    request = _cacheable_request.get()
+    if request is None:
+        return None
+    target, encoding = request
+    body = compressed_body_cache.get((generation_token, target, encoding))
+    return (body, encoding) if body is not None else None
+
+
+async def compress_body(body: bytes, encoding: str) -> bytes:
+    compress = COMPRESSORS[encoding]
+    if len(body) >= OFFLOAD_MIN_SIZE:
+        return await asyncio.to_thread(compress, body)
+    return compress(body)
+
+
+class CompressionMiddleware:
+    """
+    Compresses complete (non-streaming) responses with the best encoding the client accepts
+    (br / zstd when installed, gzip otherwise). Streaming responses, SSE, bodies below
+    COMPRESSION_MIN_SIZE and responses that already have a Content-Encoding pass through.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        target = None
+        if encoding is not None and scope["method"] == "GET" and scope["path"].startswith(CACHEABLE_PATH_PREFIXES):
+            query = scope.get("query_string", b"").decode("latin-1")
+            target = f"{scope['path']}?{query}" if query else scope["path"]
+        start_message: Optional[Message] = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if "content-encoding" in headers or headers.get("content-type", "").startswith(EXCLUDED_CONTENT_TYPES):
+                    passthrough = True  # Send the headers right away, SSE clients expect them before the first event
+                    await send(message)
+                    return
+                start_message = message  # Held back until we know whether the body gets compressed
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start_message["headers"])
+            body = message.get("body", b"")
+            if message.get("more_body", False):
+                passthrough = True  # Streaming body: not buffered
+                await send(start_message)
+                await send(message)
+                return
+
+            # Complete body in a single message
+            headers.add_vary_header("Accept-Encoding")
+            if encoding is not None and len(body) >= COMPRESSION_MIN_SIZE:
+                body = await compress_body(body, encoding)
+                generation_token = headers.get(GENERATION_HEADER)
+                if target is not None and generation_token and start_message["status"] == 200:
+                    compressed_body_cache.put((generation_token, target, encoding), body)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                message = {**message, "body": body}
+            await send(start_message)
+            await send(message)
+
+        context_token = _cacheable_request.set((target, encoding) if target is not None else None)
+        try:
+            await self.app(scope, receive, send_compressed)
+        finally:
+            _cacheable_request.reset(context_token)
+
+
+def supported_encodings() -> List[str]:
+    return list(COMPRESSORS)
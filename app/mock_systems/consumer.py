@@ -0,0 +1,40 @@
+# app/mock_systems/consumer.py
+from typing import List, Dict, Any, Tuple
+
+# Stand-in for a downstream app receiving pushed roster changes. Applies every batch to its
+# own copy of the roster, so a test can compare that copy with the OneRoster API.
+mock_consumer_rosters: Dict[str, Dict[Tuple[str, str], Dict[str, Any]]] = {}  # consumer -> (entityType, sourcedId) -> record
+mock_consumer_stats: Dict[str, Dict[str, Any]] = {}
+mock_consumer_failures: Dict[str, int] = {}  # consumer -> number of upcoming batches to reject
+
+
+def receive_batch(consumer: str, batch: Dict[str, Any]) -> bool:
+    """Applies a pushed batch. Returns False if the batch is rejected (simulated outage)."""
+    if mock_consumer_failures.get(consumer, 0) > 0:
+        mock_consumer_failures[consumer] -= 1
+        mock_consumer_stats.setdefault(consumer, {"batches": 0, "changes": 0, "rejected": 0})["rejected"] += 1
+        return False
+    roster = mock_consumer_rosters.setdefault(consumer, {})
+    changes: List[Dict[str, Any]] = batch.get("changes", [])
+    for change in changes:
+        key = (change["entityType"], change["sourcedId"])
+        if change["operation"] == "delete":
+            roster.pop(key, None)
+        else:
+            roster[key] = change["record"]
+    stats = mock_consumer_stats.setdefault(consumer, {"batches": 0, "changes": 0, "rejected": 0})
+    stats["batches"] += 1
+    stats["changes"] += len(changes)
+    stats["checkpoint"] = batch.get("checkpoint")
+    return True
+
+
+def fail_next_batches(consumer: str, count: int) -> None:
+    mock_consumer_failures[consumer] = count
+
+
+def get_consumer_summary(consumer: str) -> Dict[str, Any]:
+    counts: Dict[str, int] = {}
+    for entity_type, _ in mock_consumer_rosters.get(consumer, {}):
+        counts[entity_type] = counts.get(entity_type, 0) + 1
+    return {"records": counts, **mock_consumer_stats.get(consumer, {"batches": 0, "changes": 0, "rejected": 0})}
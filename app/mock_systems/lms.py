@@ -38,4 +38,32 @@ def get_lms_courses() -> List[Dict[str, Any]]:
     return mock_lms_courses_data
 
 def get_lms_users() -> List[Dict[str, Any]]:
-    return mock_lms_users_data
\ No newline at end of file
+    return mock_lms_users_data
+
+
+# --- Mutations (simulate changes happening in the LMS, which then pushes change events) ---
+def _upsert(records: List[Dict[str, Any]], key_field: str, record: Dict[str, Any]) -> None:
+    for i, existing in enumerate(records):
+        if existing[key_field] == record[key_field]:
+            records[i] = record
+            return
+    records.append(record)
+
+def _delete(records: List[Dict[str, Any]], key_field: str, key: str) -> bool:
+    for i, existing in enumerate(records):
+        if existing[key_field] == key:
+            del records[i]
+            return True
+    return False
+
+def upsert_lms_user(record: Dict[str, Any]) -> None:
+    _upsert(mock_lms_users_data, "lms_username", record)
+
+def delete_lms_user(lms_username: str) -> bool:
+    return _delete(mock_lms_users_data, "lms_username", lms_username)
+
+def upsert_lms_course(record: Dict[str, Any]) -> None:
+    _upsert(mock_lms_courses_data, "lms_course_id", record)
+
+def delete_lms_course(lms_course_id: str) -> bool:
+    return _delete(mock_lms_courses_data, "lms_course_id", lms_course_id)
\ No newline at end of file
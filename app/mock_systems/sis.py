@@ -78,4 +78,38 @@ def get_sis_courses() -> List[Dict[str, Any]]:
     return mock_sis_courses_data
 
 def get_sis_orgs() -> List[Dict[str, Any]]:
-    return mock_sis_orgs_data
\ No newline at end of file
+    return mock_sis_orgs_data
+
+
+# --- Mutations (simulate changes happening in the SIS, which then pushes change events) ---
+def _upsert(records: List[Dict[str, Any]], key_field: str, record: Dict[str, Any]) -> None:
+    for i, existing in enumerate(records):
+        if existing[key_field] == record[key_field]:
+            records[i] = record
+            return
+    records.append(record)
+
+def _delete(records: List[Dict[str, Any]], key_field: str, key: str) -> bool:
+    for i, existing in enumerate(records):
+        if existing[key_field] == key:
+            del records[i]
+            return True
+    return False
+
+def upsert_sis_student(record: Dict[str, Any]) -> None:
+    _upsert(mock_sis_students_data, "sis_student_id", record)
+
+def delete_sis_student(sis_student_id: str) -> bool:
+    return _delete(mock_sis_students_data, "sis_student_id", sis_student_id)
+
+def upsert_sis_teacher(record: Dict[str, Any]) -> None:
+    _upsert(mock_sis_teachers_data, "sis_teacher_id", record)
+
+def delete_sis_teacher(sis_teacher_id: str) -> bool:
+    return _delete(mock_sis_teachers_data, "sis_teacher_id", sis_teacher_id)
+
+def upsert_sis_course(record: Dict[str, Any]) -> None:
+    _upsert(mock_sis_courses_data, "course_code", record)
+
+def delete_sis_course(course_code: str) -> bool:
+    return _delete(mock_sis_courses_data, "course_code", course_code)
\ No newline at end of file
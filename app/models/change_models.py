@@ -0,0 +1,27 @@
+# app/models/change_models.py
+from pydantic import BaseModel
+from typing import Optional, Dict, Any, Literal
+from enum import Enum
+
+
+class ChangeOperation(str, Enum):
+    UPSERT = "upsert"
+    DELETE = "delete"
+
+
+# --- Inbound: record-level change events pushed by source systems ---
+class SourceChangeEvent(BaseModel):
+    source: Literal["sis", "lms"]
+    entity: str  # Native entity name in the source, e.g. "students", "teachers", "courses", "users"
+    key: str  # Native id of the record, e.g. sis_student_id, course_code, lms_username
+    operation: ChangeOperation = ChangeOperation.UPSERT
+    record: Optional[Dict[str, Any]] = None  # Full native record for upserts (same shape as the mock APIs return)
+
+
+# --- Outbound: OneRoster-level changes published on the change feed ---
+class OneRosterChange(BaseModel):
+    seq: int  # Monotonic sequence number, doubles as the resume token
+    entityType: str  # "orgs", "users", "courses", "classes", "enrollments", "academicSessions"
+    sourcedId: str
+    operation: ChangeOperation
+    record: Optional[Dict[str, Any]] = None  # The new OneRoster record (None for deletes)
@@ -0,0 +1,36 @@
+# app/models/gradebook_models.py
+from typing import Optional
+from enum import Enum
+from app.models.oneroster_models import OneRosterBase
+
+# OneRoster v1.1 gradebook service. References (class, category, lineItem, student) are flattened
+# to *SourcedId strings, same as the rostering models.
+
+class ScoreStatus(str, Enum):
+    EXEMPT = "exempt"
+    FULLY_GRADED = "fully graded"
+    NOT_SUBMITTED = "not submitted"
+    PARTIALLY_GRADED = "partially graded"
+    SUBMITTED = "submitted"
+
+class Category(OneRosterBase):
+    title: str
+
+class LineItem(OneRosterBase):
+    title: str
+    description: Optional[str] = None
+    assignDate: str  # YYYY-MM-DD
+    dueDate: str     # YYYY-MM-DD
+    classSourcedId: str  # Link to a Class
+    categorySourcedId: str  # Link to a Category
+    gradingPeriodSourcedId: Optional[str] = None  # Link to an AcademicSession
+    resultValueMin: Optional[float] = None
+    resultValueMax: Optional[float] = None
+
+class Result(OneRosterBase):
+    lineItemSourcedId: str  # Link to a LineItem
+    studentSourcedId: str   # Link to a User (student)
+    scoreStatus: ScoreStatus
+    score: Optional[float] = None
+    scoreDate: str  # YYYY-MM-DD
+    comment: Optional[str] = None
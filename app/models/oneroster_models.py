@@ -66,7 +66,7 @@ class Course(OneRosterBase):
     schoolYearSourcedId: Optional[str] = None
     courseCode: Optional[str] = None
     grades: Optional[List[str]] = None
-    orgSourcedId: Optional[str] = None
+    orgSourcedId: Optional[str] = None # School that offers this course definition
     subjects: Optional[List[str]] = None
     subjectCodes: Optional[List[str]] = None
 
@@ -107,13 +107,4 @@ class ProcessedOneRosterData(BaseModel):
     classes: List[Class] = Field(default_factory=list)
     enrollments: List[Enrollment] = Field(default_factory=list)
     academicSessions: List[AcademicSession] = Field(default_factory=list)
-    # Add demographics, resources etc. as needed
-
-class Course(OneRosterBase):
-    title: str
-    schoolYearSourcedId: Optional[str] = None
-    courseCode: Optional[str] = None
-    grades: Optional[List[str]] = None
-    orgSourcedId: Optional[str] = None # School that offers this course definition
-    subjects: Optional[List[str]] = None
-    subjectCodes: Optional[List[str]] = None
\ No newline at end of file
+    # Add demographics, resources etc. as needed
\ No newline at end of file
@@ -0,0 +1,41 @@
+# app/models/sync_models.py
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Literal, Optional
+
+
+class SyncJobStatus(BaseModel):
+    name: str
+    intervalSeconds: float
+    running: bool
+    runCount: int = 0
+    failureCount: int = 0
+    lastStartedAt: Optional[str] = None
+    lastFinishedAt: Optional[str] = None
+    lastDurationMs: Optional[float] = None
+    lastOutcome: Optional[str] = None  # "success" or "failed"
+    lastError: Optional[str] = None
+    nextRunAt: Optional[str] = None
+
+
+# --- Outbound push to downstream consumers ---
+class PushConsumerConfig(BaseModel):
+    name: str
+    url: str  # Receives POSTed JSON batches of changes
+    headers: Dict[str, str] = Field(default_factory=dict)  # e.g. an Authorization header; not written to the state file
+    batchSize: int = Field(500, ge=1, le=10000)
+    maxConcurrency: int = Field(2, ge=1, le=32)  # Batches in flight at once; 1 keeps delivery strictly in order
+    maxRetries: int = Field(5, ge=0)  # Per batch, with exponential backoff
+    startFrom: Literal["beginning", "now"] = "beginning"  # "beginning" sends the whole roster first
+
+
+class PushConsumerStatus(BaseModel):
+    name: str
+    url: str
+    state: str  # "idle", "pushing" or "backoff"
+    checkpoint: List[Any]  # [dateLastModified, entity type index, sourcedId] of the last delivered change
+    pendingChanges: int = 0
+    deliveredBatches: int = 0
+    deliveredChanges: int = 0
+    failedAttempts: int = 0
+    lastDeliveredAt: Optional[str] = None
+    lastError: Optional[str] = None
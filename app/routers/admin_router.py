@@ -0,0 +1,123 @@
+# app/routers/admin_router.py
+from fastapi import APIRouter, Depends, HTTPException, Path
+from typing import Any, Dict, List
+from app.connectors import oneroster_processor
+from app.middleware import admission, compression
+from app.models.sync_models import PushConsumerConfig, PushConsumerStatus, SyncJobStatus
+from app.routers.oauth_router import require_admin_scope
+from app.services import gradebook_service, oauth, oneroster_data_service
+from app.services.push_engine import engine as push_engine
+from app.services.sync_scheduler import scheduler
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"],
+    # Push consumers are arbitrary URLs the engine POSTs roster data to, so none of this is anonymous
+    dependencies=[Depends(require_admin_scope)],
+)
+
+@router.get("/sync/jobs", response_model=List[SyncJobStatus])
+async def get_sync_jobs():
+    """Last run time, duration and outcome of every background sync job."""
+    return scheduler.statuses()
+
+@router.get("/sync/jobs/{name}", response_model=SyncJobStatus)
+async def get_sync_job(name: str = Path(..., description="Sync job name, e.g. 'sis.roster' or 'lms.roster'")):
+    job = scheduler.get_job(name)
+    if not job:
+        raise HTTPException(status_code=404, detail="Sync job not found")
+    return job.status()
+
+@router.post("/sync/jobs/{name}/run", status_code=202, response_model=SyncJobStatus)
+async def trigger_sync_job(name: str = Path(..., description="Sync job name, e.g. 'sis.roster' or 'lms.roster'")):
+    """Starts a sync job right away in the background. 409 if it's already running."""
+    job = scheduler.get_job(name)
+    if not job:
+        raise HTTPException(status_code=404, detail="Sync job not found")
+    if not scheduler.trigger(name):
+        raise HTTPException(status_code=409, detail=f"Sync job '{name}' is already running")
+    return job.status()
+
+
+@router.get("/reconciliation", response_model=Dict[str, Any])
+async def get_reconciliation_report():
+    """Counts from the last SIS/LMS course and enrollment reconciliation (linked courses, drift, merges)."""
+    return oneroster_processor.last_reconciliation_report
+
+
+@router.get("/compression", response_model=Dict[str, Any])
+async def get_compression_stats():
+    """Offered response encodings and the hit rate of the compressed body cache."""
+    return {"encodings": compression.supported_encodings(), "cache": compression.compressed_body_cache.stats()}
+
+
+@router.get("/admission", response_model=Dict[str, Any])
+async def get_admission_stats():
+    """Bulkhead occupancy and shed counts, and per-client quota rejections, per pool (bulk / lookup)."""
+    return admission.admission_stats()
+
+
+@router.get("/generations", response_model=Dict[str, Any])
+async def get_snapshot_generations():
+    """Current snapshot generation, the older ones retained for paging clients and their estimated memory."""
+    return oneroster_data_service.get_generation_stats()
+
+
+@router.get("/integrity", response_model=Dict[str, Any])
+async def get_integrity_report():
+    """
+    Referential integrity of the latest checked snapshot: per foreign-key rule (e.g.
+    enrollments.classSourcedId -> classes) the number of records whose reference doesn't
+    resolve, with a sample of them.
+    """
+    return oneroster_data_service.get_integrity_report()
+
+
+@router.get("/search", response_model=Dict[str, Any])
+async def get_search_index_stats():
+    """Type-ahead search indexes of the current snapshot: full builds, build timing, sizes and overlay fill."""
+    return oneroster_data_service.get_search_stats()
+
+
+@router.get("/gradebook", response_model=Dict[str, Any])
+async def get_gradebook_stats():
+    """Gradebook record counts, plus live/dead rows and compactions of the append-only result log."""
+    return gradebook_service.get_gradebook_stats()
+
+
+@router.get("/oauth", response_model=Dict[str, Any])
+async def get_oauth_stats():
+    """OAuth2 tokens issued and rejected, and hit rate of the verified-token cache."""
+    return oauth.token_service.stats()
+
+
+# --- Outbound push to downstream consumers ---
+@router.get("/push/consumers", response_model=List[PushConsumerStatus])
+async def get_push_consumers():
+    """Checkpoint, backlog and delivery counts of every registered push consumer."""
+    return push_engine.statuses()
+
+@router.put("/push/consumers/{name}", response_model=PushConsumerStatus)
+async def register_push_consumer(name: str, config: PushConsumerConfig):
+    """Registers a consumer (or updates its config, keeping its checkpoint). Pushing starts right away."""
+    if config.name != name:
+        raise HTTPException(status_code=400, detail="Consumer name in the body doesn't match the path")
+    return await push_engine.register(config)
+
+@router.delete("/push/consumers/{name}", status_code=204)
+async def remove_push_consumer(name: str):
+    if not await push_engine.remove(name):
+        raise HTTPException(status_code=404, detail="Push consumer not found")
+
+@router.post("/push/consumers/{name}/reset", response_model=PushConsumerStatus)
+async def reset_push_consumer(name: str):
+    """Rewinds the consumer's checkpoint to the beginning, so it receives the full roster again."""
+    status = await push_engine.reset(name)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Push consumer not found")
+    return status
+
+@router.get("/push", response_model=Dict[str, Any])
+async def get_push_engine_stats():
+    """Shared lookup and batch body caches of the push engine."""
+    return push_engine.stats()
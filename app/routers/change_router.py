@@ -0,0 +1,41 @@
+# app/routers/change_router.py
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from app.models.change_models import SourceChangeEvent
+from app.services import change_feed
+from app.routers.oauth_router import require_changes_write_scope, require_roster_read_scope
+
+router = APIRouter(
+    prefix="/api/v1/changes",
+    tags=["Change Ingestion & Feed"],
+)
+
+@router.post("/ingest", status_code=202, dependencies=[Depends(require_changes_write_scope)])
+async def ingest_source_changes(events: List[SourceChangeEvent]):
+    """
+    Source systems push record-level change events here. Events are queued, coalesced
+    and applied to the live snapshot in the background.
+    """
+    if not change_feed.submit_events(events):
+        raise HTTPException(status_code=503, detail="Change ingestion is unavailable or its queue is full")
+    return {"accepted": len(events)}
+
+@router.get("/stream", dependencies=[Depends(require_roster_read_scope)])  # Full records, people included
+async def stream_oneroster_changes(
+    request: Request,
+    resume: Optional[int] = Query(None, ge=0, description="Last seq received; the stream resumes after it"),
+):
+    """
+    Server-Sent Events stream of OneRoster-level changes. Each event's `id` is its seq,
+    so browsers resume automatically via the Last-Event-ID header on reconnect.
+    A `reset` event means the resume point is gone and a full pull is needed.
+    """
+    if resume is None:
+        last_event_id = request.headers.get("last-event-id", "")
+        resume = int(last_event_id) if last_event_id.isdigit() else None
+    return StreamingResponse(
+        change_feed.stream_changes(resume),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,142 @@
+# app/routers/gradebook_router.py
+from fastapi import APIRouter, Body, Depends, HTTPException, Path, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
+from typing import Any, Awaitable, Callable, Dict, List, Type
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from app.models.gradebook_models import Category, LineItem, Result
+from app.routers.oauth_router import require_gradebook_scope
+from app.services import gradebook_service as service
+from app.services.response_serialization import dump_records_json
+
+# Same base path as the rostering endpoints: OneRoster v1.1 gradebook service
+router = APIRouter(
+    prefix="/ims/oneroster/v1p1",
+    tags=["OneRoster v1.1 Gradebook"],
+    dependencies=[Depends(require_gradebook_scope)],  # OAuth2 bearer token with a gradebook scope
+)
+
+
+async def _list_response(records: List[BaseModel]) -> Response:
+    # Same as the rostering lists: records are already validated, serialize them directly
+    return Response(content=await dump_records_json(records), media_type="application/json")
+
+
+_bulk_adapters: Dict[Type[BaseModel], TypeAdapter] = {model: TypeAdapter(List[model]) for model in (Category, LineItem, Result)}
+
+
+async def _bulk_upsert(request: Request, model: Type[BaseModel],
+                       upsert: Callable[[List[Any]], Awaitable[int]]) -> Dict[str, int]:
+    # Bulk bodies are validated straight from the raw JSON bytes: for thousands of results per
+    # request that's about twice as fast as FastAPI's parse-to-dicts-then-validate body handling.
+    try:
+        records = _bulk_adapters[model].validate_json(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False))
+    try:
+        return {"upserted": await upsert(records)}
+    except OverflowError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except service.UnknownReferenceError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except OSError as e:  # The write couldn't be journaled, so it wasn't applied either
+        raise HTTPException(status_code=503, detail=f"Gradebook storage unavailable: {e}")
+
+
+async def _single_upsert(sourced_id: str, record: BaseModel, upsert: Callable[[List[Any]], Awaitable[int]]) -> BaseModel:
+    if record.sourcedId != sourced_id:
+        raise HTTPException(status_code=400, detail="sourcedId in the body doesn't match the path")
+    try:
+        await upsert([record])
+    except service.UnknownReferenceError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except OSError as e:
+        raise HTTPException(status_code=503, detail=f"Gradebook storage unavailable: {e}")
+    return record
+
+
+# --- Categories ---
+@router.get("/categories", response_model=List[Category])
+async def get_all_categories(limit: int = Query(100, ge=1, le=10000), offset: int = Query(0, ge=0)):
+    return await _list_response(await service.get_categories(limit=limit, offset=offset))
+
+@router.get("/categories/{sourcedId}", response_model=Category)
+async def get_category(sourcedId: str = Path(..., description="The sourcedId of the category")):
+    category = await service.get_category_by_id(sourcedId)
+    if not category: raise HTTPException(status_code=404, detail="Category not found")
+    return category
+
+@router.put("/categories/{sourcedId}", response_model=Category)
+async def put_category(sourcedId: str = Path(...), category: Category = Body(...)):
+    return await _single_upsert(sourcedId, category, service.upsert_categories)
+
+@router.post("/categories", response_model=Dict[str, int])
+async def post_categories(request: Request):
+    """Creates or replaces categories in bulk. Body: a JSON array of categories."""
+    return await _bulk_upsert(request, Category, service.upsert_categories)
+
+# --- Line Items ---
+@router.get("/lineItems", response_model=List[LineItem])
+async def get_all_line_items(limit: int = Query(100, ge=1, le=10000), offset: int = Query(0, ge=0)):
+    return await _list_response(await service.get_line_items(limit=limit, offset=offset))
+
+@router.get("/lineItems/{sourcedId}", response_model=LineItem)
+async def get_line_item(sourcedId: str = Path(..., description="The sourcedId of the line item")):
+    line_item = await service.get_line_item_by_id(sourcedId)
+    if not line_item: raise HTTPException(status_code=404, detail="Line item not found")
+    return line_item
+
+@router.put("/lineItems/{sourcedId}", response_model=LineItem)
+async def put_line_item(sourcedId: str = Path(...), line_item: LineItem = Body(...)):
+    return await _single_upsert(sourcedId, line_item, service.upsert_line_items)
+
+@router.post("/lineItems", response_model=Dict[str, int])
+async def post_line_items(request: Request):
+    """Creates or replaces line items in bulk. Body: a JSON array of line items; their categories must exist."""
+    return await _bulk_upsert(request, LineItem, service.upsert_line_items)
+
+@router.get("/classes/{sourcedId}/lineItems", response_model=List[LineItem])
+async def get_line_items_for_class(
+        sourcedId: str = Path(..., description="The sourcedId of the class"),
+        limit: int = Query(100, ge=1, le=10000), offset: int = Query(0, ge=0)
+):
+    return await _list_response(await service.get_line_items_for_class(sourcedId, limit=limit, offset=offset))
+
+# --- Results ---
+@router.get("/results", response_model=List[Result])
+async def get_all_results(limit: int = Query(100, ge=1, le=10000), offset: int = Query(0, ge=0)):
+    return await _list_response(await service.get_results(limit=limit, offset=offset))
+
+@router.get("/results/{sourcedId}", response_model=Result)
+async def get_result(sourcedId: str = Path(..., description="The sourcedId of the result")):
+    result = await service.get_result_by_id(sourcedId)
+    if not result: raise HTTPException(status_code=404, detail="Result not found")
+    return result
+
+@router.put("/results/{sourcedId}", response_model=Result)
+async def put_result(sourcedId: str = Path(...), result: Result = Body(...)):
+    return await _single_upsert(sourcedId, result, service.upsert_results)
+
+@router.post("/results", response_model=Dict[str, int])
+async def post_results(request: Request):
+    """
+    Creates or replaces results in bulk (append-only store, so this is the fast path for
+    grade pushes). Body: a JSON array of up to ONEROSTER_GRADEBOOK_MAX_BULK_RECORDS results
+    (413 beyond that). All-or-nothing: 422 if any result references an unknown line item.
+    """
+    return await _bulk_upsert(request, Result, service.upsert_results)
+
+@router.get("/lineItems/{sourcedId}/results", response_model=List[Result])
+async def get_results_for_line_item(
+        sourcedId: str = Path(..., description="The sourcedId of the line item"),
+        limit: int = Query(100, ge=1, le=10000), offset: int = Query(0, ge=0)
+):
+    if not await service.get_line_item_by_id(sourcedId):
+        raise HTTPException(status_code=404, detail="Line item not found")
+    return await _list_response(await service.get_results_for_line_item(sourcedId, limit=limit, offset=offset))
+
+@router.get("/students/{sourcedId}/results", response_model=List[Result])
+async def get_results_for_student(
+        sourcedId: str = Path(..., description="The sourcedId of the student"),
+        limit: int = Query(100, ge=1, le=10000), offset: int = Query(0, ge=0)
+):
+    return await _list_response(await service.get_results_for_student(sourcedId, limit=limit, offset=offset))
@@ -0,0 +1,26 @@
+# app/routers/mock_consumer_router.py
+from fastapi import APIRouter, Body, HTTPException, Query
+from typing import Dict, Any
+from app.mock_systems import consumer
+
+router = APIRouter(
+    prefix="/mock/consumer",
+    tags=["Mock Downstream Consumer"],
+)
+
+@router.post("/{name}/changes")
+async def receive_pushed_changes(name: str, batch: Dict[str, Any] = Body(...)):
+    """Push target for a registered consumer, e.g. url http://127.0.0.1:8006/mock/consumer/demo/changes"""
+    if not consumer.receive_batch(name, batch):
+        raise HTTPException(status_code=503, detail="Simulated consumer outage")
+    return {"received": len(batch.get("changes", []))}
+
+@router.get("/{name}", response_model=Dict[str, Any])
+async def read_consumer_summary(name: str):
+    """Record counts of the consumer's copy of the roster, plus batches received and rejected."""
+    return consumer.get_consumer_summary(name)
+
+@router.post("/{name}/fail", response_model=Dict[str, Any])
+async def simulate_consumer_outage(name: str, count: int = Query(3, ge=0, description="Upcoming batches to reject")):
+    consumer.fail_next_batches(name, count)
+    return {"failNextBatches": count}
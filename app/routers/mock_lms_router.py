@@ -1,7 +1,9 @@
 # app/routers/mock_lms_router.py
-from fastapi import APIRouter
-from typing import List, Dict, Any
+from fastapi import APIRouter, Body, HTTPException, Response
+from typing import List, Dict, Any, Optional
 from app.mock_systems import lms # Import your mock LMS module
+from app.models.change_models import SourceChangeEvent, ChangeOperation
+from app.services import change_feed
 
 router = APIRouter(
     prefix="/mock/lms",
@@ -14,4 +16,40 @@ async def read_lms_courses():
 
 @router.get("/users", response_model=List[Dict[str, Any]])
 async def read_lms_users():
-    return lms.get_lms_users()
\ No newline at end of file
+    return lms.get_lms_users()
+
+
+# --- Simulated changes: mutate the mock LMS and push a change event, like a real LMS webhook would ---
+def _push_change(entity: str, key: str, record: Optional[Dict[str, Any]] = None) -> None:
+    operation = ChangeOperation.UPSERT if record is not None else ChangeOperation.DELETE
+    event = SourceChangeEvent(source="lms", entity=entity, key=key, operation=operation, record=record)
+    if not change_feed.submit_events([event]):
+        print(f"Warning: Change ingestion not running, LMS {entity} change for {key} waits for the next full sync.")
+
+@router.put("/users/{lms_username}", response_model=Dict[str, Any])
+async def upsert_lms_user(lms_username: str, record: Dict[str, Any] = Body(...)):
+    record = {**record, "lms_username": lms_username}
+    lms.upsert_lms_user(record)
+    _push_change("users", lms_username, record)
+    return record
+
+@router.delete("/users/{lms_username}", status_code=204)
+async def delete_lms_user(lms_username: str):
+    if not lms.delete_lms_user(lms_username):
+        raise HTTPException(status_code=404, detail="User not found")
+    _push_change("users", lms_username)
+    return Response(status_code=204)
+
+@router.put("/courses/{lms_course_id}", response_model=Dict[str, Any])
+async def upsert_lms_course(lms_course_id: str, record: Dict[str, Any] = Body(...)):
+    record = {**record, "lms_course_id": lms_course_id}
+    lms.upsert_lms_course(record)
+    _push_change("courses", lms_course_id, record)
+    return record
+
+@router.delete("/courses/{lms_course_id}", status_code=204)
+async def delete_lms_course(lms_course_id: str):
+    if not lms.delete_lms_course(lms_course_id):
+        raise HTTPException(status_code=404, detail="Course not found")
+    _push_change("courses", lms_course_id)
+    return Response(status_code=204)
\ No newline at end of file
@@ -1,7 +1,9 @@
 # app/routers/mock_sis_router.py
-from fastapi import APIRouter
-from typing import List, Dict, Any
+from fastapi import APIRouter, Body, HTTPException, Response
+from typing import List, Dict, Any, Optional
 from app.mock_systems import sis # Import your mock SIS module
+from app.models.change_models import SourceChangeEvent, ChangeOperation
+from app.services import change_feed
 
 router = APIRouter(
     prefix="/mock/sis",
@@ -22,4 +24,54 @@ async def read_sis_courses():
 
 @router.get("/orgs", response_model=List[Dict[str, Any]])
 async def read_sis_orgs():
-    return sis.get_sis_orgs()
\ No newline at end of file
+    return sis.get_sis_orgs()
+
+
+# --- Simulated changes: mutate the mock SIS and push a change event, like a real SIS webhook would ---
+def _push_change(entity: str, key: str, record: Optional[Dict[str, Any]] = None) -> None:
+    operation = ChangeOperation.UPSERT if record is not None else ChangeOperation.DELETE
+    event = SourceChangeEvent(source="sis", entity=entity, key=key, operation=operation, record=record)
+    if not change_feed.submit_events([event]):
+        print(f"Warning: Change ingestion not running, SIS {entity} change for {key} waits for the next full sync.")
+
+@router.put("/students/{sis_student_id}", response_model=Dict[str, Any])
+async def upsert_sis_student(sis_student_id: str, record: Dict[str, Any] = Body(...)):
+    record = {**record, "sis_student_id": sis_student_id}
+    sis.upsert_sis_student(record)
+    _push_change("students", sis_student_id, record)
+    return record
+
+@router.delete("/students/{sis_student_id}", status_code=204)
+async def delete_sis_student(sis_student_id: str):
+    if not sis.delete_sis_student(sis_student_id):
+        raise HTTPException(status_code=404, detail="Student not found")
+    _push_change("students", sis_student_id)
+    return Response(status_code=204)
+
+@router.put("/teachers/{sis_teacher_id}", response_model=Dict[str, Any])
+async def upsert_sis_teacher(sis_teacher_id: str, record: Dict[str, Any] = Body(...)):
+    record = {**record, "sis_teacher_id": sis_teacher_id}
+    sis.upsert_sis_teacher(record)
+    _push_change("teachers", sis_teacher_id, record)
+    return record
+
+@router.delete("/teachers/{sis_teacher_id}", status_code=204)
+async def delete_sis_teacher(sis_teacher_id: str):
+    if not sis.delete_sis_teacher(sis_teacher_id):
+        raise HTTPException(status_code=404, detail="Teacher not found")
+    _push_change("teachers", sis_teacher_id)
+    return Response(status_code=204)
+
+@router.put("/courses/{course_code}", response_model=Dict[str, Any])
+async def upsert_sis_course(course_code: str, record: Dict[str, Any] = Body(...)):
+    record = {**record, "course_code": course_code}
+    sis.upsert_sis_course(record)
+    _push_change("courses", course_code, record)
+    return record
+
+@router.delete("/courses/{course_code}", status_code=204)
+async def delete_sis_course(course_code: str):
+    if not sis.delete_sis_course(course_code):
+        raise HTTPException(status_code=404, detail="Course not found")
+    _push_change("courses", course_code)
+    return Response(status_code=204)
\ No newline at end of file
@@ -0,0 +1,108 @@
+# app/routers/oauth_router.py
+import base64
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, unquote
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse
+from app.services import oauth
+
+router = APIRouter(
+    prefix="/oauth",
+    tags=["OAuth2"],
+)
+
+V1P1_PREFIX = "/ims/oneroster/v1p1/"
+# Rostering collections roster-core.readonly gives access to; everything else needs roster.readonly
+CORE_COLLECTIONS = frozenset({"orgs", "schools", "academicSessions", "terms", "gradingPeriods", "courses", "classes"})
+
+
+def _token_error(status_code: int, error: str, description: str, headers: Optional[dict] = None) -> JSONResponse:
+    # RFC 6749 section 5.2 error response
+    return JSONResponse(status_code=status_code, content={"error": error, "error_description": description},
+                        headers={"Cache-Control": "no-store", **(headers or {})})
+
+
+def _basic_credentials(authorization: Optional[str]) -> Optional[Tuple[str, str]]:
+    if not authorization or authorization[:6].lower() != "basic ":
+        return None
+    try:
+        client_id, _, client_secret = base64.b64decode(authorization[6:].strip()).decode().partition(":")
+    except ValueError:  # Bad base64 (binascii.Error), non-ASCII header text, or undecodable bytes
+        return None
+    return unquote(client_id), unquote(client_secret)
+
+
+@router.post("/token")
+async def issue_token(request: Request):
+    """
+    OAuth2 token endpoint, client credentials grant. Form body: grant_type=client_credentials and
+    an optional space-separated scope; the client authenticates with HTTP Basic or with
+    client_id/client_secret in the form.
+    """
+    # The form is parsed by hand: FastAPI's Form() needs python-multipart, which isn't a dependency
+    form = {key: values[0] for key, values in parse_qs((await request.body()).decode(errors="replace")).items()}
+    if form.get("grant_type") != "client_credentials":
+        return _token_error(400, "unsupported_grant_type", "Only grant_type=client_credentials is supported")
+    credentials = _basic_credentials(request.headers.get("authorization"))
+    if credentials is None:
+        credentials = (form.get("client_id", ""), form.get("client_secret", ""))
+    try:
+        token = oauth.token_service.issue(credentials[0], credentials[1], form.get("scope"))
+    except oauth.InvalidClientError as e:
+        return _token_error(401, "invalid_client", str(e), {"WWW-Authenticate": 'Basic realm="oneroster"'})
+    except oauth.InvalidScopeError as e:
+        return _token_error(400, "invalid_scope", str(e))
+    return JSONResponse(content=token, headers={"Cache-Control": "no-store", "Pragma": "no-cache"})
+
+
+def _authorize(request: Request, accepted: Tuple[str, ...]) -> None:
+    if not oauth.OAUTH_ENABLED:
+        return
+    authorization = request.headers.get("authorization")
+    if not authorization or authorization[:7].lower() != "bearer ":
+        raise HTTPException(status_code=401, detail="Bearer token required",
+                            headers={"WWW-Authenticate": 'Bearer realm="oneroster"'})
+    try:
+        scopes = oauth.token_service.authorize(authorization[7:].strip())
+    except oauth.InvalidTokenError as e:
+        raise HTTPException(status_code=401, detail=str(e),
+                            headers={"WWW-Authenticate": 'Bearer realm="oneroster", error="invalid_token"'})
+    if scopes.isdisjoint(accepted):
+        raise HTTPException(status_code=403, detail="Token lacks the scope for this resource",
+                            headers={"WWW-Authenticate": f'Bearer realm="oneroster", error="insufficient_scope", '
+                                                         f'scope="{accepted[-1]}"'})
+
+
+async def require_roster_scope(request: Request) -> None:
+    """
+    Router dependency of the v1p1 rostering endpoints. roster.readonly grants every endpoint;
+    roster-core.readonly those whose collections (e.g. courses/{id}/classes) are all core data.
+    """
+    segments = request.url.path[len(V1P1_PREFIX):].split("/")
+    if all(collection in CORE_COLLECTIONS for collection in segments[::2]):
+        _authorize(request, (oauth.SCOPE_ROSTER_CORE, oauth.SCOPE_ROSTER))
+    else:
+        _authorize(request, (oauth.SCOPE_ROSTER,))
+
+
+async def require_roster_read_scope(request: Request) -> None:
+    """Router dependency of the custom combined-data endpoints, which span every rostering collection."""
+    _authorize(request, (oauth.SCOPE_ROSTER,))
+
+
+async def require_gradebook_scope(request: Request) -> None:
+    """Router dependency of the gradebook endpoints: reads take either gradebook scope, writes createput."""
+    if request.method == "GET":
+        _authorize(request, (oauth.SCOPE_GRADEBOOK_READ, oauth.SCOPE_GRADEBOOK_WRITE))
+    else:
+        _authorize(request, (oauth.SCOPE_GRADEBOOK_WRITE,))
+
+
+async def require_admin_scope(request: Request) -> None:
+    """Router dependency of /admin, which can trigger syncs and register push targets."""
+    _authorize(request, (oauth.SCOPE_ADMIN,))
+
+
+async def require_changes_write_scope(request: Request) -> None:
+    """Dependency of change ingestion, which writes into the live snapshot: changes.write, or admin."""
+    _authorize(request, (oauth.SCOPE_ADMIN, oauth.SCOPE_CHANGES_WRITE))
@@ -1,32 +1,162 @@
 # app/routers/oneroster_router.py
-from fastapi import APIRouter, HTTPException, Query, Path
-from typing import List, Optional
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Path, Response
+from fastapi.responses import JSONResponse
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence
+from pydantic import BaseModel
 from app.services import oneroster_data_service as service # Import the new service
+from app.routers.oauth_router import require_roster_read_scope, require_roster_scope
+from app.services.response_serialization import dump_records_json, dump_processed_data_json
+from app.services.nested_query import InvalidExpansionError, RELATIONS
+from app.services.snapshot_generations import (
+    GENERATION_HEADER, GenerationExpiredError, InvalidGenerationTokenError, SnapshotGeneration,
+)
+from app.middleware.compression import cached_compressed_body
 from app.models.oneroster_models import ( # Import Pydantic models for response_model
     Org, User, Class, Course, AcademicSession, Enrollment # Add others as you implement endpoints
 )
 
+GENERATION_QUERY = Query(None, description=f"Generation token from the {GENERATION_HEADER} header of a previous page")
+ACTIVE_ON_QUERY = Query(None, alias="activeOn", description="Only records whose date range includes this day (YYYY-MM-DD)")
+
+
+async def _resolve_generation(token: Optional[str]) -> SnapshotGeneration:
+    try:
+        return await service.get_generation(token)
+    except InvalidGenerationTokenError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except GenerationExpiredError as e:
+        raise HTTPException(status_code=410, detail=str(e))
+
+
+def _cached_response(generation: SnapshotGeneration) -> Optional[Response]:
+    # The compressed body of the same request against the same generation, if the compression
+    # middleware kept one: sent as is, without serializing the records again
+    cached = cached_compressed_body(generation.token)
+    if cached is None:
+        return None
+    body, encoding = cached
+    return Response(content=body, media_type="application/json", headers={
+        GENERATION_HEADER: generation.token, "Content-Encoding": encoding, "Vary": "Accept-Encoding"})
+
+
+async def _list_response(records: Sequence[BaseModel], generation: Optional[SnapshotGeneration] = None) -> Response:
+    # Snapshot records are already validated: serialize them directly (in chunks, yielding to
+    # the event loop) instead of letting FastAPI re-validate the list against response_model.
+    # response_model stays on the routes for the OpenAPI docs.
+    if generation is not None:
+        cached = _cached_response(generation)
+        if cached is not None:
+            return cached
+    headers = {GENERATION_HEADER: generation.token} if generation else None
+    return Response(content=await dump_records_json(records), media_type="application/json", headers=headers)
+
+
 # This router can be for your custom combined endpoint
 custom_router = APIRouter(
     prefix="/api/v1/oneroster",
     tags=["Custom Processed OneRoster Data"],
+    dependencies=[Depends(require_roster_read_scope)],  # Serves all rostering data, so roster.readonly
 )
 
 @custom_router.get("/all", response_model=service.ProcessedOneRosterData) # Use the ProcessedOneRosterData model
-async def read_all_processed_oneroster_data():
+async def read_all_processed_oneroster_data(generation: Optional[str] = GENERATION_QUERY):
     """
     Retrieves all processed and transformed data in OneRoster v1.1 format
     from the connected source systems. (Custom endpoint)
     """
-    data = await service.get_all_data() # Use the service
-    return data
+    snapshot = await _resolve_generation(generation) # Use the service
+    cached = _cached_response(snapshot)
+    if cached is not None:
+        return cached
+    return Response(content=await dump_processed_data_json(snapshot.data), media_type="application/json",
+                    headers={GENERATION_HEADER: snapshot.token})
+
+
+@custom_router.get("/summary", response_model=Dict[str, int])
+async def read_oneroster_summary(generation: Optional[str] = GENERATION_QUERY):
+    """
+    Record counts per entity type (plus active users, students and teachers) of the current
+    snapshot, so dashboards can show totals without downloading /all. (Custom endpoint)
+    """
+    snapshot = await _resolve_generation(generation)
+    summary = await service.get_summary(generation=snapshot.token)
+    return JSONResponse(content=summary, headers={GENERATION_HEADER: snapshot.token})
+
+
+SEARCH_TYPES = tuple(service.SEARCH_FIELDS)
+
+
+@custom_router.get("/search", response_model=Dict[str, List[Dict]])
+async def search_oneroster(
+        q: str = Query(..., min_length=1, max_length=200, description="Search text: word prefixes, e.g. 'ali smi'"),
+        types: str = Query(",".join(SEARCH_TYPES), description="Comma-separated entity types to search"),
+        limit: int = Query(10, ge=1, le=100, description="Results per entity type")
+):
+    """
+    Type-ahead search over users (names, username, email, identifier), classes and courses
+    (title, code). Every word of q must match a word of the record as a prefix, or as a
+    substring for names, titles and codes; results come back ranked per type, from the current
+    snapshot (see the generation header). (Custom endpoint)
+    """
+    entity_types = [t.strip() for t in types.split(",") if t.strip()]
+    unknown = [t for t in entity_types if t not in SEARCH_TYPES]
+    if unknown or not entity_types:
+        raise HTTPException(status_code=400, detail=f"types must be a subset of {', '.join(SEARCH_TYPES)}")
+    results, snapshot = await service.search(q, entity_types, limit)
+    parts = [f'"{t}":'.encode() + await dump_records_json(records) for t, records in results.items()]
+    return Response(content=b"{" + b",".join(parts) + b"}", media_type="application/json",
+                    headers={GENERATION_HEADER: snapshot.token})
+
+
+QUERY_TYPES = tuple(RELATIONS)
+MAX_QUERY_IDS = 1000
+
+
+@custom_router.get("/query/{entity_type}", response_model=Dict[str, Any])
+async def query_oneroster(
+        entity_type: str = Path(..., description=f"Root entity type: one of {', '.join(QUERY_TYPES)}"),
+        expand: Optional[str] = Query(None, description="Comma-separated relations, dotted to nest: "
+                                                        "'students,teachers,course,school,terms' or 'classes.students'"),
+        ids: Optional[str] = Query(None, description="Comma-separated root sourcedIds (instead of a page of the list)"),
+        limit: int = Query(100, ge=1, le=10000),
+        offset: int = Query(0, ge=0),
+        filter: Optional[str] = Query(None, alias="filter"),
+        generation: Optional[str] = GENERATION_QUERY,
+):
+    """
+    A root set plus nested expansions in one round trip, e.g. a school's classes with their
+    students, teachers, course and terms. The response holds the roots under the entity type,
+    "relationships" (expand path -> parent sourcedId -> target sourcedId(s)) and "included"
+    (every expanded record once, per entity type). (Custom endpoint)
+    """
+    if entity_type not in QUERY_TYPES:
+        raise HTTPException(status_code=404, detail=f"Unknown entity type '{entity_type}'")
+    root_ids = [i.strip() for i in ids.split(",") if i.strip()] if ids is not None else None
+    if root_ids is not None and len(root_ids) > MAX_QUERY_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_QUERY_IDS} ids per query")
+    snapshot = await _resolve_generation(generation)
+    cached = _cached_response(snapshot)
+    if cached is not None:
+        return cached
+    try:
+        roots, relationships, included, snapshot = await service.query_nested(
+            entity_type, expand, ids=root_ids, limit=limit, offset=offset, filter_str=filter, generation=snapshot.token)
+    except InvalidExpansionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    included_parts = [f'"{t}":'.encode() + await dump_records_json(records) for t, records in included.items()]
+    content = (f'{{"{entity_type}":'.encode() + await dump_records_json(roots)
+               + b',"relationships":' + json.dumps(relationships, separators=(",", ":")).encode()
+               + b',"included":{' + b",".join(included_parts) + b"}}")
+    return Response(content=content, media_type="application/json", headers={GENERATION_HEADER: snapshot.token})
 
 
 # New Router for standard OneRoster v1.1 endpoints
 oneroster_v1p1_router = APIRouter(
     prefix="/ims/oneroster/v1p1", # Standard OneRoster base path
     tags=["OneRoster v1.1 API"],
-    # TODO: Add dependencies for OAuth2 security here later
+    dependencies=[Depends(require_roster_scope)],  # OAuth2 bearer token with a roster scope (see oauth_router)
 )
 
 # --- Orgs Endpoints ---
@@ -34,11 +164,13 @@ oneroster_v1p1_router = APIRouter(
 async def get_all_orgs(
     limit: int = Query(100, ge=1, le=10000, description="Number of records to return"),
     offset: int = Query(0, ge=0, description="Offset for pagination"),
-    filter: Optional[str] = Query(None, alias="filter", description="FIQL filter expression (basic support)")
+    filter: Optional[str] = Query(None, alias="filter", description="FIQL filter expression (basic support)"),
+    generation: Optional[str] = GENERATION_QUERY,
 ):
-    orgs = await service.get_orgs(limit=limit, offset=offset, filter_str=filter)
+    snapshot = await _resolve_generation(generation)
+    orgs = await service.get_orgs(limit=limit, offset=offset, filter_str=filter, generation=snapshot.token)
     # TODO: Set X-Total-Count header in the actual response for pagination
-    return orgs
+    return await _list_response(orgs, snapshot)
 
 @oneroster_v1p1_router.get("/orgs/{sourcedId}", response_model=Org)
 async def get_org(sourcedId: str = Path(..., description="The sourcedId of the organization")):
@@ -52,10 +184,12 @@ async def get_org(sourcedId: str = Path(..., description="The sourcedId of the o
 async def get_all_users(
     limit: int = Query(100, ge=1, le=10000),
     offset: int = Query(0, ge=0),
-    filter: Optional[str] = Query(None, alias="filter") # Basic filter support
+    filter: Optional[str] = Query(None, alias="filter"), # Basic filter support
+    generation: Optional[str] = GENERATION_QUERY,
 ):
-    users = await service.get_users(limit=limit, offset=offset, filter_str=filter)
-    return users
+    snapshot = await _resolve_generation(generation)
+    users = await service.get_users(limit=limit, offset=offset, filter_str=filter, generation=snapshot.token)
+    return await _list_response(users, snapshot)
 
 @oneroster_v1p1_router.get("/users/{sourcedId}", response_model=User)
 async def get_user(sourcedId: str = Path(..., description="The sourcedId of the user")):
@@ -69,10 +203,14 @@ async def get_user(sourcedId: str = Path(..., description="The sourcedId of the
 async def get_all_classes(
     limit: int = Query(100, ge=1, le=10000),
     offset: int = Query(0, ge=0),
-    filter: Optional[str] = Query(None, alias="filter")
+    filter: Optional[str] = Query(None, alias="filter"),
+    generation: Optional[str] = GENERATION_QUERY,
+    active_on: Optional[date] = ACTIVE_ON_QUERY,
 ):
-    classes = await service.get_classes(limit=limit, offset=offset, filter_str=filter)
-    return classes
+    snapshot = await _resolve_generation(generation)
+    classes = await service.get_classes(limit=limit, offset=offset, filter_str=filter, generation=snapshot.token,
+                                        active_on=active_on)
+    return await _list_response(classes, snapshot)
 
 @oneroster_v1p1_router.get("/classes/{sourcedId}", response_model=Class)
 async def get_class(sourcedId: str = Path(..., description="The sourcedId of the class")):
@@ -93,7 +231,7 @@ async def get_students_in_class(
     if not cls:
         raise HTTPException(status_code=404, detail="Class not found")
     students = await service.get_students_for_class(class_sourced_id=sourcedId, limit=limit, offset=offset)
-    return students
+    return await _list_response(students)
 
 @oneroster_v1p1_router.get("/classes/{sourcedId}/teachers", response_model=List[User])
 async def get_teachers_in_class(
@@ -105,14 +243,17 @@ async def get_teachers_in_class(
     if not cls:
         raise HTTPException(status_code=404, detail="Class not found")
     teachers = await service.get_teachers_for_class(class_sourced_id=sourcedId, limit=limit, offset=offset)
-    return teachers
+    return await _list_response(teachers)
 
 
 # --- Courses Endpoints --- (NEW)
 @oneroster_v1p1_router.get("/courses", response_model=List[Course])
 async def get_all_courses(limit: int = Query(100, ge=1, le=10000), offset: int = Query(0, ge=0),
-                          filter: Optional[str] = Query(None, alias="filter")):
-    return await service.get_courses(limit=limit, offset=offset, filter_str=filter)
+                          filter: Optional[str] = Query(None, alias="filter"),
+                          generation: Optional[str] = GENERATION_QUERY):
+    snapshot = await _resolve_generation(generation)
+    records = await service.get_courses(limit=limit, offset=offset, filter_str=filter, generation=snapshot.token)
+    return await _list_response(records, snapshot)
 
 
 @oneroster_v1p1_router.get("/courses/{sourcedId}", response_model=Course)
@@ -128,19 +269,23 @@ async def get_classes_for_a_course(
         limit: int = Query(100, ge=1, le=10000),
         offset: int = Query(0, ge=0)
 ):
-    # Service function get_classes_for_course already checks if course exists
     classes = await service.get_classes_for_course(course_sourced_id=sourcedId, limit=limit, offset=offset)
     if not classes and not await service.get_course_by_id(
-            sourcedId):  # double check if course itself was not found vs no classes
+            sourcedId):  # No classes: tell an unknown course apart from a course without classes
         raise HTTPException(status_code=404, detail=f"Course with sourcedId '{sourcedId}' not found.")
-    return classes
+    return await _list_response(classes)
 
 
 # --- Enrollments Endpoints --- (NEW)
 @oneroster_v1p1_router.get("/enrollments", response_model=List[Enrollment])
 async def get_all_enrollments(limit: int = Query(100, ge=1, le=10000), offset: int = Query(0, ge=0),
-                              filter: Optional[str] = Query(None, alias="filter")):
-    return await service.get_enrollments(limit=limit, offset=offset, filter_str=filter)
+                              filter: Optional[str] = Query(None, alias="filter"),
+                              generation: Optional[str] = GENERATION_QUERY,
+                              active_on: Optional[date] = ACTIVE_ON_QUERY):
+    snapshot = await _resolve_generation(generation)
+    records = await service.get_enrollments(limit=limit, offset=offset, filter_str=filter, generation=snapshot.token,
+                                            active_on=active_on)
+    return await _list_response(records, snapshot)
 
 
 @oneroster_v1p1_router.get("/enrollments/{sourcedId}", response_model=Enrollment)
@@ -153,8 +298,13 @@ async def get_enrollment(sourcedId: str = Path(..., description="The sourcedId o
 # --- Academic Sessions Endpoints --- (NEW)
 @oneroster_v1p1_router.get("/academicSessions", response_model=List[AcademicSession])
 async def get_all_academic_sessions(limit: int = Query(100, ge=1, le=10000), offset: int = Query(0, ge=0),
-                                    filter: Optional[str] = Query(None, alias="filter")):
-    return await service.get_academic_sessions(limit=limit, offset=offset, filter_str=filter)
+                                    filter: Optional[str] = Query(None, alias="filter"),
+                                    generation: Optional[str] = GENERATION_QUERY,
+                                    active_on: Optional[date] = ACTIVE_ON_QUERY):
+    snapshot = await _resolve_generation(generation)
+    records = await service.get_academic_sessions(limit=limit, offset=offset, filter_str=filter, generation=snapshot.token,
+                                                  active_on=active_on)
+    return await _list_response(records, snapshot)
 
 
 @oneroster_v1p1_router.get("/academicSessions/{sourcedId}", response_model=AcademicSession)
@@ -164,6 +314,18 @@ async def get_academic_session(sourcedId: str = Path(..., description="The sourc
     return session
 
 
+@oneroster_v1p1_router.get("/terms/{sourcedId}/classes", response_model=List[Class])
+async def get_classes_for_a_term(
+        sourcedId: str = Path(..., description="The sourcedId of the term (academic session)"),
+        limit: int = Query(100, ge=1, le=10000),
+        offset: int = Query(0, ge=0)
+):
+    if not await service.get_academic_session_by_id(sourcedId):
+        raise HTTPException(status_code=404, detail=f"Term with sourcedId '{sourcedId}' not found.")
+    classes = await service.get_classes_for_term(term_sourced_id=sourcedId, limit=limit, offset=offset)
+    return await _list_response(classes)
+
+
 # --- Other common nested resources (Examples) ---
 @oneroster_v1p1_router.get("/users/{sourcedId}/classes", response_model=List[Class])
 async def get_classes_for_user(
@@ -173,17 +335,8 @@ async def get_classes_for_user(
 ):
     user = await service.get_user_by_id(sourcedId)
     if not user: raise HTTPException(status_code=404, detail="User not found")
-
-    all_data = await service.get_all_data()
-    class_ids = set()
-    for enr in all_data.enrollments:
-        if enr.userSourcedId == sourcedId:
-            if role and enr.role.value != role:  # RoleType enum
-                continue
-            class_ids.add(enr.classSourcedId)
-
-    classes = [cls for cls in all_data.classes if cls.sourcedId in class_ids]
-    return classes[offset: offset + limit]
+    classes = await service.get_classes_for_user(sourcedId, role=role, limit=limit, offset=offset)
+    return await _list_response(classes)
 
 
 # TODO: Implement more robust filtering, field selection, sorting as per OneRoster spec
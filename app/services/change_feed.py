@@ -0,0 +1,137 @@
+# app/services/change_feed.py
+import asyncio
+import itertools
+import json
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from app.models.change_models import SourceChangeEvent, OneRosterChange
+from app.services.record_versions import RecordChange
+
+COALESCE_WINDOW_SECONDS = 0.05  # How long the worker waits for a burst of pushes before applying them
+MAX_INGEST_QUEUE_SIZE = 100_000  # Pending source events; pushes beyond this are rejected
+CHANGE_LOG_MAX_ENTRIES = 50_000  # OneRoster changes kept for resuming subscribers
+SSE_HEARTBEAT_SECONDS = 15.0
+
+
+class ChangeLog:
+    """
+    Bounded in-memory log of OneRoster-level changes. Sequence numbers are contiguous,
+    so a subscriber's last seen seq is all it needs to resume.
+    """
+
+    def __init__(self, max_entries: int = CHANGE_LOG_MAX_ENTRIES):
+        self._entries: Deque[OneRosterChange] = deque(maxlen=max_entries)
+        self._last_seq = 0
+        self._new_entries = asyncio.Event()
+
+    @property
+    def last_seq(self) -> int:
+        return self._last_seq
+
+    def publish(self, changes: List[RecordChange]) -> int:
+        """Appends changes to the log and wakes up subscribers. Returns the last seq."""
+        for entity_type, operation, sourced_id, record in changes:
+            self._last_seq += 1
+            self._entries.append(OneRosterChange(
+                seq=self._last_seq,
+                entityType=entity_type,
+                sourcedId=sourced_id,
+                operation=operation,
+                record=record.model_dump(mode="json") if record is not None else None,
+            ))
+        if changes:
+            # Swap the event so waiters registered from now on block until the next publish
+            new_entries, self._new_entries = self._new_entries, asyncio.Event()
+            new_entries.set()
+        return self._last_seq
+
+    def read_since(self, seq: int) -> Optional[List[OneRosterChange]]:
+        """
+        Returns the changes after `seq`, or None if some of them were already evicted
+        from the log (the subscriber has to resync the full roster). A seq past the end of
+        the log is from before a restart (seqs start over with the process), so it's None too.
+        """
+        if seq > self._last_seq:
+            return None
+        if seq == self._last_seq:
+            return []
+        first_seq = self._entries[0].seq if self._entries else self._last_seq + 1
+        if seq < first_seq - 1:
+            return None
+        return list(itertools.islice(self._entries, seq - first_seq + 1, None))
+
+    def wait_for_new(self) -> Awaitable[bool]:
+        # Bound to the current event right away (not when first awaited), so a publish between
+        # calling this and awaiting it still wakes the caller up
+        return self._new_entries.wait()
+
+
+change_log = ChangeLog()
+_ingest_queue: Optional[asyncio.Queue] = None  # Created by the worker, so it's bound to the app's event loop
+
+
+def submit_events(events: List[SourceChangeEvent]) -> bool:
+    """
+    Queues pushed source events for the ingest worker. Returns False if ingestion
+    isn't running or the queue is full (the next full sync still picks the changes up).
+    """
+    if _ingest_queue is None:
+        return False
+    if _ingest_queue.qsize() + len(events) > MAX_INGEST_QUEUE_SIZE:
+        return False
+    for event in events:
+        _ingest_queue.put_nowait(event)
+    return True
+
+
+async def run_ingest_worker(apply_batch: Callable[[List[SourceChangeEvent]], Awaitable[None]]) -> None:
+    """
+    Drains the ingest queue forever: waits for a burst of events, coalesces them so only
+    the latest event per source record survives, and applies the batch in one go.
+    """
+    global _ingest_queue
+    _ingest_queue = asyncio.Queue()
+    try:
+        while True:
+            first = await _ingest_queue.get()
+            await asyncio.sleep(COALESCE_WINDOW_SECONDS)
+            batch: Dict[Tuple[str, str, str], SourceChangeEvent] = {(first.source, first.entity, first.key): first}
+            while not _ingest_queue.empty():
+                event = _ingest_queue.get_nowait()
+                key = (event.source, event.entity, event.key)
+                batch.pop(key, None)  # Re-insert so the batch stays in arrival order of the latest events
+                batch[key] = event
+            try:
+                await apply_batch(list(batch.values()))
+            except Exception as e:
+                print(f"Warning: Failed to apply {len(batch)} source change events: {e}")
+    finally:
+        _ingest_queue = None
+
+
+def _sse_message(event: str, data: str, event_id: Optional[int] = None) -> str:
+    id_line = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{id_line}event: {event}\ndata: {data}\n\n"
+
+
+async def stream_changes(resume_from: Optional[int] = None) -> AsyncIterator[str]:
+    """
+    Server-Sent Events stream of OneRoster changes. Starts after `resume_from`
+    (the last seq the client saw) or at the live end of the log if not given.
+    """
+    seq = change_log.last_seq if resume_from is None else resume_from
+    while True:
+        new_entries = change_log.wait_for_new()
+        changes = change_log.read_since(seq)
+        if changes is None:
+            # Resume token fell out of the retained window (or predates a restart); the client must do a full pull
+            seq = change_log.last_seq
+            yield _sse_message("reset", json.dumps({"resumeFrom": seq}), seq)
+            continue
+        for change in changes:
+            yield _sse_message("change", change.model_dump_json(), change.seq)
+            seq = change.seq
+        try:
+            await asyncio.wait_for(new_entries, timeout=SSE_HEARTBEAT_SECONDS)
+        except asyncio.TimeoutError:
+            yield ": keep-alive\n\n"
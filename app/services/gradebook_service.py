@@ -0,0 +1,267 @@
+# app/services/gradebook_service.py
+import asyncio
+import os
+import sys
+import time
+from itertools import islice
+from operator import attrgetter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+from app.models.gradebook_models import Category, LineItem, Result
+from app.services.gradebook_store import Frame, GradebookJournal
+
+# Gradebook data is pushed by the LMS rather than pulled in syncs, and results arrive in the
+# tens of millions per term, so it lives in its own store next to the roster snapshot.
+MAX_BULK_RECORDS = int(os.getenv("ONEROSTER_GRADEBOOK_MAX_BULK_RECORDS", "10000"))  # Per bulk request
+# Superseded result rows are dropped once there are at least this many and at least match the live rows
+COMPACT_MIN_DEAD_ROWS = int(os.getenv("ONEROSTER_GRADEBOOK_COMPACT_MIN_DEAD_ROWS", "100000"))
+
+
+class UnknownReferenceError(ValueError):
+    """A gradebook record points at a lineItem (or category) the store doesn't have."""
+
+
+class ResultLog:
+    """
+    Append-only, column-per-field store for results. An upsert appends a new row and marks
+    the row it replaces dead instead of rewriting anything; dead rows are dropped by an
+    occasional compaction. Rows are indexed by lineItem and by student, so per-lineItem and
+    per-student reads only touch their own rows. Per row this keeps a handful of list slots
+    rather than a whole pydantic model, and the reference ids are interned (one string per
+    lineItem / student, not one per result).
+    """
+
+    def __init__(self):
+        self._columns: Dict[str, List[Any]] = {name: [] for name in Result.model_fields}
+        self._live = bytearray()  # 1 for the current row of a sourcedId, 0 once superseded
+        self._row_by_id: Dict[str, int] = {}
+        self._rows_by_line_item: Dict[str, List[int]] = {}
+        self._rows_by_student: Dict[str, List[int]] = {}
+        self.dead_rows = 0
+        self.compactions = 0
+
+    def __len__(self) -> int:
+        return len(self._row_by_id)
+
+    def append(self, results: List[Result]) -> None:
+        start = len(self._live)
+        for name, column in self._columns.items():
+            if name in ("lineItemSourcedId", "studentSourcedId"):
+                column.extend([sys.intern(value) for value in map(attrgetter(name), results)])
+            else:
+                column.extend(map(attrgetter(name), results))
+        self._live.extend(b"\x01" * len(results))
+
+        row_by_id, live = self._row_by_id, self._live
+        by_line_item, by_student = self._rows_by_line_item, self._rows_by_student
+        line_items, students = self._columns["lineItemSourcedId"], self._columns["studentSourcedId"]
+        for row, result in enumerate(results, start):
+            old = row_by_id.get(result.sourcedId)
+            if old is not None:
+                live[old] = 0
+                self.dead_rows += 1
+            row_by_id[result.sourcedId] = row
+            by_line_item.setdefault(line_items[row], []).append(row)
+            by_student.setdefault(students[row], []).append(row)
+
+        if self.dead_rows >= COMPACT_MIN_DEAD_ROWS and self.dead_rows >= len(row_by_id):
+            self.compact()
+
+    def compact(self) -> None:
+        """Rewrites the columns without dead rows and rebuilds the indexes. O(rows)."""
+        keep = [row for row, alive in enumerate(self._live) if alive]
+        for name, column in self._columns.items():
+            self._columns[name] = [column[row] for row in keep]
+        self._live = bytearray(b"\x01" * len(keep))
+        self._row_by_id = dict(zip(self._columns["sourcedId"], range(len(keep))))
+        self._rows_by_line_item = {}
+        self._rows_by_student = {}
+        for row, (line_item, student) in enumerate(zip(self._columns["lineItemSourcedId"],
+                                                       self._columns["studentSourcedId"])):
+            self._rows_by_line_item.setdefault(line_item, []).append(row)
+            self._rows_by_student.setdefault(student, []).append(row)
+        self.dead_rows = 0
+        self.compactions += 1
+
+    def _result_at(self, row: int) -> Result:
+        # Values were validated on the way in
+        return Result.model_construct(**{name: column[row] for name, column in self._columns.items()})
+
+    def _page(self, rows: Iterable[int], limit: int, offset: int) -> List[Result]:
+        live = self._live
+        return [self._result_at(row) for row in islice((r for r in rows if live[r]), offset, offset + limit)]
+
+    def get(self, sourced_id: str) -> Optional[Result]:
+        row = self._row_by_id.get(sourced_id)
+        return self._result_at(row) if row is not None else None
+
+    def all(self, limit: int, offset: int) -> List[Result]:
+        return self._page(range(len(self._live)), limit, offset)
+
+    def for_line_item(self, line_item_sourced_id: str, limit: int, offset: int) -> List[Result]:
+        return self._page(self._rows_by_line_item.get(line_item_sourced_id, ()), limit, offset)
+
+    def for_student(self, student_sourced_id: str, limit: int, offset: int) -> List[Result]:
+        return self._page(self._rows_by_student.get(student_sourced_id, ()), limit, offset)
+
+    def live_batches(self, size: int) -> Iterator[List[Result]]:
+        """Every current result, in row order, `size` at a time."""
+        live = self._live
+        rows = (row for row in range(len(live)) if live[row])
+        while True:
+            batch = [self._result_at(row) for row in islice(rows, size)]
+            if not batch:
+                return
+            yield batch
+
+    def stats(self) -> Dict[str, int]:
+        return {"results": len(self), "rows": len(self._live), "deadRows": self.dead_rows,
+                "lineItemsWithResults": len(self._rows_by_line_item), "students": len(self._rows_by_student),
+                "compactions": self.compactions}
+
+
+# Categories and lineItems are a few orders of magnitude fewer than results: plain dicts of models
+_categories: Dict[str, Category] = {}
+_line_items: Dict[str, LineItem] = {}
+_line_items_by_class: Dict[str, Dict[str, None]] = {}  # class -> lineItem ids (dict as an ordered set)
+_results = ResultLog()
+# Every accepted write is journaled before it is applied; opened by load_persisted_gradebook at startup
+_journal: Optional[GradebookJournal] = None
+_write_lock = asyncio.Lock()  # Writes reach the journal in the order they are applied
+
+
+def _check_bulk_size(records: List[Any]) -> None:
+    if len(records) > MAX_BULK_RECORDS:
+        raise OverflowError(f"At most {MAX_BULK_RECORDS} records per request, got {len(records)}")
+
+
+def _apply_categories(categories: List[Category]) -> None:
+    for category in categories:
+        _categories[category.sourcedId] = category
+
+
+def _apply_line_items(line_items: List[LineItem]) -> None:
+    for line_item in line_items:
+        old = _line_items.get(line_item.sourcedId)
+        if old is not None and old.classSourcedId != line_item.classSourcedId:
+            _line_items_by_class[old.classSourcedId].pop(old.sourcedId, None)
+        _line_items[line_item.sourcedId] = line_item
+        _line_items_by_class.setdefault(line_item.classSourcedId, {})[line_item.sourcedId] = None
+
+
+def _apply_results(results: List[Result]) -> None:
+    _results.append(results)
+
+
+_APPLY: Dict[str, Callable[[List[Any]], None]] = {
+    "categories": _apply_categories, "lineItems": _apply_line_items, "results": _apply_results,
+}
+
+
+async def _write(kind: str, records: List[Any]) -> None:
+    async with _write_lock:
+        if _journal is not None:
+            # On disk before it's applied, so a write that was acknowledged survives a restart
+            await asyncio.to_thread(_journal.append, kind, records)
+        _APPLY[kind](records)
+
+
+async def upsert_categories(categories: List[Category]) -> int:
+    _check_bulk_size(categories)
+    await _write("categories", categories)
+    return len(categories)
+
+
+async def upsert_line_items(line_items: List[LineItem]) -> int:
+    _check_bulk_size(line_items)
+    unknown = sorted({li.categorySourcedId for li in line_items if li.categorySourcedId not in _categories})
+    if unknown:
+        raise UnknownReferenceError(f"Unknown categorySourcedId(s): {', '.join(unknown[:20])}")
+    await _write("lineItems", line_items)
+    return len(line_items)
+
+
+async def upsert_results(results: List[Result]) -> int:
+    """Appends a batch of results (new or replacing earlier ones). All-or-nothing: every lineItem must exist."""
+    _check_bulk_size(results)
+    unknown = {r.lineItemSourcedId for r in results} - _line_items.keys()
+    if unknown:
+        raise UnknownReferenceError(f"Unknown lineItemSourcedId(s): {', '.join(sorted(unknown)[:20])}")
+    await _write("results", results)
+    return len(results)
+
+
+def _live_frames() -> Iterator[Frame]:
+    yield "categories", list(_categories.values())
+    yield "lineItems", list(_line_items.values())
+    for batch in _results.live_batches(MAX_BULK_RECORDS):
+        yield "results", batch
+
+
+def load_persisted_gradebook(journal: Optional[GradebookJournal] = None) -> None:
+    """
+    Replays the gradebook journal into memory (called at startup) and journals every later write
+    to it. A journal that is mostly superseded records is rewritten with only the live ones.
+    """
+    global _journal
+    journal = journal or GradebookJournal()
+    start = time.perf_counter()
+    replayed = 0
+    for kind, records in journal.replay():
+        _APPLY[kind](records)
+        replayed += len(records)
+    live = len(_categories) + len(_line_items) + len(_results)
+    if replayed - live >= COMPACT_MIN_DEAD_ROWS and replayed - live >= live:
+        journal.rewrite(_live_frames())
+        print(f"Compacted the gradebook log: {replayed} journaled records down to {live}.")
+    _journal = journal
+    print(f"Loaded the gradebook log in {(time.perf_counter() - start) * 1000:.1f} ms "
+          f"({len(_categories)} categories, {len(_line_items)} lineItems, {len(_results)} results).")
+
+
+def close_gradebook_journal() -> None:
+    global _journal
+    if _journal is not None:
+        _journal.close()
+        _journal = None
+
+
+async def get_categories(limit: int = 100, offset: int = 0) -> List[Category]:
+    return list(islice(_categories.values(), offset, offset + limit))
+
+
+async def get_category_by_id(sourced_id: str) -> Optional[Category]:
+    return _categories.get(sourced_id)
+
+
+async def get_line_items(limit: int = 100, offset: int = 0) -> List[LineItem]:
+    return list(islice(_line_items.values(), offset, offset + limit))
+
+
+async def get_line_item_by_id(sourced_id: str) -> Optional[LineItem]:
+    return _line_items.get(sourced_id)
+
+
+async def get_line_items_for_class(class_sourced_id: str, limit: int = 100, offset: int = 0) -> List[LineItem]:
+    ids = _line_items_by_class.get(class_sourced_id, {})
+    return [_line_items[i] for i in islice(ids, offset, offset + limit)]
+
+
+async def get_results(limit: int = 100, offset: int = 0) -> List[Result]:
+    return _results.all(limit, offset)
+
+
+async def get_result_by_id(sourced_id: str) -> Optional[Result]:
+    return _results.get(sourced_id)
+
+
+async def get_results_for_line_item(line_item_sourced_id: str, limit: int = 100, offset: int = 0) -> List[Result]:
+    return _results.for_line_item(line_item_sourced_id, limit, offset)
+
+
+async def get_results_for_student(student_sourced_id: str, limit: int = 100, offset: int = 0) -> List[Result]:
+    return _results.for_student(student_sourced_id, limit, offset)
+
+
+def get_gradebook_stats() -> Dict[str, Any]:
+    return {"categories": len(_categories), "lineItems": len(_line_items), "classesWithLineItems": len(_line_items_by_class),
+            "resultLog": _results.stats()}
@@ -0,0 +1,102 @@
+# app/services/gradebook_store.py
+import os
+import pickle
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+# Where gradebook writes (categories, lineItems, results) are journaled between restarts. Pickle,
+# like the snapshot store: the records are already-validated models and load straight back.
+GRADEBOOK_LOG_PATH = os.getenv("ONEROSTER_GRADEBOOK_LOG_PATH", os.path.join("data", "gradebook_log.pkl"))
+GRADEBOOK_LOG_FORMAT_VERSION = 1  # Bump when the models change in a way old pickles can't load
+# fsync after every write, so an acknowledged write survives a crash and not only a clean shutdown
+GRADEBOOK_LOG_FSYNC = os.getenv("ONEROSTER_GRADEBOOK_LOG_FSYNC", "1").lower() not in ("0", "false", "no")
+
+Frame = Tuple[str, List[Any]]  # (record kind, the records of one accepted write)
+
+
+class GradebookJournal:
+    """
+    Append-only log of the gradebook: a header with the format version, then one pickled
+    (kind, records) frame per accepted write. Replaying the frames in order rebuilds the
+    in-memory store. A torn last frame (crash mid-write) is cut off when the log is replayed.
+    """
+
+    def __init__(self, path: str = GRADEBOOK_LOG_PATH, fsync: bool = GRADEBOOK_LOG_FSYNC):
+        self.path = path
+        self.fsync = fsync
+        self._file = None
+
+    def replay(self) -> Iterator[Frame]:
+        """The frames written so far, oldest first. Consume them all before the first append."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            try:
+                header = pickle.load(f)
+            except Exception:
+                header = None
+            if not isinstance(header, dict) or header.get("version") != GRADEBOOK_LOG_FORMAT_VERSION:
+                # Appending to it would make it unreadable for good: keep it aside and start a new log
+                os.replace(self.path, f"{self.path}.unsupported")
+                print(f"Warning: Moved gradebook log {self.path} with unsupported format to {self.path}.unsupported.")
+                return
+            end = f.tell()
+            while True:
+                try:
+                    frame = pickle.load(f)
+                except EOFError:
+                    break
+                except Exception as e:  # Torn or corrupt frame: everything before it is still good
+                    print(f"Warning: Gradebook log {self.path} is damaged after byte {end} ({e}); dropping the rest.")
+                    break
+                end = f.tell()
+                yield frame
+        if os.path.getsize(self.path) > end:
+            os.truncate(self.path, end)
+
+    def append(self, kind: str, records: List[Any]) -> None:
+        """Writes one frame; returns once it is on disk (fsynced unless turned off)."""
+        if self._file is None:
+            self._open()
+        start = self._file.tell()
+        try:
+            pickle.dump((kind, records), self._file, protocol=pickle.HIGHEST_PROTOCOL)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+        except BaseException:
+            # Don't leave half a frame behind: it would hide every later write at replay
+            self._file.truncate(start)
+            self._file.seek(start)
+            raise
+
+    def rewrite(self, frames: Iterable[Frame]) -> None:
+        """
+        Replaces the log with the given frames (e.g. only the live records). Writes to a temp
+        file first and then renames it, so a crash mid-write leaves the old log in place.
+        """
+        self.close()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"version": GRADEBOOK_LOG_FORMAT_VERSION}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            for frame in frames:
+                pickle.dump(frame, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def size_bytes(self) -> Optional[int]:
+        return os.path.getsize(self.path) if os.path.exists(self.path) else None
+
+    def _open(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "ab")
+        if self._file.tell() == 0:
+            pickle.dump({"version": GRADEBOOK_LOG_FORMAT_VERSION}, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+            self._file.flush()
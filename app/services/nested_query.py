@@ -0,0 +1,183 @@
+# app/services/nested_query.py
+import os
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from app.models.oneroster_models import RoleType
+from app.services.snapshot_indexes import SnapshotIndexes
+
+MAX_EXPAND_DEPTH = 3  # Segments per expand path, e.g. classes.students.orgs
+MAX_EXPAND_PATHS = int(os.getenv("ONEROSTER_QUERY_MAX_EXPAND_PATHS", "16"))
+
+
+class InvalidExpansionError(ValueError):
+    """An expand path names a relation the entity type doesn't have, or nests too deep."""
+
+
+# (entity type, field) groupings the relations below read; every snapshot is published with them built
+GROUPINGS: Dict[Tuple[str, str], None] = {}
+
+
+class Relation(NamedTuple):
+    target_type: str
+    many: bool  # A list of targets; otherwise at most one
+    links: Callable[[SnapshotIndexes, Any], List[str]]  # Target sourcedIds of one parent record
+
+
+def _reference(field: str) -> Callable[[SnapshotIndexes, Any], List[str]]:
+    # A reference held by the parent record itself (courseSourcedId, termSourcedIds, ...)
+    def links(indexes: SnapshotIndexes, record: Any) -> List[str]:
+        value = getattr(record, field)
+        return value if isinstance(value, list) else ([value] if value is not None else [])
+    return links
+
+
+def _referenced_by(entity_type: str, field: str) -> Callable[[SnapshotIndexes, Any], List[str]]:
+    # Records of another type that reference the parent (a school's classes, an org's children)
+    GROUPINGS[(entity_type, field)] = None
+
+    def links(indexes: SnapshotIndexes, record: Any) -> List[str]:
+        return [r.sourcedId for r in indexes.grouped_by(entity_type, field).get(record.sourcedId, ())]
+    return links
+
+
+def _through_enrollments(field: str, target_field: str,
+                         role: Optional[RoleType] = None) -> Callable[[SnapshotIndexes, Any], List[str]]:
+    # Users of a class or classes of a user, via the enrollments (optionally one role's only)
+    GROUPINGS[("enrollments", field)] = None
+
+    def links(indexes: SnapshotIndexes, record: Any) -> List[str]:
+        enrollments = indexes.grouped_by("enrollments", field).get(record.sourcedId, ())
+        return list(dict.fromkeys(getattr(e, target_field) for e in enrollments if role is None or e.role == role))
+    return links
+
+
+RELATIONS: Dict[str, Dict[str, Relation]] = {
+    "classes": {
+        "course": Relation("courses", False, _reference("courseSourcedId")),
+        "school": Relation("orgs", False, _reference("schoolSourcedId")),
+        "terms": Relation("academicSessions", True, _reference("termSourcedIds")),
+        "students": Relation("users", True, _through_enrollments("classSourcedId", "userSourcedId", RoleType.STUDENT)),
+        "teachers": Relation("users", True, _through_enrollments("classSourcedId", "userSourcedId", RoleType.TEACHER)),
+        "enrollments": Relation("enrollments", True, _referenced_by("enrollments", "classSourcedId")),
+    },
+    "courses": {
+        "org": Relation("orgs", False, _reference("orgSourcedId")),
+        "schoolYear": Relation("academicSessions", False, _reference("schoolYearSourcedId")),
+        "classes": Relation("classes", True, _referenced_by("classes", "courseSourcedId")),
+    },
+    "orgs": {
+        "parent": Relation("orgs", False, _reference("parentSourcedId")),
+        "children": Relation("orgs", True, _referenced_by("orgs", "parentSourcedId")),
+        "classes": Relation("classes", True, _referenced_by("classes", "schoolSourcedId")),
+        "courses": Relation("courses", True, _referenced_by("courses", "orgSourcedId")),
+        "users": Relation("users", True, _referenced_by("users", "agentSourcedIds")),
+    },
+    "users": {
+        "orgs": Relation("orgs", True, _reference("agentSourcedIds")),
+        "classes": Relation("classes", True, _through_enrollments("userSourcedId", "classSourcedId")),
+        "enrollments": Relation("enrollments", True, _referenced_by("enrollments", "userSourcedId")),
+    },
+    "enrollments": {
+        "user": Relation("users", False, _reference("userSourcedId")),
+        "class": Relation("classes", False, _reference("classSourcedId")),
+        "school": Relation("orgs", False, _reference("schoolSourcedId")),
+    },
+    "academicSessions": {
+        "parent": Relation("academicSessions", False, _reference("parentSourcedId")),
+        "children": Relation("academicSessions", True, _referenced_by("academicSessions", "parentSourcedId")),
+        "classes": Relation("classes", True, _referenced_by("classes", "termSourcedIds")),
+    },
+}
+
+ExpandTree = Dict[str, "ExpandTree"]  # relation name -> expansions of its targets
+
+
+def parse_expand(entity_type: str, expand: Optional[str]) -> ExpandTree:
+    """
+    Parses "students,teachers,course.org" into a tree of relations, checking every segment
+    against the relations of the entity type it applies to. Raises InvalidExpansionError.
+    """
+    tree: ExpandTree = {}
+    paths = [p.strip() for p in (expand or "").split(",") if p.strip()]
+    if len(paths) > MAX_EXPAND_PATHS:
+        raise InvalidExpansionError(f"At most {MAX_EXPAND_PATHS} expand paths per query")
+    for path in paths:
+        segments = path.split(".")
+        if len(segments) > MAX_EXPAND_DEPTH:
+            raise InvalidExpansionError(f"'{path}' nests deeper than {MAX_EXPAND_DEPTH} levels")
+        node, node_type = tree, entity_type
+        for segment in segments:
+            relation = RELATIONS[node_type].get(segment)
+            if relation is None:
+                raise InvalidExpansionError(
+                    f"'{segment}' is not a relation of {node_type} (one of {', '.join(RELATIONS[node_type])})")
+            node, node_type = node.setdefault(segment, {}), relation.target_type
+    return tree
+
+
+class BatchLoader:
+    """
+    Per-query DataLoader: sourcedIds are queued while one level of the expansion is walked,
+    then fetched in one batch per entity type. Each distinct record is loaded once, however
+    many parents (or paths) reference it.
+    """
+
+    def __init__(self, indexes: SnapshotIndexes):
+        self._indexes = indexes
+        self.loaded: Dict[str, Dict[str, Any]] = {}  # entity type -> sourcedId -> record, in load order
+        self._queued: Dict[str, Dict[str, None]] = {}  # Ordered sets, so included comes out in link order
+
+    def prime(self, entity_type: str, records: List[Any]) -> None:
+        self.loaded.setdefault(entity_type, {}).update((r.sourcedId, r) for r in records)
+
+    def queue(self, entity_type: str, ids: List[str]) -> None:
+        loaded = self.loaded.get(entity_type, {})
+        self._queued.setdefault(entity_type, {}).update((i, None) for i in ids if i not in loaded)
+
+    def dispatch(self) -> None:
+        for entity_type, ids in self._queued.items():
+            by_id = self._indexes.by_id(entity_type)
+            loaded = self.loaded.setdefault(entity_type, {})
+            for sourced_id in ids:
+                record = by_id.get(sourced_id)
+                if record is not None:  # Dangling references are left out (see /admin/integrity)
+                    loaded[sourced_id] = record
+        self._queued.clear()
+
+
+def resolve_expansions(indexes: SnapshotIndexes, entity_type: str, roots: List[Any],
+                       tree: ExpandTree) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, List[Any]]]:
+    """
+    Walks the expansion tree level by level from the root records. Returns the relationships
+    (expand path -> parent sourcedId -> target sourcedId, or a list of them) and the included
+    records per entity type, each distinct record once and none of the roots repeated. The work
+    is proportional to the distinct records touched, not to the size of the snapshot.
+    """
+    loader = BatchLoader(indexes)
+    loader.prime(entity_type, roots)
+    relationships: Dict[str, Dict[str, Any]] = {}
+    level = [("", entity_type, roots, tree)]
+    while level:
+        pending = []
+        for prefix, parent_type, parents, subtree in level:
+            for name, children in subtree.items():
+                relation = RELATIONS[parent_type][name]
+                links = {p.sourcedId: relation.links(indexes, p) for p in parents}
+                for ids in links.values():
+                    loader.queue(relation.target_type, ids)
+                pending.append((prefix + name, relation, links, children))
+        loader.dispatch()
+        level = []
+        for path, relation, links, children in pending:
+            found = loader.loaded.get(relation.target_type, {})
+            resolved = {parent_id: [i for i in ids if i in found] for parent_id, ids in links.items()}
+            relationships[path] = resolved if relation.many else {
+                parent_id: ids[0] if ids else None for parent_id, ids in resolved.items()}
+            if children:
+                targets = dict.fromkeys(i for ids in resolved.values() for i in ids)
+                level.append((path + ".", relation.target_type, [found[i] for i in targets], children))
+    root_ids = {r.sourcedId for r in roots}
+    included = {
+        t: [r for sourced_id, r in records.items() if t != entity_type or sourced_id not in root_ids]
+        for t, records in loader.loaded.items()
+    }
+    return relationships, {t: records for t, records in included.items() if records}
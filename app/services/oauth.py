@@ -0,0 +1,218 @@
+# app/services/oauth.py
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Iterable, NamedTuple, Optional, Tuple
+
+# OneRoster v1.1 OAuth2 scopes. roster.readonly covers all rostering data, roster-core.readonly
+# only orgs, academic sessions, courses and classes (no people, no enrollments).
+SCOPE_PREFIX = "https://purl.imsglobal.org/spec/or/v1p1/scope/"
+SCOPE_ROSTER_CORE = SCOPE_PREFIX + "roster-core.readonly"
+SCOPE_ROSTER = SCOPE_PREFIX + "roster.readonly"
+SCOPE_GRADEBOOK_READ = SCOPE_PREFIX + "gradebook.readonly"
+SCOPE_GRADEBOOK_WRITE = SCOPE_PREFIX + "gradebook.createput"
+ONEROSTER_SCOPES = (SCOPE_ROSTER_CORE, SCOPE_ROSTER, SCOPE_GRADEBOOK_READ, SCOPE_GRADEBOOK_WRITE)
+# Not OneRoster scopes: the /admin endpoints (sync triggers, push consumer registration, stats), and
+# pushing source change events into the live snapshot
+SCOPE_ADMIN = "oneroster-poc.admin"
+SCOPE_CHANGES_WRITE = "oneroster-poc.changes.write"
+ALL_SCOPES = ONEROSTER_SCOPES + (SCOPE_ADMIN, SCOPE_CHANGES_WRITE)
+
+# Bearer tokens are required on the v1p1 rostering and gradebook routers; turn off for local experiments
+OAUTH_ENABLED = os.getenv("ONEROSTER_OAUTH_ENABLED", "1").lower() not in ("0", "false", "no")
+TOKEN_TTL_SECONDS = int(os.getenv("ONEROSTER_OAUTH_TOKEN_TTL_SECONDS", "3600"))
+# Verified tokens are remembered for this long (at most until they expire), up to the cache size
+TOKEN_CACHE_TTL_SECONDS = float(os.getenv("ONEROSTER_OAUTH_TOKEN_CACHE_TTL_SECONDS", "300"))
+TOKEN_CACHE_SIZE = int(os.getenv("ONEROSTER_OAUTH_TOKEN_CACHE_SIZE", "100000"))
+# HS256 key for issued tokens. Without one, a random key is used and tokens don't survive a restart.
+_SIGNING_KEY = os.getenv("ONEROSTER_OAUTH_SIGNING_KEY", "").encode() or secrets.token_bytes(32)
+ISSUER = "oneroster-poc"
+
+# Registered when ONEROSTER_OAUTH_CLIENTS isn't set, with a secret generated at startup and printed once
+_DEMO_CLIENT_ID = "oneroster-poc"
+
+
+class InvalidClientError(Exception):
+    """Unknown client or wrong client secret at the token endpoint."""
+
+
+class InvalidScopeError(ValueError):
+    """A requested scope is unknown or not granted to the client."""
+
+
+class InvalidTokenError(ValueError):
+    """A bearer token that is malformed, wrongly signed or expired."""
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _secret_digest(secret: str) -> bytes:
+    return hashlib.sha256(secret.encode()).digest()
+
+
+def normalize_scopes(scopes: Iterable[str]) -> FrozenSet[str]:
+    """Full scope URIs from full or short names ('roster.readonly'). Raises InvalidScopeError."""
+    normalized = set()
+    for scope in scopes:
+        full = scope if scope in ALL_SCOPES else SCOPE_PREFIX + scope
+        if full not in ALL_SCOPES:
+            raise InvalidScopeError(f"Unknown scope '{scope}'")
+        normalized.add(full)
+    return frozenset(normalized)
+
+
+class OAuthClient(NamedTuple):
+    client_id: str
+    secret_digest: bytes  # Only a hash of the secret is kept in memory
+    scopes: FrozenSet[str]  # What the client may request
+
+
+def _load_clients() -> Dict[str, OAuthClient]:
+    # ONEROSTER_OAUTH_CLIENTS='{"lms": {"secret": "...", "scopes": ["roster.readonly", "gradebook.createput"]}}'
+    # Without "scopes" a client gets the OneRoster scopes; the admin and changes.write scopes have to be listed.
+    configured = os.getenv("ONEROSTER_OAUTH_CLIENTS")
+    if not configured:
+        secret = secrets.token_urlsafe(24)
+        print(f"Warning: ONEROSTER_OAUTH_CLIENTS is not set. Registered the OAuth client '{_DEMO_CLIENT_ID}' with "
+              f"every scope and the secret {secret} (generated for this process only, not shown again).")
+        return {_DEMO_CLIENT_ID: OAuthClient(_DEMO_CLIENT_ID, _secret_digest(secret), frozenset(ALL_SCOPES))}
+    return {
+        client_id: OAuthClient(client_id, _secret_digest(config["secret"]), normalize_scopes(config.get("scopes", ONEROSTER_SCOPES)))
+        for client_id, config in json.loads(configured).items()
+    }
+
+
+class TokenSigner:
+    """
+    Signs and verifies HS256 JWTs. The HMAC key schedule (the padded key blocks run through
+    SHA-256) is computed once; every signature starts from a copy of that keyed state.
+    """
+
+    def __init__(self, key: bytes):
+        self._mac = hmac.new(key, digestmod=hashlib.sha256)
+        self._header = _b64encode(json.dumps({"alg": "HS256", "typ": "JWT"}, separators=(",", ":")).encode())
+
+    def _signature(self, signing_input: str) -> str:
+        mac = self._mac.copy()
+        mac.update(signing_input.encode())
+        return _b64encode(mac.digest())
+
+    def sign(self, claims: Dict[str, Any]) -> str:
+        signing_input = f"{self._header}.{_b64encode(json.dumps(claims, separators=(',', ':')).encode())}"
+        return f"{signing_input}.{self._signature(signing_input)}"
+
+    def verify(self, token: str) -> Dict[str, Any]:
+        """The token's claims if it carries a valid signature (expiry isn't checked here)."""
+        header, _, rest = token.partition(".")
+        payload, _, signature = rest.partition(".")
+        if header != self._header or not payload or not signature:
+            raise InvalidTokenError("Malformed token")
+        if not hmac.compare_digest(self._signature(f"{header}.{payload}"), signature):
+            raise InvalidTokenError("Invalid token signature")
+        try:
+            return json.loads(_b64decode(payload))
+        except ValueError:
+            raise InvalidTokenError("Malformed token payload")
+
+
+class TokenCache:
+    """Bounded LRU of verified tokens -> (granted scopes, valid until). Entries expire by TTL."""
+
+    def __init__(self, max_entries: int = TOKEN_CACHE_SIZE, ttl_seconds: float = TOKEN_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[FrozenSet[str], float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str, now: float) -> Optional[FrozenSet[str]]:
+        entry = self._entries.get(token)
+        if entry is None or entry[1] <= now:
+            if entry is not None:
+                del self._entries[token]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, token: str, scopes: FrozenSet[str], expires_at: float, now: float) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[token] = (scopes, min(expires_at, now + self.ttl_seconds))
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "maxEntries": self.max_entries, "ttlSeconds": self.ttl_seconds,
+                "hits": self.hits, "misses": self.misses}
+
+
+class TokenService:
+    """Issues client-credentials access tokens and authorizes bearer tokens (through the cache)."""
+
+    def __init__(self, clients: Dict[str, OAuthClient], signer: TokenSigner, cache: TokenCache):
+        self.clients = clients
+        self.signer = signer
+        self.cache = cache
+        self.issued = 0
+        self.rejected = 0
+
+    def issue(self, client_id: str, client_secret: str, scope: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Token response for the client credentials grant. `scope` is space-separated; without it the
+        client gets every scope it is allowed. Raises InvalidClientError or InvalidScopeError.
+        """
+        client = self.clients.get(client_id)
+        if client is None or not hmac.compare_digest(_secret_digest(client_secret), client.secret_digest):
+            raise InvalidClientError("Unknown client or wrong client secret")
+        scopes = normalize_scopes(scope.split()) if scope else client.scopes
+        if not scopes <= client.scopes:
+            raise InvalidScopeError(f"Scopes not granted to client '{client_id}': {' '.join(sorted(scopes - client.scopes))}")
+        now = int(time.time())
+        claims = {"iss": ISSUER, "sub": client_id, "iat": now, "exp": now + TOKEN_TTL_SECONDS,
+                  "jti": secrets.token_urlsafe(12), "scope": " ".join(sorted(scopes))}  # jti: every token is distinct
+        self.issued += 1
+        return {"access_token": self.signer.sign(claims), "token_type": "bearer", "expires_in": TOKEN_TTL_SECONDS,
+                "scope": claims["scope"]}
+
+    def authorize(self, token: str) -> FrozenSet[str]:
+        """The scopes a bearer token grants. Raises InvalidTokenError."""
+        now = time.time()
+        scopes = self.cache.get(token, now)
+        if scopes is not None:
+            return scopes
+        try:
+            claims = self.signer.verify(token)
+            expires_at = float(claims["exp"])
+            scopes = frozenset(str(claims.get("scope", "")).split())
+        except InvalidTokenError:
+            self.rejected += 1
+            raise
+        except (KeyError, TypeError, ValueError):
+            self.rejected += 1
+            raise InvalidTokenError("Malformed token claims")
+        if claims.get("iss") != ISSUER or expires_at <= now:
+            self.rejected += 1
+            raise InvalidTokenError("Token expired" if expires_at <= now else "Token from another issuer")
+        self.cache.put(token, scopes, expires_at, now)
+        return scopes
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": OAUTH_ENABLED, "clients": len(self.clients), "issued": self.issued,
+                "rejected": self.rejected, "tokenTtlSeconds": TOKEN_TTL_SECONDS, "cache": self.cache.stats()}
+
+
+token_service = TokenService(_load_clients(), TokenSigner(_SIGNING_KEY), TokenCache())
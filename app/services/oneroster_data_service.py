@@ -1,42 +1,351 @@
 # app/services/oneroster_data_service.py
-from typing import List, Optional, Dict, Any
-from app.connectors.oneroster_processor import get_processed_oneroster_data
+from typing import List, Optional, Dict, Any, Tuple
+from app.connectors.oneroster_processor import (
+    SOURCE_PROCESSORS, SOURCE_SEGMENTS, fetch_source, fetch_source_segment, merge_source_data, apply_source_events
+)
+from app.models.change_models import SourceChangeEvent
 from app.models.oneroster_models import (
-    ProcessedOneRosterData, Org, User, Course, Class, Enrollment, AcademicSession
+    ProcessedOneRosterData, Org, User, Course, Class, Enrollment, AcademicSession, RoleType, StatusType
 )  # Import your Pydantic models
 
 # --- Simple In-Memory Cache (for PoC purposes) ---
 # In a real app, use Redis, Memcached, or a proper database.
+# The cache is only ever replaced by the background sync jobs (see sync_scheduler);
+# API handlers just read whatever snapshot is current.
 _cached_data: Optional[ProcessedOneRosterData] = None
-_CACHE_TTL_SECONDS = 60  # Cache data for 60 seconds for this PoC
+import asyncio
+import os
 import time
+import re
+from datetime import date
+from functools import partial
+from app.services import snapshot_store, change_feed
+from app.services.record_versions import ENTITY_TYPES, RecordChange, RecordVersionStore, normalize_timestamp
+from app.services.snapshot_generations import GenerationStore, SnapshotGeneration
+from app.services.snapshot_indexes import SnapshotIndexes
+from app.services.nested_query import GROUPINGS as NESTED_QUERY_GROUPINGS, parse_expand, resolve_expansions
+from app.services.referential_integrity import ReferenceValidator
+from app.services.search_index import SEARCH_FIELDS, SearchIndexer
+from app.services.sync_scheduler import SyncScheduler
 
 _last_cache_time: float = 0.0
+_source_data: Optional[Dict[str, Dict[str, List[Any]]]] = None  # Per-source data behind _cached_data
+_record_versions = RecordVersionStore()  # Keeps dateLastModified stable for records that didn't change
+_generations = GenerationStore()  # Every published snapshot, plus recently paged older ones
+_reference_validator = ReferenceValidator()  # Checks every published snapshot's foreign keys in the background
+_search_indexer = SearchIndexer()  # Builds each published snapshot's type-ahead indexes
+_refresh_lock = asyncio.Lock()  # Serializes snapshot swaps (syncs and incremental change batches)
+_snapshot_ready = asyncio.Event()  # Set once there is any snapshot to serve
+_INITIAL_SNAPSHOT_WAIT_SECONDS = 30.0
+# Reverse references the nested endpoints (a class's users, a user's classes, a course's and a term's
+# classes) and the expand paths of /query read, built with each snapshot like the sourcedId indexes
+_PUBLISH_GROUPINGS = tuple(dict.fromkeys((
+    ("enrollments", "classSourcedId"), ("enrollments", "userSourcedId"),
+    ("classes", "courseSourcedId"), ("classes", "termSourcedIds"),
+    *NESTED_QUERY_GROUPINGS,
+)))
+
+# How often each refresh segment is refetched: orgs/sessions change a few times a year, courses and
+# classes mostly around term starts, users and enrollments all the time. ONEROSTER_<SEGMENT>_REFRESH_SECONDS
+# sets a segment's interval, ONEROSTER_<SOURCE>_<SEGMENT>_REFRESH_SECONDS overrides it for one source.
+DEFAULT_REFRESH_SECONDS = {"reference": 86400.0, "catalog": 3600.0, "roster": 60.0}
+REFRESH_INTERVAL_SECONDS = {
+    (source, segment): float(os.getenv(
+        f"ONEROSTER_{source.upper()}_{segment.upper()}_REFRESH_SECONDS",
+        os.getenv(f"ONEROSTER_{segment.upper()}_REFRESH_SECONDS", str(DEFAULT_REFRESH_SECONDS[segment])),
+    ))
+    for source, segments in SOURCE_SEGMENTS.items() for segment in segments
+}
+
+
+class SnapshotUnavailableError(RuntimeError):
+    """No snapshot has been built or loaded yet (cold start without a persisted snapshot)."""
 
 
 # --- End Cache ---
 
-async def get_all_data() -> ProcessedOneRosterData:
+def load_persisted_snapshot() -> bool:
     """
-    Retrieves all processed OneRoster data, using a simple cache.
+    Loads the last snapshot persisted to disk into the cache (called at startup).
+    Returns True if a snapshot was loaded.
     """
     global _cached_data, _last_cache_time
-    current_time = time.time()
+    start = time.perf_counter()
+    loaded = snapshot_store.load_snapshot()
+    if loaded is None:
+        print("No persisted OneRoster snapshot found. First requests will wait for the initial sync.")
+        return False
+    _cached_data, _last_cache_time, record_versions = loaded
+    indexes = SnapshotIndexes(_cached_data).prebuild(_PUBLISH_GROUPINGS)
+    _reference_validator.schedule(_generations.publish(_cached_data, indexes))
+    _record_versions.restore_state(record_versions)
+    _snapshot_ready.set()
+    load_ms = (time.perf_counter() - start) * 1000
+    age = snapshot_store.snapshot_age_seconds(_last_cache_time)
+    print(f"Loaded persisted OneRoster snapshot in {load_ms:.1f} ms "
+          f"(age {age:.0f}s, {len(_cached_data.users)} users, {len(_cached_data.enrollments)} enrollments).")
+    return True
+
+
+async def sync_sources(sources: Optional[List[str]] = None) -> ProcessedOneRosterData:
+    """
+    Re-fetches the given source systems (all by default), rebuilds the snapshot and persists it.
+    Fetching happens outside the lock, so syncs of different sources overlap their I/O.
+    """
+    if sources is not None and _source_data is None:
+        # Without per-source data from this process there's nothing to merge a partial fetch into
+        return await _shared_full_sync()
+    sources = sources or list(SOURCE_PROCESSORS)
+    print(f"Syncing OneRoster data from: {', '.join(sources)}.")
+    fetched = dict(zip(sources, await asyncio.gather(*(fetch_source(source) for source in sources))))
+    async with _refresh_lock:
+        return await _publish_source_data({**(_source_data or {}), **fetched})
+
+
+async def sync_segment(source: str, segment: str) -> ProcessedOneRosterData:
+    """
+    Refetches one refresh segment of a source (e.g. the SIS roster) and rebuilds the snapshot
+    around it. The other segments' data is reused as is, and so are the merge stages that
+    only depend on them.
+    """
+    if _source_data is None or source not in _source_data:
+        return await _shared_full_sync()
+    print(f"Refreshing the {segment} segment of {source}.")
+    fetched = await fetch_source_segment(source, segment, _source_data[source])
+    async with _refresh_lock:
+        # Into the latest data: change events may have been applied while the segment was fetched
+        return await _publish_source_data({**_source_data, source: {**_source_data[source], **fetched}})
+
+
+def _merge_and_stamp(previous: Optional[SnapshotGeneration], source_data: Dict[str, Dict[str, List[Any]]]
+                     ) -> Tuple[ProcessedOneRosterData, List[RecordChange], SnapshotIndexes]:
+    # CPU-bound, so callers run it in a worker thread. They hold _refresh_lock, which keeps the merge
+    # stage memos and the record versions to one thread at a time; the inputs are no longer mutated.
+    data, changes = _record_versions.stamp(previous.data if previous else None, merge_source_data(source_data))
+    # Indexed here, so the first lookups after the swap don't build them on the event loop
+    indexes = SnapshotIndexes(data).prebuild(_PUBLISH_GROUPINGS, previous.indexes if previous else None)
+    indexes.search = _search_indexer.update(data, changes, previous.indexes.search if previous else None)
+    return data, changes, indexes
+
+
+def _current_generation() -> Optional[SnapshotGeneration]:
+    # The generation _cached_data was published as (None before the first snapshot)
+    current = _generations.current
+    return current if current is not None and current.data is _cached_data else None
 
-    if _cached_data and (current_time - _last_cache_time < _CACHE_TTL_SECONDS):
-        print("Returning cached OneRoster data.")
-        return _cached_data
 
-    print("Cache expired or empty. Reprocessing OneRoster data.")
-    _cached_data = await get_processed_oneroster_data()  # This calls your existing processor
-    _last_cache_time = current_time
+async def _publish_source_data(source_data: Dict[str, Dict[str, List[Any]]]) -> ProcessedOneRosterData:
+    # Caller holds _refresh_lock. Only the snapshot swap below runs on the event loop.
+    global _cached_data, _last_cache_time, _source_data
+    data, changes, indexes = await asyncio.to_thread(_merge_and_stamp, _current_generation(), source_data)
+    change_feed.change_log.publish(changes)
+    _cached_data, _source_data = data, source_data
+    _reference_validator.schedule(_generations.publish(data, indexes))
+    _last_cache_time = time.time()
+    _snapshot_ready.set()
+    await _persist_snapshot()
+    return data
+
+
+_full_sync_task: Optional[asyncio.Future] = None
+
+
+async def _shared_full_sync() -> ProcessedOneRosterData:
+    # Per-source jobs starting together at boot share a single full sync
+    global _full_sync_task
+    if _full_sync_task is None or _full_sync_task.done():
+        _full_sync_task = asyncio.ensure_future(sync_sources())
+    return await asyncio.shield(_full_sync_task)
+
+
+async def refresh_data() -> ProcessedOneRosterData:
+    """
+    Rebuilds the snapshot from all source systems and persists it to disk.
+    """
+    return await sync_sources()
+
+
+def register_sync_jobs(scheduler: SyncScheduler) -> None:
+    """
+    One scheduled refresh job per source segment, e.g. "sis.roster" (called at app startup).
+    Only the most frequent job of each source runs at startup: without source data its first
+    run is a full sync of the source anyway.
+    """
+    for (source, segment), interval in REFRESH_INTERVAL_SECONDS.items():
+        startup_segment = min(SOURCE_SEGMENTS[source], key=lambda s: REFRESH_INTERVAL_SECONDS[(source, s)])
+        scheduler.add_job(f"{source}.{segment}", partial(sync_segment, source, segment), interval,
+                          run_at_start=(segment == startup_segment))
+
+
+async def _persist_snapshot() -> None:
+    try:
+        # Pickling a large snapshot is CPU work, keep it off the event loop
+        await asyncio.to_thread(
+            snapshot_store.save_snapshot, _cached_data, _last_cache_time, _record_versions.export_state()
+        )
+    except Exception as e:  # A failed write shouldn't fail the sync itself
+        print(f"Warning: Could not persist OneRoster snapshot: {e}")
+
+
+_PERSIST_DEBOUNCE_SECONDS = 5.0
+_persist_task: Optional[asyncio.Task] = None
+
+
+def _schedule_persist() -> None:
+    """
+    Persists the snapshot shortly after incremental changes, so a restart doesn't forget
+    records (and their tombstones) that consumers already saw. Bursts share one write.
+    """
+    global _persist_task
+    if _persist_task is not None and not _persist_task.done():
+        return
+
+    async def persist_later():
+        await asyncio.sleep(_PERSIST_DEBOUNCE_SECONDS)
+        async with _refresh_lock:
+            await _persist_snapshot()
+
+    _persist_task = asyncio.create_task(persist_later())
+
+
+async def apply_source_changes(events: List[SourceChangeEvent]) -> None:
+    """
+    Applies a batch of pushed source change events to the live snapshot (no refetch)
+    and publishes the resulting OneRoster changes on the change feed.
+    """
+    global _cached_data, _source_data
+    async with _refresh_lock:
+        if _source_data is None:
+            # Nothing synced in this process yet; the pending full sync will include these changes
+            print(f"No source data loaded yet. Deferring {len(events)} change events to the next sync.")
+            return
+        start = time.perf_counter()
+        source_data = await asyncio.to_thread(apply_source_events, _source_data, events)
+        data, changes, indexes = await asyncio.to_thread(_merge_and_stamp, _current_generation(), source_data)
+        _cached_data, _source_data = data, source_data
+        _reference_validator.schedule(_generations.publish(data, indexes))
+        last_seq = change_feed.change_log.publish(changes)
+        _schedule_persist()
+        print(f"Applied {len(events)} source change events -> {len(changes)} OneRoster changes "
+              f"in {(time.perf_counter() - start) * 1000:.1f} ms (seq {last_seq}).")
+
+
+async def get_all_data() -> ProcessedOneRosterData:
+    """
+    Retrieves all processed OneRoster data: always the current snapshot, never triggers a sync.
+    Only a cold start without a persisted snapshot waits (bounded) for the first sync job.
+    """
+    if _cached_data is not None:
+        return _cached_data
+    try:
+        await asyncio.wait_for(_snapshot_ready.wait(), timeout=_INITIAL_SNAPSHOT_WAIT_SECONDS)
+    except asyncio.TimeoutError:
+        raise SnapshotUnavailableError("OneRoster data is not available yet; the initial sync has not completed.")
     return _cached_data
 
 
+async def get_generation(token: Optional[str] = None) -> SnapshotGeneration:
+    """
+    The snapshot generation for a token from an earlier page, or the current one (waiting for the
+    first sync on a cold start) if no token is given. Marks it as in use, so it is retained while
+    the client keeps paging. Raises InvalidGenerationTokenError or GenerationExpiredError.
+    """
+    if token:
+        return _generations.resolve(token)
+    await get_all_data()
+    generation = _generations.current
+    generation.touch()
+    return generation
+
+
+async def _snapshot_for(generation: Optional[str]) -> SnapshotGeneration:
+    if generation:
+        return _generations.resolve(generation)
+    await get_all_data()
+    return _generations.current
+
+
+async def _lookup(entity_type: str, sourced_id: str) -> Optional[Any]:
+    # Point lookups use the current snapshot's sourcedId index (built before it was published), not a list scan
+    return (await _snapshot_for(None)).indexes.by_id(entity_type).get(sourced_id)
+
+
+def get_generation_stats() -> Dict[str, Any]:
+    return _generations.stats()
+
+
+async def get_summary(generation: Optional[str] = None) -> Dict[str, int]:
+    """Record counts of a snapshot (for dashboards that shouldn't download the data to count it)."""
+    data = (await _snapshot_for(generation)).data
+    summary = {entity_type: len(getattr(data, entity_type)) for entity_type in ENTITY_TYPES}
+    summary["activeUsers"] = sum(1 for u in data.users if u.status == StatusType.ACTIVE)
+    summary["students"] = sum(1 for u in data.users if u.role == RoleType.STUDENT)
+    summary["teachers"] = sum(1 for u in data.users if u.role == RoleType.TEACHER)
+    return summary
+
+
+async def search(query: str, entity_types: Optional[List[str]] = None,
+                 limit: int = 10) -> Tuple[Dict[str, List[Any]], SnapshotGeneration]:
+    """
+    Top `limit` type-ahead matches per entity type (users, classes, courses) and the generation
+    they come from: the current one, whose search indexes are built when it's published.
+    """
+    generation = await _snapshot_for(None)
+    indexes = generation.indexes.search
+    if indexes is None:  # Loaded from disk at startup: indexed on the first search
+        indexes = await asyncio.to_thread(_search_indexer.update, generation.data, (), None)
+        generation.indexes.search = indexes
+    return {t: indexes[t].search(query, limit) for t in (entity_types or SEARCH_FIELDS)}, generation
+
+
+def get_integrity_report() -> Dict[str, Any]:
+    """Dangling-reference counts and samples per foreign-key rule, for the last snapshot checked."""
+    return _reference_validator.get_report()
+
+
+def get_search_stats() -> Dict[str, Any]:
+    current = _current_generation()
+    return _search_indexer.stats(current.indexes.search if current is not None else None)
+
+
+_DELTA_FILTER_RE = re.compile(r"^\s*dateLastModified\s*(>=|>)\s*['\"]?([^'\"]+)['\"]?\s*$")
+
+
+async def _get_modified_since(
+        entity_type: str, filter_str: Optional[str], generation: Optional[str] = None
+) -> Optional[List[Any]]:
+    """
+    Handles delta sync filters like ?filter=dateLastModified>'2024-01-01T00:00:00Z' through the
+    time-ordered index. Returns None if filter_str isn't a dateLastModified filter.
+    """
+    match = _DELTA_FILTER_RE.match(filter_str) if filter_str else None
+    if not match:
+        return None
+    operator, value = match.groups()
+    try:
+        since = normalize_timestamp(value)
+    except ValueError:
+        print(f"Warning: Could not parse dateLastModified in filter: {filter_str}")
+        return None
+    snapshot = await _snapshot_for(generation)
+    return snapshot.indexes.modified_since(entity_type, since, inclusive=(operator == ">="))
+
+
+def _only_records_in(records: List[Any], subset: List[Any]) -> List[Any]:
+    # Intersection of two result lists of the same snapshot (e.g. activeOn + a delta filter),
+    # keeping the order of `records`. Snapshot records are shared objects, so identity is enough.
+    wanted = {id(r) for r in subset}
+    return [r for r in records if id(r) in wanted]
+
+
 # --- Service functions for specific OneRoster entities ---
 
-async def get_orgs(limit: int = 100, offset: int = 0, filter_str: Optional[str] = None) -> List[Org]:
-    data = await get_all_data()
+async def get_orgs(limit: int = 100, offset: int = 0, filter_str: Optional[str] = None,
+                   generation: Optional[str] = None) -> List[Org]:
+    modified = await _get_modified_since("orgs", filter_str, generation)
+    if modified is not None:
+        return modified[offset: offset + limit]
+    data = (await _snapshot_for(generation)).data
     orgs = data.orgs
     # Basic filtering example (can be expanded significantly)
     if filter_str:
@@ -53,12 +362,15 @@ async def get_orgs(limit: int = 100, offset: int = 0, filter_str: Optional[str]
 
 
 async def get_org_by_id(sourced_id: str) -> Optional[Org]:
-    data = await get_all_data()
-    return next((org for org in data.orgs if org.sourcedId == sourced_id), None)
+    return await _lookup("orgs", sourced_id)
 
 
-async def get_users(limit: int = 100, offset: int = 0, filter_str: Optional[str] = None) -> List[User]:
-    data = await get_all_data()
+async def get_users(limit: int = 100, offset: int = 0, filter_str: Optional[str] = None,
+                    generation: Optional[str] = None) -> List[User]:
+    modified = await _get_modified_since("users", filter_str, generation)
+    if modified is not None:
+        return modified[offset: offset + limit]
+    data = (await _snapshot_for(generation)).data
     users = data.users
     if filter_str:
         # Example: ?filter=role='student'
@@ -75,15 +387,20 @@ async def get_users(limit: int = 100, offset: int = 0, filter_str: Optional[str]
 
 
 async def get_user_by_id(sourced_id: str) -> Optional[User]:
-    data = await get_all_data()
-    return next((user for user in data.users if user.sourcedId == sourced_id), None)
-
-
-async def get_classes(limit: int = 100, offset: int = 0, filter_str: Optional[str] = None) -> List[Class]:
-    data = await get_all_data()
-    classes = data.classes
+    return await _lookup("users", sourced_id)
+
+
+async def get_classes(limit: int = 100, offset: int = 0, filter_str: Optional[str] = None,
+                      generation: Optional[str] = None, active_on: Optional[date] = None) -> List[Class]:
+    modified = await _get_modified_since("classes", filter_str, generation)
+    if modified is not None and active_on is None:
+        return modified[offset: offset + limit]
+    snapshot = await _snapshot_for(generation)
+    classes = snapshot.indexes.active_on("classes", active_on) if active_on else snapshot.data.classes
+    if modified is not None:
+        classes = _only_records_in(classes, modified)
     # Add filtering logic similar to get_orgs or get_users if needed
-    if filter_str:
+    elif filter_str:
         try:
             key, value_with_quotes = filter_str.split("=")
             value = value_with_quotes.strip("'\"")
@@ -98,37 +415,35 @@ async def get_classes(limit: int = 100, offset: int = 0, filter_str: Optional[st
 
 
 async def get_class_by_id(sourced_id: str) -> Optional[Class]:
-    data = await get_all_data()
-    return next((cls for cls in data.classes if cls.sourcedId == sourced_id), None)
+    return await _lookup("classes", sourced_id)
+
+
+async def _users_of_class(class_sourced_id: str, role: RoleType, limit: int, offset: int) -> List[User]:
+    # The class's enrollments come from the snapshot's per-class grouping, the users from its sourcedId index
+    indexes = (await _snapshot_for(None)).indexes
+    enrollments = indexes.grouped_by("enrollments", "classSourcedId").get(class_sourced_id, ())
+    users = indexes.by_id("users")
+    user_ids = dict.fromkeys(e.userSourcedId for e in enrollments if e.role == role and e.userSourcedId in users)
+    return [users[i] for i in list(user_ids)[offset: offset + limit]]
 
 
 async def get_students_for_class(class_sourced_id: str, limit: int = 100, offset: int = 0) -> List[User]:
-    data = await get_all_data()
-    student_ids_in_class = {
-        enr.userSourcedId
-        for enr in data.enrollments
-        if enr.classSourcedId == class_sourced_id and enr.role == "student"  # RoleType.STUDENT.value
-    }
-    students = [user for user in data.users if user.sourcedId in student_ids_in_class]
-    return students[offset: offset + limit]
+    return await _users_of_class(class_sourced_id, RoleType.STUDENT, limit, offset)
 
 
 async def get_teachers_for_class(class_sourced_id: str, limit: int = 100, offset: int = 0) -> List[User]:
-    data = await get_all_data()
-    teacher_ids_in_class = {
-        enr.userSourcedId
-        for enr in data.enrollments
-        if enr.classSourcedId == class_sourced_id and enr.role == "teacher"  # RoleType.TEACHER.value
-    }
-    teachers = [user for user in data.users if user.sourcedId in teacher_ids_in_class]
-    return teachers[offset: offset + limit]
+    return await _users_of_class(class_sourced_id, RoleType.TEACHER, limit, offset)
 
 # Add more functions for courses, enrollments, academicSessions as needed
 # e.g., get_courses, get_enrollments_for_user, etc.
 
 # --- NEW Service functions ---
-async def get_courses(limit: int = 100, offset: int = 0, filter_str: Optional[str] = None) -> List[Course]:
-    data = await get_all_data()
+async def get_courses(limit: int = 100, offset: int = 0, filter_str: Optional[str] = None,
+                      generation: Optional[str] = None) -> List[Course]:
+    modified = await _get_modified_since("courses", filter_str, generation)
+    if modified is not None:
+        return modified[offset: offset + limit]
+    data = (await _snapshot_for(generation)).data
     courses = data.courses
     if filter_str:
         try:
@@ -145,14 +460,19 @@ async def get_courses(limit: int = 100, offset: int = 0, filter_str: Optional[st
 
 
 async def get_course_by_id(sourced_id: str) -> Optional[Course]:
-    data = await get_all_data()
-    return next((c for c in data.courses if c.sourcedId == sourced_id), None)
-
-
-async def get_enrollments(limit: int = 100, offset: int = 0, filter_str: Optional[str] = None) -> List[Enrollment]:
-    data = await get_all_data()
-    enrollments = data.enrollments
-    if filter_str:
+    return await _lookup("courses", sourced_id)
+
+
+async def get_enrollments(limit: int = 100, offset: int = 0, filter_str: Optional[str] = None,
+                          generation: Optional[str] = None, active_on: Optional[date] = None) -> List[Enrollment]:
+    modified = await _get_modified_since("enrollments", filter_str, generation)
+    if modified is not None and active_on is None:
+        return modified[offset: offset + limit]
+    snapshot = await _snapshot_for(generation)
+    enrollments = snapshot.indexes.active_on("enrollments", active_on) if active_on else snapshot.data.enrollments
+    if modified is not None:
+        enrollments = _only_records_in(enrollments, modified)
+    elif filter_str:
         try:
             key, value_with_quotes = filter_str.split("=")
             value = value_with_quotes.strip("'\"").lower()
@@ -172,15 +492,20 @@ async def get_enrollments(limit: int = 100, offset: int = 0, filter_str: Optiona
 
 
 async def get_enrollment_by_id(sourced_id: str) -> Optional[Enrollment]:
-    data = await get_all_data()
-    return next((e for e in data.enrollments if e.sourcedId == sourced_id), None)
+    return await _lookup("enrollments", sourced_id)
 
 
-async def get_academic_sessions(limit: int = 100, offset: int = 0, filter_str: Optional[str] = None) -> List[
+async def get_academic_sessions(limit: int = 100, offset: int = 0, filter_str: Optional[str] = None,
+                                generation: Optional[str] = None, active_on: Optional[date] = None) -> List[
     AcademicSession]:
-    data = await get_all_data()
-    sessions = data.academicSessions
-    if filter_str:
+    modified = await _get_modified_since("academicSessions", filter_str, generation)
+    if modified is not None and active_on is None:
+        return modified[offset: offset + limit]
+    snapshot = await _snapshot_for(generation)
+    sessions = snapshot.indexes.active_on("academicSessions", active_on) if active_on else snapshot.data.academicSessions
+    if modified is not None:
+        sessions = _only_records_in(sessions, modified)
+    elif filter_str:
         try:
             key, value_with_quotes = filter_str.split("=")
             value = value_with_quotes.strip("'\"").lower()
@@ -196,17 +521,56 @@ async def get_academic_sessions(limit: int = 100, offset: int = 0, filter_str: O
 
 
 async def get_academic_session_by_id(sourced_id: str) -> Optional[AcademicSession]:
-    data = await get_all_data()
-    return next((s for s in data.academicSessions if s.sourcedId == sourced_id), None)
+    return await _lookup("academicSessions", sourced_id)
 
 
 # Example: Get classes for a specific course
 async def get_classes_for_course(course_sourced_id: str, limit: int = 100, offset: int = 0) -> List[Class]:
-    data = await get_all_data()
-    # First, check if course exists (optional, but good practice)
-    course = await get_course_by_id(course_sourced_id)
-    if not course:
-        return []  # Or raise HTTPException(404) from router
-
-    classes = [cls for cls in data.classes if cls.courseSourcedId == course_sourced_id]
-    return classes[offset: offset + limit]
\ No newline at end of file
+    indexes = (await _snapshot_for(None)).indexes
+    return indexes.grouped_by("classes", "courseSourcedId").get(course_sourced_id, [])[offset: offset + limit]
+
+
+async def get_classes_for_user(user_sourced_id: str, role: Optional[str] = None, limit: int = 100,
+                               offset: int = 0) -> List[Class]:
+    """Classes the user is enrolled in (optionally with one role only), in enrollment order."""
+    indexes = (await _snapshot_for(None)).indexes
+    enrollments = indexes.grouped_by("enrollments", "userSourcedId").get(user_sourced_id, ())
+    classes = indexes.by_id("classes")
+    class_ids = dict.fromkeys(e.classSourcedId for e in enrollments
+                              if (not role or e.role.value == role) and e.classSourcedId in classes)
+    return [classes[i] for i in list(class_ids)[offset: offset + limit]]
+
+
+async def get_classes_for_term(term_sourced_id: str, limit: int = 100, offset: int = 0) -> List[Class]:
+    """Classes scheduled in an academic session (listed in their termSourcedIds), via the per-snapshot term index."""
+    snapshot = await _snapshot_for(None)
+    return snapshot.indexes.classes_for_term(term_sourced_id)[offset: offset + limit]
+
+
+_LIST_GETTERS = {
+    "orgs": get_orgs, "users": get_users, "classes": get_classes, "courses": get_courses,
+    "enrollments": get_enrollments, "academicSessions": get_academic_sessions,
+}
+
+
+async def query_nested(entity_type: str, expand: Optional[str] = None, ids: Optional[List[str]] = None,
+                       limit: int = 100, offset: int = 0, filter_str: Optional[str] = None,
+                       generation: Optional[str] = None
+                       ) -> Tuple[List[Any], Dict[str, Dict[str, Any]], Dict[str, List[Any]], SnapshotGeneration]:
+    """
+    A root set of `entity_type` (the given sourcedIds, or a page of the list with the usual
+    filter) plus the expand paths, resolved together against one snapshot. Returns the roots,
+    relationships, included records and the generation. Raises InvalidExpansionError.
+    """
+    tree = parse_expand(entity_type, expand)
+    snapshot = await _snapshot_for(generation)
+    if ids is not None:
+        by_id = snapshot.indexes.by_id(entity_type)
+        roots = [by_id[i] for i in dict.fromkeys(ids) if i in by_id]
+    else:
+        roots = await _LIST_GETTERS[entity_type](limit=limit, offset=offset, filter_str=filter_str,
+                                                 generation=snapshot.token)
+    # The indexes are built at publish time, so this is proportional to what the expansion touches; a wide
+    # expansion can still be thousands of records, so it runs off the event loop
+    relationships, included = await asyncio.to_thread(resolve_expansions, snapshot.indexes, entity_type, roots, tree)
+    return roots, relationships, included, snapshot
@@ -0,0 +1,358 @@
+# app/services/push_engine.py
+import asyncio
+import heapq
+import json
+import os
+import time
+from collections import OrderedDict
+from operator import itemgetter
+from typing import Any, Dict, List, Optional, Tuple
+import httpx
+from pydantic import TypeAdapter
+from app.models.change_models import ChangeOperation
+from app.models.oneroster_models import StatusType
+from app.models.sync_models import PushConsumerConfig, PushConsumerStatus
+from app.services import change_feed, oneroster_data_service
+from app.services.record_versions import ENTITY_TYPES, utc_timestamp
+from app.services.snapshot_generations import SnapshotGeneration
+
+# Registered consumers and their checkpoints, so a restart resumes where each consumer left off
+PUSH_STATE_PATH = os.getenv("ONEROSTER_PUSH_STATE_PATH", os.path.join("data", "push_consumers.json"))
+# Request headers per consumer (usually credentials), which are never written to the state file:
+# ONEROSTER_PUSH_CONSUMER_HEADERS='{"lms-sync": {"Authorization": "Bearer ..."}}'
+PUSH_CONSUMER_HEADERS: Dict[str, Dict[str, str]] = json.loads(os.getenv("ONEROSTER_PUSH_CONSUMER_HEADERS") or "{}")
+PUSH_TIMEOUT_SECONDS = float(os.getenv("ONEROSTER_PUSH_TIMEOUT_SECONDS", "30"))
+IDLE_POLL_SECONDS = 30.0  # Up-to-date consumers also re-check this often, not only when the change feed fires
+RETRY_BASE_SECONDS = 0.5  # Backoff between attempts of one batch: 0.5s, 1s, 2s, ... capped below
+RETRY_MAX_SECONDS = 30.0
+FAILED_ROUND_BACKOFF_SECONDS = 60.0  # After a batch ran out of retries, wait this long before trying again
+CHECKPOINT_SAVE_INTERVAL_SECONDS = 1.0  # Checkpoints are written at most this often during a long push
+BATCH_BODY_CACHE_MAX_BYTES = 64 * 1024 * 1024  # Serialized batches shared by consumers at the same checkpoint
+
+# A change's position in the push order: (dateLastModified, index in ENTITY_TYPES, sourcedId).
+# Stamps survive restarts (they're persisted with the snapshot) and a record that changes again
+# gets a newer stamp, so "everything after the checkpoint" is exact across restarts too.
+Cursor = Tuple[str, int, str]
+BEGINNING: Cursor = ("", -1, "")
+
+_changes_adapter = TypeAdapter(List[Any])
+
+
+def _pending_changes(generation: SnapshotGeneration, cursor: Cursor) -> List[Tuple[Cursor, str, Any]]:
+    """
+    Every record of the snapshot after `cursor`, in push order: older changes first and,
+    for the same stamp, in entity dependency order (orgs ... enrollments). Uses the
+    snapshot's dateLastModified index, so it's O(log n + k) per entity type.
+    """
+    streams = []
+    for type_index, entity_type in enumerate(ENTITY_TYPES):
+        records = generation.indexes.modified_since(entity_type, cursor[0], inclusive=True)
+        keyed = [((r.dateLastModified, type_index, r.sourcedId), entity_type, r) for r in records]
+        keyed.sort(key=itemgetter(0))  # The index orders by stamp only; sourcedId makes the order total
+        streams.append(keyed)
+    return [change for change in heapq.merge(*streams, key=itemgetter(0)) if change[0] > cursor]
+
+
+def _newest_cursor(generation: SnapshotGeneration) -> Cursor:
+    """Position of the snapshot's newest change: a consumer starting there gets only later changes."""
+    return max(
+        ((r.dateLastModified, type_index, r.sourcedId)
+         for type_index, entity_type in enumerate(ENTITY_TYPES)
+         for r in generation.indexes.newest_modified(entity_type)),
+        default=BEGINNING,
+    )
+
+
+def _batch_body(changes: List[Tuple[Cursor, str, Any]]) -> bytes:
+    # Records that disappeared from the sources are tombstones (status=tobedeleted): sent as deletes
+    payload = [
+        {
+            "entityType": entity_type, "sourcedId": record.sourcedId,
+            "operation": (ChangeOperation.DELETE if record.status == StatusType.TOBEDELETED else ChangeOperation.UPSERT).value,
+            "record": record,
+        }
+        for _, entity_type, record in changes
+    ]
+    return b'{"changes":' + _changes_adapter.dump_json(payload) + b',"checkpoint":' + \
+        json.dumps(list(changes[-1][0])).encode() + b"}"
+
+
+class PushConsumer:
+    def __init__(self, config: PushConsumerConfig, cursor: Cursor):
+        self.config = config
+        self.cursor = cursor
+        self.state = "idle"
+        self.pending = 0
+        self.delivered_batches = 0
+        self.delivered_changes = 0
+        self.failed_attempts = 0
+        self.last_delivered_at: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def status(self) -> PushConsumerStatus:
+        return PushConsumerStatus(
+            name=self.config.name, url=self.config.url, state=self.state, checkpoint=list(self.cursor),
+            pendingChanges=self.pending, deliveredBatches=self.delivered_batches,
+            deliveredChanges=self.delivered_changes, failedAttempts=self.failed_attempts,
+            lastDeliveredAt=self.last_delivered_at, lastError=self.last_error,
+        )
+
+
+class PushEngine:
+    """
+    Pushes roster changes to registered downstream consumers. The diff between snapshots is
+    computed once (dateLastModified stamping in the data service); per consumer this only
+    looks up the records after its checkpoint and POSTs them in batches, with up to
+    maxConcurrency batches in flight, retries with backoff, and a checkpoint persisted as
+    the completed prefix of batches grows. Delivery is at-least-once: after a crash, batches
+    that were in flight are sent again. Consumers at the same checkpoint share the lookup
+    and the serialized batches, so fan-out doesn't multiply the serialization work.
+    """
+
+    def __init__(self, state_path: str = PUSH_STATE_PATH):
+        self.state_path = state_path
+        self._consumers: Dict[str, PushConsumer] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+        self._running = False
+        self._save_lock = asyncio.Lock()
+        self._last_save = 0.0
+        # (generation token, cursor) -> pending changes; (token, cursor, batch size, batch no.) -> body
+        self._pending_cache: "OrderedDict[Tuple[str, Cursor], List[Tuple[Cursor, str, Any]]]" = OrderedDict()
+        self._body_cache: "OrderedDict[Tuple[str, Cursor, int, int], bytes]" = OrderedDict()
+        self._body_cache_bytes = 0
+
+    # --- Registry and durable state ---
+
+    def load_state(self) -> None:
+        if not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            for entry in state.get("consumers", []):
+                name = entry["config"]["name"]
+                if entry["config"].get("headers") and name not in PUSH_CONSUMER_HEADERS:
+                    print(f"Warning: Dropped the headers of push consumer '{name}' from {self.state_path}; "
+                          f"configure them in ONEROSTER_PUSH_CONSUMER_HEADERS.")
+                config = PushConsumerConfig(**{**entry["config"], "headers": PUSH_CONSUMER_HEADERS.get(name, {})})
+                self._consumers[name] = PushConsumer(config, tuple(entry["checkpoint"]))
+        except Exception as e:  # Unreadable state: consumers have to be registered again
+            print(f"Warning: Could not load push consumer state from {self.state_path}: {e}")
+        print(f"Loaded {len(self._consumers)} push consumers from {self.state_path}.")
+
+    def _write_state(self, state: Dict[str, Any]) -> None:
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    async def save_state(self) -> None:
+        state = {"consumers": [
+            {"config": c.config.model_dump(exclude={"headers"}), "checkpoint": list(c.cursor)}
+            for c in self._consumers.values()
+        ]}
+        async with self._save_lock:
+            self._last_save = time.monotonic()
+            try:
+                await asyncio.to_thread(self._write_state, state)
+            except Exception as e:
+                print(f"Warning: Could not persist push consumer state: {e}")
+
+    async def register(self, config: PushConsumerConfig) -> PushConsumerStatus:
+        """
+        Adds a consumer, or replaces the config of an existing one (keeping its checkpoint).
+        Headers given here last until the next restart; ONEROSTER_PUSH_CONSUMER_HEADERS supplies
+        them after that (and is merged in here, the registration's headers winning).
+        """
+        if config.headers and config.name not in PUSH_CONSUMER_HEADERS:
+            print(f"Warning: The headers of push consumer '{config.name}' are not persisted; configure them in "
+                  f"ONEROSTER_PUSH_CONSUMER_HEADERS to keep them across restarts.")
+        config = config.model_copy(update={"headers": {**PUSH_CONSUMER_HEADERS.get(config.name, {}), **config.headers}})
+        existing = self._consumers.get(config.name)
+        if existing is not None:
+            cursor = existing.cursor
+        elif config.startFrom == "beginning":
+            cursor = BEGINNING
+        else:
+            # After the newest change already published, not the wall clock: stamps come from the
+            # sync that produced them, so a clock-based cursor could skip changes or resend them
+            cursor = _newest_cursor(await oneroster_data_service.get_generation())
+        existing = self._consumers.pop(config.name, None)
+        if existing is not None:
+            self._stop_consumer(existing)
+        consumer = PushConsumer(config, cursor)
+        self._consumers[config.name] = consumer
+        await self.save_state()
+        self._start_consumer(consumer)
+        return consumer.status()
+
+    async def remove(self, name: str) -> bool:
+        consumer = self._consumers.pop(name, None)
+        if consumer is None:
+            return False
+        self._stop_consumer(consumer)
+        await self.save_state()
+        return True
+
+    async def reset(self, name: str) -> Optional[PushConsumerStatus]:
+        """Rewinds a consumer to the beginning, so it gets the full roster again."""
+        consumer = self._consumers.get(name)
+        if consumer is None:
+            return None
+        self._stop_consumer(consumer)
+        consumer.cursor = BEGINNING
+        await self.save_state()
+        self._start_consumer(consumer)
+        return consumer.status()
+
+    def statuses(self) -> List[PushConsumerStatus]:
+        return [c.status() for c in self._consumers.values()]
+
+    def get_consumer(self, name: str) -> Optional[PushConsumer]:
+        return self._consumers.get(name)
+
+    # --- Workers ---
+
+    def _start_consumer(self, consumer: PushConsumer) -> None:
+        if self._running:
+            consumer.task = asyncio.create_task(self._run_consumer(consumer))
+
+    def _stop_consumer(self, consumer: PushConsumer) -> None:
+        if consumer.task is not None:
+            consumer.task.cancel()
+            consumer.task = None
+
+    async def run(self) -> None:
+        """Runs one push worker per consumer until cancelled (started from the app lifespan)."""
+        self.load_state()
+        self._client = httpx.AsyncClient(timeout=PUSH_TIMEOUT_SECONDS)
+        self._running = True
+        for consumer in self._consumers.values():
+            self._start_consumer(consumer)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            self._running = False
+            for consumer in self._consumers.values():
+                self._stop_consumer(consumer)
+            await self._client.aclose()
+            self._client = None
+
+    async def _run_consumer(self, consumer: PushConsumer) -> None:
+        while True:
+            new_changes = change_feed.change_log.wait_for_new()  # Registered before looking, so nothing is missed
+            try:
+                generation = await oneroster_data_service.get_generation()
+            except oneroster_data_service.SnapshotUnavailableError:
+                new_changes.close()
+                await asyncio.sleep(IDLE_POLL_SECONDS)
+                continue
+            pending = self._pending_for(generation, consumer.cursor)
+            consumer.pending = len(pending)
+            if not pending:
+                consumer.state = "idle"
+                try:
+                    await asyncio.wait_for(new_changes, timeout=IDLE_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            new_changes.close()
+            consumer.state = "pushing"
+            if not await self._push_round(consumer, generation, pending):
+                consumer.state = "backoff"
+                await asyncio.sleep(FAILED_ROUND_BACKOFF_SECONDS)
+
+    def _pending_for(self, generation: SnapshotGeneration, cursor: Cursor) -> List[Tuple[Cursor, str, Any]]:
+        key = (generation.token, cursor)
+        pending = self._pending_cache.get(key)
+        if pending is None:
+            pending = _pending_changes(generation, cursor)
+            self._pending_cache[key] = pending
+            while len(self._pending_cache) > max(8, len(self._consumers)):
+                self._pending_cache.popitem(last=False)
+        return pending
+
+    def _body_for(self, generation: SnapshotGeneration, cursor: Cursor, batch_size: int, number: int,
+                  changes: List[Tuple[Cursor, str, Any]]) -> bytes:
+        key = (generation.token, cursor, batch_size, number)
+        body = self._body_cache.get(key)
+        if body is not None:
+            self._body_cache.move_to_end(key)
+            return body
+        body = _batch_body(changes)
+        if len(body) <= BATCH_BODY_CACHE_MAX_BYTES:
+            self._body_cache[key] = body
+            self._body_cache_bytes += len(body)
+            while self._body_cache_bytes > BATCH_BODY_CACHE_MAX_BYTES:
+                _, evicted = self._body_cache.popitem(last=False)
+                self._body_cache_bytes -= len(evicted)
+        return body
+
+    async def _push_round(self, consumer: PushConsumer, generation: SnapshotGeneration,
+                          pending: List[Tuple[Cursor, str, Any]]) -> bool:
+        """
+        Sends everything pending in batches, at most maxConcurrency at a time. The checkpoint
+        only moves over the completed prefix, so a batch finishing early never skips one that
+        is still in flight. Returns False if a batch ran out of retries.
+        """
+        config = consumer.config
+        start_cursor = consumer.cursor
+        batches = [pending[i:i + config.batchSize] for i in range(0, len(pending), config.batchSize)]
+        completed = [False] * len(batches)
+        prefix = 0
+        failed = False
+        semaphore = asyncio.Semaphore(config.maxConcurrency)
+
+        async def send(number: int) -> None:
+            nonlocal prefix, failed
+            async with semaphore:
+                if failed:
+                    return
+                body = self._body_for(generation, start_cursor, config.batchSize, number, batches[number])
+                if not await self._post_with_retries(consumer, body):
+                    failed = True
+                    return
+            completed[number] = True
+            consumer.delivered_batches += 1
+            consumer.delivered_changes += len(batches[number])
+            consumer.last_delivered_at = utc_timestamp()
+            if number == prefix:
+                while prefix < len(batches) and completed[prefix]:
+                    prefix += 1
+                consumer.cursor = batches[prefix - 1][-1][0]
+                consumer.pending = len(pending) - sum(len(b) for b in batches[:prefix])
+                if time.monotonic() - self._last_save >= CHECKPOINT_SAVE_INTERVAL_SECONDS:
+                    await self.save_state()
+
+        await asyncio.gather(*(send(number) for number in range(len(batches))))
+        await self.save_state()
+        return not failed
+
+    async def _post_with_retries(self, consumer: PushConsumer, body: bytes) -> bool:
+        config = consumer.config
+        headers = {"Content-Type": "application/json", "X-OneRoster-Consumer": config.name, **config.headers}
+        for attempt in range(config.maxRetries + 1):
+            try:
+                response = await self._client.post(config.url, content=body, headers=headers)
+                if response.is_success:
+                    return True
+                consumer.last_error = f"HTTP {response.status_code} from {config.url}"
+            except httpx.HTTPError as e:
+                consumer.last_error = f"{type(e).__name__}: {e}"
+            consumer.failed_attempts += 1
+            if attempt < config.maxRetries:
+                await asyncio.sleep(min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt))
+        print(f"Warning: Push to consumer '{config.name}' failed after {config.maxRetries + 1} attempts: "
+              f"{consumer.last_error}")
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"consumers": len(self._consumers), "cachedPendingLists": len(self._pending_cache),
+                "cachedBatchBodies": len(self._body_cache), "cachedBatchBytes": self._body_cache_bytes}
+
+
+engine = PushEngine()
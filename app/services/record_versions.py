@@ -0,0 +1,141 @@
+# app/services/record_versions.py
+import hashlib
+from datetime import datetime, timezone, timedelta
+from operator import is_
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import BaseModel
+from app.models.change_models import ChangeOperation
+from app.models.oneroster_models import ProcessedOneRosterData, StatusType
+
+# Entity lists on ProcessedOneRosterData that are versioned, in dependency order
+ENTITY_TYPES = ("orgs", "academicSessions", "courses", "classes", "users", "enrollments")
+
+# (entityType, operation, sourcedId, new record or None for deletes)
+RecordChange = Tuple[str, ChangeOperation, str, Optional[BaseModel]]
+
+# How long records that disappeared from the sources stay in the snapshot as status=tobedeleted
+TOMBSTONE_RETENTION = timedelta(days=30)
+
+# Every stamp uses the same fixed-width format, so stamps sort correctly as plain strings
+_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+
+def utc_timestamp(moment: Optional[datetime] = None) -> str:
+    return (moment or datetime.now(timezone.utc)).strftime(_TIMESTAMP_FORMAT)
+
+
+def normalize_timestamp(value: str) -> str:
+    """
+    Converts a client supplied ISO 8601 timestamp into the stamp format, so it can be
+    compared with dateLastModified values as a string. Raises ValueError if unparseable.
+    """
+    moment = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return utc_timestamp(moment.astimezone(timezone.utc))
+
+
+def content_hash(record: BaseModel) -> str:
+    # dateLastModified is what we're deriving, so it can't be part of the content.
+    # model_dump_json serializes in pydantic-core (field order is fixed by the model), which is
+    # several times faster than model_dump() + json.dumps() and this runs for every record.
+    content = record.model_dump_json(exclude={"dateLastModified"})
+    return hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+
+
+class RecordVersionStore:
+    """
+    Remembers a content hash and dateLastModified per record across snapshot generations,
+    so dateLastModified only moves when a record's content actually changes.
+    """
+
+    def __init__(self):
+        # entity type -> sourcedId -> (content hash, dateLastModified)
+        self._versions: Dict[str, Dict[str, Tuple[str, str]]] = {t: {} for t in ENTITY_TYPES}
+        # entity type -> id(merged record) -> (merged record, its stamped copy in the last snapshot)
+        self._stamped_copies: Dict[str, Dict[int, Tuple[BaseModel, BaseModel]]] = {t: {} for t in ENTITY_TYPES}
+
+    def export_state(self) -> Dict[str, Dict[str, Tuple[str, str]]]:
+        return dict(self._versions)  # Inner dicts are replaced, never mutated, so a shallow copy is a stable view
+
+    def restore_state(self, state: Dict[str, Dict[str, Tuple[str, str]]]) -> None:
+        self._versions = {t: dict(state.get(t, {})) for t in ENTITY_TYPES}
+
+    def stamp(
+            self, previous: Optional[ProcessedOneRosterData], data: ProcessedOneRosterData
+    ) -> Tuple[ProcessedOneRosterData, List[RecordChange]]:
+        """
+        Stamps dateLastModified on a freshly built snapshot: unchanged records keep their
+        previous stamp, new or changed ones get the build time. Records present in the
+        previous snapshot but gone from this one are carried over as status=tobedeleted.
+        Returns the stamped snapshot and the record-level changes against `previous`.
+
+        Records are never stamped in place: the merge hands through objects that the per-source
+        data and older snapshot generations still hold, so a record whose stamp has to change is
+        copied. The copy is reused for as long as the merge keeps returning the same object.
+        """
+        now = utc_timestamp()
+        tombstone_cutoff = utc_timestamp(datetime.now(timezone.utc) - TOMBSTONE_RETENTION)
+        changes: List[RecordChange] = []
+        stamped: Dict[str, List[Any]] = {}
+
+        for entity_type in ENTITY_TYPES:
+            known = self._versions[entity_type]
+            previous_by_id = {r.sourcedId: r for r in getattr(previous, entity_type)} if previous else {}
+            stamped_copies = self._stamped_copies[entity_type]
+            copies: Dict[int, Tuple[BaseModel, BaseModel]] = {}
+            versions: Dict[str, Tuple[str, str]] = {}
+            records: List[Any] = []
+
+            for record in getattr(data, entity_type):
+                sourced_id = record.sourcedId
+                previous_record = previous_by_id.get(sourced_id)
+                copied = stamped_copies.get(id(record))
+                if copied is not None and copied[0] is record and copied[1] is previous_record:
+                    # Same object as last time, which was stamped as a copy: carry the copy over
+                    copies[id(record)] = copied
+                    record = previous_record
+                if previous_record is record and sourced_id in known:
+                    # Same object carried over from the previous snapshot: nothing to hash
+                    versions[sourced_id] = known[sourced_id]
+                    records.append(record)
+                    continue
+                digest = content_hash(record)
+                prior = known.get(sourced_id)
+                changed = prior is None or prior[0] != digest
+                modified = now if changed else prior[1]
+                if record.dateLastModified != modified:
+                    stamped_record = record.model_copy(update={"dateLastModified": modified})
+                    copies[id(record)] = (record, stamped_record)
+                    record = stamped_record
+                if changed:
+                    changes.append((entity_type, ChangeOperation.UPSERT, sourced_id, record))
+                versions[sourced_id] = (digest, modified)
+                records.append(record)
+
+            for sourced_id, old_record in previous_by_id.items():
+                if sourced_id in versions:
+                    continue
+                if old_record.status == StatusType.TOBEDELETED:
+                    # Already a tombstone: keep it around until the retention window passes
+                    if old_record.dateLastModified < tombstone_cutoff:
+                        continue
+                    tombstone = old_record
+                else:
+                    tombstone = old_record.model_copy(update={"status": StatusType.TOBEDELETED, "dateLastModified": now})
+                    changes.append((entity_type, ChangeOperation.DELETE, sourced_id, None))
+                if tombstone is old_record and sourced_id in known:
+                    versions[sourced_id] = known[sourced_id]
+                else:
+                    versions[sourced_id] = (content_hash(tombstone), tombstone.dateLastModified)
+                records.append(tombstone)
+
+            self._versions[entity_type] = versions
+            self._stamped_copies[entity_type] = copies
+            previous_records = getattr(previous, entity_type) if previous else None
+            if previous_records is not None and len(previous_records) == len(records) \
+                    and all(map(is_, previous_records, records)):
+                records = previous_records  # Nothing changed: the same list, so indexes over it carry over
+            stamped[entity_type] = records
+
+        return ProcessedOneRosterData.model_construct(**stamped), changes
@@ -0,0 +1,125 @@
+# app/services/referential_integrity.py
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, NamedTuple, Optional, Set
+from app.models.oneroster_models import ProcessedOneRosterData, StatusType
+
+# Runs after every published snapshot (full syncs and change batches); turn off to skip it entirely
+VALIDATE_REFERENCES = os.getenv("ONEROSTER_VALIDATE_REFERENCES", "1").lower() not in ("0", "false", "no")
+SAMPLE_SIZE = int(os.getenv("ONEROSTER_INTEGRITY_SAMPLE_SIZE", "20"))  # Offending records kept per rule
+
+
+class ReferenceRule(NamedTuple):
+    entity_type: str  # Collection holding the reference
+    field: str
+    target_type: str  # Collection the reference must resolve in
+    many: bool = False  # A list of references (all must resolve)
+
+    @property
+    def name(self) -> str:
+        return f"{self.entity_type}.{self.field} -> {self.target_type}"
+
+
+RULES: List[ReferenceRule] = [
+    ReferenceRule("enrollments", "userSourcedId", "users"),
+    ReferenceRule("enrollments", "classSourcedId", "classes"),
+    ReferenceRule("enrollments", "schoolSourcedId", "orgs"),
+    ReferenceRule("classes", "courseSourcedId", "courses"),
+    ReferenceRule("classes", "schoolSourcedId", "orgs"),
+    ReferenceRule("classes", "termSourcedIds", "academicSessions", many=True),
+    ReferenceRule("courses", "orgSourcedId", "orgs"),
+    ReferenceRule("courses", "schoolYearSourcedId", "academicSessions"),
+    ReferenceRule("orgs", "parentSourcedId", "orgs"),
+    ReferenceRule("users", "agentSourcedIds", "orgs", many=True),
+    ReferenceRule("academicSessions", "parentSourcedId", "academicSessions"),
+]
+
+
+def _dangling(records: List[Any], rule: ReferenceRule, ids: Set[str]) -> List[Any]:
+    """
+    Live records of `rule.entity_type` with a reference that isn't in `ids`. One pass of set
+    lookups; the status check only runs for the (normally few) records that fail the lookup.
+    """
+    field, deleted = rule.field, StatusType.TOBEDELETED
+    if rule.many:
+        return [r for r in records
+                if getattr(r, field) and not ids.issuperset(getattr(r, field)) and r.status != deleted]
+    return [r for r in records
+            if getattr(r, field) is not None and getattr(r, field) not in ids and r.status != deleted]
+
+
+def _missing_ids(record: Any, rule: ReferenceRule, ids: Set[str]) -> List[str]:
+    value = getattr(record, rule.field)
+    return [v for v in value if v not in ids] if rule.many else [value]
+
+
+def validate_references(data: ProcessedOneRosterData) -> Dict[str, Any]:
+    """
+    Checks every foreign key of a snapshot against the sourcedIds that exist in it. A reference
+    to a record that is only a tombstone (status=tobedeleted) counts as dangling; tombstones'
+    own references aren't checked. Returns per-rule violation counts plus a sample of offenders.
+    """
+    start = time.perf_counter()
+    ids: Dict[str, Set[str]] = {
+        entity_type: {r.sourcedId for r in getattr(data, entity_type) if r.status != StatusType.TOBEDELETED}
+        for entity_type in {rule.target_type for rule in RULES}
+    }
+    rules: Dict[str, Dict[str, Any]] = {}
+    for rule in RULES:
+        target_ids = ids[rule.target_type]
+        dangling = _dangling(getattr(data, rule.entity_type), rule, target_ids)
+        rules[rule.name] = {
+            "violations": len(dangling),
+            "samples": [{"sourcedId": r.sourcedId, "missing": _missing_ids(r, rule, target_ids)}
+                        for r in dangling[:SAMPLE_SIZE]],
+        }
+    return {
+        "checkedAt": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+        "durationMs": round((time.perf_counter() - start) * 1000, 1),
+        "records": {t: len(getattr(data, t)) for t in ProcessedOneRosterData.model_fields},
+        "violations": sum(r["violations"] for r in rules.values()),
+        "rules": rules,
+    }
+
+
+class ReferenceValidator:
+    """
+    Validates published snapshots in a worker thread, off the sync path: a sync never waits for
+    it, and snapshots published while a check is running are coalesced into one check of the
+    newest. Keeps the report of the last snapshot checked.
+    """
+
+    def __init__(self):
+        self.report: Optional[Dict[str, Any]] = None
+        self._pending: Optional[Any] = None  # Newest SnapshotGeneration not checked yet
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+
+    def schedule(self, generation: Any) -> None:
+        if not VALIDATE_REFERENCES:
+            return
+        self._pending = generation
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while self._pending is not None:
+            generation, self._pending = self._pending, None
+            try:
+                report = await asyncio.to_thread(validate_references, generation.data)
+            except Exception as e:  # A broken check shouldn't take anything else down
+                print(f"Warning: Referential integrity check of generation {generation.token} failed: {e}")
+                continue
+            self.report = {"generation": generation.token, **report}
+            self.runs += 1
+            if report["violations"]:
+                failing = ", ".join(f"{name} ({r['violations']})" for name, r in report["rules"].items() if r["violations"])
+                print(f"Referential integrity: {report['violations']} dangling references in generation "
+                      f"{generation.token}: {failing}")
+
+    def get_report(self) -> Dict[str, Any]:
+        if self.report is None:
+            return {"enabled": VALIDATE_REFERENCES, "generation": None, "runs": self.runs}
+        return {"enabled": VALIDATE_REFERENCES, "runs": self.runs, **self.report}
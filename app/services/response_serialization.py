@@ -0,0 +1,33 @@
+# app/services/response_serialization.py
+import asyncio
+from typing import Any, List, Sequence
+from pydantic import BaseModel, TypeAdapter
+from app.models.oneroster_models import ProcessedOneRosterData
+
+# Records serialized per step before yielding to the event loop. Small enough that one step
+# takes about a millisecond, so point lookups interleave with a 100k record export.
+SERIALIZE_CHUNK_SIZE = 500
+
+_records_adapter = TypeAdapter(List[Any])  # Any: each model serializes with its own schema
+
+
+async def dump_records_json(records: Sequence[BaseModel]) -> bytes:
+    """
+    JSON array of already-validated snapshot records, built in chunks with an event loop yield
+    between them. Replaces FastAPI's response_model path, which re-validates every record and
+    then serializes the whole list in one go on the event loop.
+    """
+    parts: List[bytes] = []
+    for start in range(0, len(records), SERIALIZE_CHUNK_SIZE):
+        chunk = _records_adapter.dump_json(list(records[start:start + SERIALIZE_CHUNK_SIZE]))
+        parts.append(chunk[1:-1])  # Strip the chunk's own brackets
+        await asyncio.sleep(0)
+    return b"[" + b",".join(parts) + b"]"
+
+
+async def dump_processed_data_json(data: ProcessedOneRosterData) -> bytes:
+    """The full dataset as one JSON object, same shape as ProcessedOneRosterData, built chunk by chunk."""
+    parts: List[bytes] = []
+    for field_name in ProcessedOneRosterData.model_fields:
+        parts.append(b'"' + field_name.encode() + b'":' + await dump_records_json(getattr(data, field_name)))
+    return b"{" + b",".join(parts) + b"}"
@@ -0,0 +1,276 @@
+# app/services/search_index.py
+import os
+import re
+import time
+from array import array
+from bisect import bisect_left
+from itertools import chain, islice
+from operator import itemgetter
+from typing import Any, Container, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+from app.models.oneroster_models import ProcessedOneRosterData, StatusType
+
+# Fields searched per entity type, word by word: "smi" -> Smith, "alice.w" -> alice.w@example.edu
+# (alice AND w*), "math5a-0" -> MATH5A-001. Substring matches ("mit" -> Smith) need trigram
+# postings, which cost memory per distinct word, so they only cover names, titles and codes.
+SEARCH_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "users": ("givenName", "familyName", "username", "email", "identifier"),
+    "classes": ("title", "classCode"),
+    "courses": ("title", "courseCode"),
+}
+SUBSTRING_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "users": ("givenName", "familyName"),
+    "classes": ("title", "classCode"),
+    "courses": ("title", "courseCode"),
+}
+MIN_SUBSTRING_LENGTH = 3  # Shorter query words only match as prefixes
+# Records changed since the last full build of an index, matched one by one on every search until
+# the next build: bounds the extra work per search, and how often a full build runs while publishing
+SEARCH_OVERLAY_MAX_RECORDS = int(os.getenv("ONEROSTER_SEARCH_OVERLAY_MAX_RECORDS", "2048"))
+
+_WORD_RE = re.compile(r"[^\W_]+")  # Letters and digits, any script
+
+
+def _words(value: str) -> List[str]:
+    return _WORD_RE.findall(value.lower())
+
+
+def _trigrams(word: str) -> Set[str]:
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+def _matches(words: List[str], query_words: List[str]) -> bool:
+    # Every query word is a prefix of one of the words, or (long enough) a substring of one
+    return all(
+        any(w.startswith(q) or (len(q) >= MIN_SUBSTRING_LENGTH and q in w) for w in words) for q in query_words
+    )
+
+
+class SearchIndex:
+    """
+    Type-ahead index over one entity list of a snapshot: a sorted word list with postings
+    (record positions) for exact and prefix matches, and trigram -> word postings for
+    substring matches. Postings live in two flat arrays rather than a list per word, which
+    keeps a million users' index compact and out of the garbage collector's way.
+    Results are ranked exact word first, then prefix matches in word order (closest
+    completions first), then substring matches. Records with status=tobedeleted aren't indexed.
+    """
+
+    def __init__(self, records: Sequence[Any], fields: Tuple[str, ...], substring_fields: Tuple[str, ...]):
+        self.records = records
+        self._fields = fields
+        postings: Dict[str, List[int]] = {}
+        substring_words: Set[str] = set()
+        for position, record in enumerate(records):
+            if record.status == StatusType.TOBEDELETED:
+                continue
+            for field in fields:
+                value = getattr(record, field, None)
+                if not value:
+                    continue
+                words = _words(value)
+                for word in words:
+                    positions = postings.get(word)
+                    if positions is None:
+                        postings[word] = [position]
+                    elif positions[-1] != position:  # Same word twice in one record
+                        positions.append(position)
+                if field in substring_fields:
+                    substring_words.update(words)
+
+        self._words: List[str] = sorted(postings)
+        # Postings of word i are _positions[_offsets[i]:_offsets[i + 1]]
+        self._offsets = array("I", [0])
+        self._positions = array("I")
+        for word in self._words:
+            self._positions.extend(postings[word])
+            self._offsets.append(len(self._positions))
+        del postings
+        # trigram -> indexes into _words, ascending (so substring matches also come out in word order)
+        self._trigram_words: Dict[str, array] = {}
+        for word_index, word in enumerate(self._words):
+            if word in substring_words:
+                for gram in _trigrams(word):
+                    word_indexes = self._trigram_words.get(gram)
+                    if word_indexes is None:
+                        self._trigram_words[gram] = word_indexes = array("I")
+                    word_indexes.append(word_index)
+
+    def _prefix_range(self, prefix: str) -> Tuple[int, int]:
+        start = bisect_left(self._words, prefix)
+        # Every word starting with `prefix` sorts before prefix + U+FFFF
+        return start, bisect_left(self._words, prefix + "\uffff", start)
+
+    def _prefix_match_count(self, word: str) -> int:
+        # Records (postings) matching as a prefix: how selective a query word is
+        start, end = self._prefix_range(word)
+        return self._offsets[end] - self._offsets[start]
+
+    def _ranked_words(self, query_word: str) -> Iterator[int]:
+        """Word indexes matching `query_word`: exact, then prefix (in word order), then substring."""
+        start, end = self._prefix_range(query_word)
+        yield from range(start, end)  # An exact match sorts first in its prefix range
+        if len(query_word) >= MIN_SUBSTRING_LENGTH:
+            grams = _trigrams(query_word)
+            candidates = min((self._trigram_words.get(g, array("I")) for g in grams), key=len)
+            for word_index in candidates:
+                word = self._words[word_index]
+                if query_word in word and not word.startswith(query_word):
+                    yield word_index
+
+    def plan(self, query: str) -> List[str]:
+        """The words of `query`, most selective first: that one drives the walk over the postings."""
+        query_words = _words(query)
+        query_words.sort(key=self._prefix_match_count)
+        return query_words
+
+    def search(self, query: str, limit: int = 10, skip: Container[str] = ()) -> List[Any]:
+        """
+        Top `limit` records matching every word of `query` (the last one typically being
+        typed), leaving out the sourcedIds in `skip`. The most selective word drives the walk;
+        the others are checked per candidate.
+        """
+        query_words = self.plan(query)
+        if not query_words:
+            return []
+        driver, others = query_words[0], query_words[1:]
+        results: List[Any] = []
+        seen: Set[int] = set()
+        for word_index in self._ranked_words(driver):
+            for position in self._positions[self._offsets[word_index]:self._offsets[word_index + 1]]:
+                if position in seen:
+                    continue
+                seen.add(position)
+                record = self.records[position]
+                if (others and not _matches(self.record_words(record), others)) or record.sourcedId in skip:
+                    continue
+                results.append(record)
+                if len(results) >= limit:
+                    return results
+        return results
+
+    def record_words(self, record: Any) -> List[str]:
+        # Only candidates need them, so they're recomputed rather than stored
+        return [w for field in self._fields for w in _words(getattr(record, field, None) or "")]
+
+    def stats(self) -> Dict[str, int]:
+        return {"words": len(self._words), "trigrams": len(self._trigram_words), "postings": len(self._positions)}
+
+
+class SnapshotSearchIndex:
+    """
+    Search index of one snapshot's entity list: the SearchIndex of an earlier list (the last
+    full build) plus the records that changed since then, with a plain sorted word list of
+    their own. Each published snapshot only adds its own changes, so searches see a snapshot
+    as soon as it is published. The base is rebuilt once the changes outgrow SEARCH_OVERLAY_MAX_RECORDS.
+    """
+
+    def __init__(self, records: Sequence[Any], base: SearchIndex,
+                 changed: Optional[Dict[str, Optional[Tuple[Any, List[str]]]]] = None):
+        self.records = records  # The snapshot's list (not necessarily the one base was built from)
+        self.base = base
+        # sourcedId -> (current record, its words), or None once it's deleted
+        self.changed: Dict[str, Optional[Tuple[Any, List[str]]]] = changed or {}
+        # Distinct words of the changed records, sorted, with the records (as (record, words)) having them
+        postings: Dict[str, List[Tuple[Any, List[str]]]] = {}
+        for entry in filter(None, self.changed.values()):
+            for word in set(entry[1]):
+                postings.setdefault(word, []).append(entry)
+        self._changed_words = sorted(postings)
+        self._changed_postings = [postings[word] for word in self._changed_words]
+
+    def with_changes(self, records: Sequence[Any], changed_records: Iterable[Tuple[str, Any]]) -> "SnapshotSearchIndex":
+        """The index of the next snapshot's list, given its (sourcedId, record or None) changes."""
+        changed = dict(self.changed)
+        for sourced_id, record in changed_records:
+            live = record is not None and record.status != StatusType.TOBEDELETED
+            changed[sourced_id] = (record, self.base.record_words(record)) if live else None
+        return SnapshotSearchIndex(records, self.base, changed)
+
+    def search(self, query: str, limit: int = 10) -> List[Any]:
+        query_words = self.base.plan(query)
+        if not query_words:
+            return []
+        results = self.base.search(query, limit, skip=self.changed)
+        if not self.changed:
+            return results
+        # Ranked the way the base walks its words: prefix matches before substring matches, then by the word
+        driver = query_words[0]
+        ranked = [(_rank(self.base.record_words(r), driver), r) for r in results]
+        # Candidates come in rank order, so the first `limit` matches are the best ones
+        matches = ((record, words) for record, words in self._changed_candidates(driver) if _matches(words, query_words))
+        ranked += [(_rank(words, driver), record) for record, words in islice(matches, limit)]
+        ranked.sort(key=itemgetter(0))
+        return [record for _, record in ranked[:limit]]
+
+    def _changed_candidates(self, driver: str) -> Iterator[Tuple[Any, List[str]]]:
+        # Changed records with a word matching `driver`, ranked like the base walks its words: the
+        # prefix range, then a scan of the (at most a few thousand) other words for substrings
+        words = self._changed_words
+        start = bisect_left(words, driver)
+        end = bisect_left(words, driver + "\uffff", start)
+        indexes: Iterable[int] = range(start, end)
+        if len(driver) >= MIN_SUBSTRING_LENGTH:
+            indexes = chain(indexes, (i for i, word in enumerate(words) if driver in word and not start <= i < end))
+        seen: Set[str] = set()
+        for i in indexes:
+            for entry in self._changed_postings[i]:
+                if entry[0].sourcedId not in seen:
+                    seen.add(entry[0].sourcedId)
+                    yield entry
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.base.stats(), "changedSinceBuild": len(self.changed)}
+
+
+def _rank(words: List[str], driver: str) -> Tuple[int, str]:
+    return min((0, w) if w.startswith(driver) else (1, w) for w in words if driver in w)
+
+
+class SearchIndexer:
+    """
+    Builds the search indexes of each snapshot as it's published (in the publish worker thread).
+    Entity lists the snapshot shares with the previous one keep their index; changed lists get
+    the previous index plus the snapshot's changed records, and a full build once those add up
+    to more than SEARCH_OVERLAY_MAX_RECORDS. A full build of a million users takes seconds, an
+    update about as long as hashing the changed records' words.
+    """
+
+    def __init__(self, overlay_max_records: int = SEARCH_OVERLAY_MAX_RECORDS):
+        self.overlay_max_records = overlay_max_records
+        self.builds = 0
+        self.last_build_seconds = 0.0
+
+    def update(self, data: ProcessedOneRosterData, changes: Iterable[Tuple[str, Any, str, Any]],
+               previous: Optional[Dict[str, SnapshotSearchIndex]]) -> Dict[str, SnapshotSearchIndex]:
+        """
+        The indexes of `data`, from the previous snapshot's indexes and the record changes
+        between the two ((entity type, operation, sourcedId, record) as the stamping reports
+        them). Without previous indexes everything is built from scratch.
+        """
+        changed_by_type: Dict[str, List[Tuple[str, Any]]] = {entity_type: [] for entity_type in SEARCH_FIELDS}
+        for entity_type, _, sourced_id, record in changes:
+            if entity_type in changed_by_type:
+                changed_by_type[entity_type].append((sourced_id, record))
+        indexes: Dict[str, SnapshotSearchIndex] = {}
+        for entity_type, fields in SEARCH_FIELDS.items():
+            records = getattr(data, entity_type)
+            index = previous.get(entity_type) if previous else None
+            changed = changed_by_type[entity_type]
+            if index is not None and index.records is records:
+                indexes[entity_type] = index
+            elif index is not None and len(index.changed) + len(changed) <= self.overlay_max_records:
+                indexes[entity_type] = index.with_changes(records, changed)
+            else:
+                start = time.perf_counter()
+                indexes[entity_type] = SnapshotSearchIndex(
+                    records, SearchIndex(records, fields, SUBSTRING_FIELDS[entity_type]))
+                self.builds += 1
+                self.last_build_seconds = time.perf_counter() - start
+        return indexes
+
+    def stats(self, indexes: Optional[Dict[str, SnapshotSearchIndex]]) -> Dict[str, Any]:
+        return {
+            "builds": self.builds, "lastBuildSeconds": round(self.last_build_seconds, 3),
+            "overlayMaxRecords": self.overlay_max_records,
+            "indexes": {t: index.stats() for t, index in (indexes or {}).items()},
+        }
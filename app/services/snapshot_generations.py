@@ -0,0 +1,229 @@
+# app/services/snapshot_generations.py
+import os
+import secrets
+import sys
+import time
+from collections import Counter, OrderedDict
+from itertools import compress, count
+from operator import is_not
+from typing import Any, Dict, List, Optional, Set, Tuple
+from app.models.oneroster_models import ProcessedOneRosterData
+from app.services.record_versions import ENTITY_TYPES
+from app.services.snapshot_indexes import SnapshotIndexes
+
+# Older snapshots kept alive for clients that are paging through them
+MAX_RETAINED_GENERATIONS = int(os.getenv("ONEROSTER_MAX_RETAINED_GENERATIONS", "8"))
+GENERATION_MEMORY_BUDGET_BYTES = int(os.getenv("ONEROSTER_GENERATION_MEMORY_BUDGET_MB", "256")) * 1024 * 1024
+GENERATION_IDLE_TTL_SECONDS = float(os.getenv("ONEROSTER_GENERATION_IDLE_TTL_SECONDS", "300"))
+_SIZE_SAMPLE = 20  # Records per entity type measured to estimate the average record size
+_WALK_BLOCK = 1024  # Records compared at a time while two snapshots' lists line up
+_WALK_MAX_CHANGED = 1 / 16  # Share of changed records past which one pass over the new list is cheaper
+
+# Response header naming the generation a response was read from. Clients walking offset pages
+# pass it back as ?generation= to keep reading the same snapshot.
+GENERATION_HEADER = "X-OneRoster-Generation"
+
+# Tokens from a previous process must not resolve to whatever got the same number after a restart
+_BOOT_ID = secrets.token_hex(4)
+
+
+class GenerationExpiredError(LookupError):
+    """The generation token refers to a snapshot that is no longer retained."""
+
+
+class InvalidGenerationTokenError(ValueError):
+    """The generation token is malformed or was issued by another server process."""
+
+
+def _approx_record_bytes(record: Any) -> int:
+    # Shallow sizes of the model, its field dict and the field values (plus one level of metadata)
+    size = sys.getsizeof(record) + sys.getsizeof(record.__dict__)
+    for value in record.__dict__.values():
+        size += sys.getsizeof(value)
+        if isinstance(value, dict):
+            size += sum(sys.getsizeof(v) for v in value.values())
+    return size
+
+
+def _list_delta(old: List[Any], new: List[Any]) -> Optional[Tuple[Set[int], Set[int]]]:
+    """
+    The ids of records only in `old` and of records only in `new`, found by walking both lists in
+    step: consecutive snapshots share most records in the same order, and runs of shared records
+    are skipped a block at a time. None once too many records differ (e.g. a refetched source list).
+    """
+    budget = max(len(old), len(new)) * _WALK_MAX_CHANGED
+    departed: Set[int] = set()
+    arrived: Set[int] = set()
+    i = j = 0
+    while i < len(old) and j < len(new):
+        a, b = old[i], new[j]
+        if a is b:
+            n = min(_WALK_BLOCK, len(old) - i, len(new) - j)
+            shared = next(compress(count(), map(is_not, old[i:i + n], new[j:j + n])), n)
+            i, j = i + shared, j + shared
+        elif id(a) in arrived:  # Moved towards the start of the list
+            arrived.remove(id(a))
+            i += 1
+        elif id(b) in departed:  # Moved towards the end
+            departed.remove(id(b))
+            j += 1
+        else:
+            departed.add(id(a))
+            arrived.add(id(b))
+            i, j = i + 1, j + 1
+            if len(departed) > budget:
+                return None
+    departed.update(id(a) for a in old[i:])
+    arrived.update(id(b) for b in new[j:])
+    return departed - arrived, arrived - departed
+
+
+class SnapshotGeneration:
+    """One immutable published snapshot, addressable by its generation token."""
+
+    def __init__(self, number: int, data: ProcessedOneRosterData, indexes: Optional[SnapshotIndexes] = None):
+        self.number = number
+        self.token = f"{_BOOT_ID}-{number}"
+        self.data = data
+        self.created_at = time.time()
+        self.last_used = time.monotonic()
+        self.used = False  # Only generations a client has been handed a token for are worth retaining
+        self.unique_records: Dict[str, int] = {}  # entity type -> records no longer in the current snapshot
+        self._indexes = indexes
+
+    @property
+    def indexes(self) -> SnapshotIndexes:
+        if self._indexes is None:
+            self._indexes = SnapshotIndexes(self.data)
+        return self._indexes
+
+    def touch(self) -> None:
+        self.used = True
+        self.last_used = time.monotonic()
+
+    def record_count(self) -> int:
+        return sum(len(getattr(self.data, entity_type)) for entity_type in ENTITY_TYPES)
+
+
+class GenerationStore:
+    """
+    Numbers every published snapshot and keeps recently used older ones alive, so a client
+    walking offset pages can stay on the snapshot it started with. Retention is bounded by
+    count, idle time and an estimated memory budget; least recently used generations go first.
+    Unchanged records are the same objects across generations, so an old generation only
+    costs the records that changed since.
+    """
+
+    def __init__(self, max_retained: int = MAX_RETAINED_GENERATIONS,
+                 memory_budget_bytes: int = GENERATION_MEMORY_BUDGET_BYTES,
+                 idle_ttl_seconds: float = GENERATION_IDLE_TTL_SECONDS):
+        self.max_retained = max_retained
+        self.memory_budget_bytes = memory_budget_bytes
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self._generations: "OrderedDict[int, SnapshotGeneration]" = OrderedDict()  # Oldest first
+        self._current: Optional[SnapshotGeneration] = None
+        self._next_number = 1
+        self._record_bytes: Dict[str, int] = {}  # entity type -> average estimated bytes per record
+        self._first_seen: Dict[str, Dict[int, int]] = {}  # entity type -> id(record) -> generation it appeared in
+        self.evicted = 0
+        self.expired_lookups = 0
+
+    @property
+    def current(self) -> Optional[SnapshotGeneration]:
+        return self._current
+
+    def publish(self, data: ProcessedOneRosterData, indexes: Optional[SnapshotIndexes] = None) -> SnapshotGeneration:
+        generation = SnapshotGeneration(self._next_number, data, indexes)
+        self._next_number += 1
+        self._count_departed_records(generation)
+        self._generations[generation.number] = generation
+        self._current = generation
+        self._estimate_record_bytes(data)
+        self._evict()
+        return generation
+
+    def resolve(self, token: str) -> SnapshotGeneration:
+        """Returns the generation for a token, or raises InvalidGenerationTokenError / GenerationExpiredError."""
+        boot_id, _, number = token.partition("-")
+        if boot_id != _BOOT_ID or not number.isdigit():
+            raise InvalidGenerationTokenError(f"Unknown generation token '{token}'")
+        generation = self._generations.get(int(number))
+        if generation is None:
+            self.expired_lookups += 1
+            raise GenerationExpiredError(
+                f"Snapshot generation {number} has expired; restart the export without a generation token"
+            )
+        generation.touch()
+        return generation
+
+    def _estimate_record_bytes(self, data: ProcessedOneRosterData) -> None:
+        for entity_type in ENTITY_TYPES:
+            records = getattr(data, entity_type)
+            if records:
+                step = max(1, len(records) // _SIZE_SAMPLE)
+                sample = records[::step][:_SIZE_SAMPLE]
+                self._record_bytes[entity_type] = sum(_approx_record_bytes(r) for r in sample) // len(sample)
+
+    def _count_departed_records(self, incoming: SnapshotGeneration) -> None:
+        # Records of the outgoing snapshot that the incoming one no longer holds now cost memory only in
+        # the retained generations that hold them: every one from where the record appeared onwards.
+        previous = self._current
+        for entity_type in ENTITY_TYPES:
+            records = getattr(incoming.data, entity_type)
+            if previous is not None and records is getattr(previous.data, entity_type):
+                continue  # Same list, same records
+            first_seen = self._first_seen.setdefault(entity_type, {})
+            delta = _list_delta(getattr(previous.data, entity_type) if previous is not None else [], records)
+            if delta is None:
+                self._first_seen[entity_type] = {id(r): first_seen.pop(id(r), incoming.number) for r in records}
+                departed = Counter(first_seen.values())  # Generation the record appeared in -> records
+            else:
+                departed_ids, arrived_ids = delta
+                departed = Counter(first_seen.pop(i) for i in departed_ids)
+                first_seen.update(dict.fromkeys(arrived_ids, incoming.number))
+            for generation in self._generations.values():
+                count = sum(n for number, n in departed.items() if number <= generation.number)
+                if count:
+                    generation.unique_records[entity_type] = generation.unique_records.get(entity_type, 0) + count
+
+    def _unique_bytes(self, generation: SnapshotGeneration) -> int:
+        """Estimated memory only this generation keeps alive (not shared with the current snapshot)."""
+        return sum(count * self._record_bytes.get(entity_type, 0)
+                   for entity_type, count in generation.unique_records.items())
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        for number, generation in list(self._generations.items()):
+            if generation is self._current:
+                continue
+            if not generation.used or now - generation.last_used > self.idle_ttl_seconds:
+                # Never handed out (e.g. a quick burst of change batches), or nobody paged it for a while
+                del self._generations[number]
+                self.evicted += 1
+
+        # Least recently used first, until within count and memory limits
+        retained = sorted((g for g in self._generations.values() if g is not self._current), key=lambda g: g.last_used)
+        retained_bytes = sum(self._unique_bytes(g) for g in retained)
+        while retained and (len(retained) > self.max_retained or retained_bytes > self.memory_budget_bytes):
+            generation = retained.pop(0)
+            retained_bytes -= self._unique_bytes(generation)
+            del self._generations[generation.number]
+            self.evicted += 1
+
+    def stats(self) -> Dict[str, Any]:
+        retained = [g for g in self._generations.values() if g is not self._current]
+        return {
+            "currentGeneration": self._current.token if self._current else None,
+            "retainedGenerations": [
+                {
+                    "generation": g.token, "createdAt": g.created_at, "idleSeconds": round(time.monotonic() - g.last_used, 1),
+                    "records": g.record_count(), "estimatedUniqueBytes": self._unique_bytes(g),
+                }
+                for g in retained
+            ],
+            "retainedBytes": sum(self._unique_bytes(g) for g in retained),
+            "memoryBudgetBytes": self.memory_budget_bytes,
+            "maxRetainedGenerations": self.max_retained,
+            "evictedGenerations": self.evicted,
+            "expiredTokenLookups": self.expired_lookups,
+        }
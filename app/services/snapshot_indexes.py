@@ -0,0 +1,233 @@
+# app/services/snapshot_indexes.py
+from bisect import bisect_left, bisect_right
+from datetime import date
+from operator import attrgetter, itemgetter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from app.models.oneroster_models import ProcessedOneRosterData
+from app.services.record_versions import ENTITY_TYPES
+
+# Day bounds for intervals with a missing (or unparseable) start or end date
+OPEN_START = "0000-01-01"
+OPEN_END = "9999-12-31"
+ACTIVE_ON_TYPES = ("academicSessions", "classes", "enrollments")  # Entity types with a date interval
+_ACTIVE_ON_CACHE_SIZE = 32  # activeOn results kept per snapshot, so paging doesn't redo the lookup
+
+Interval = Tuple[str, str]  # Closed [start, end] as YYYY-MM-DD strings (compare like dates)
+
+
+def _iso_day(value: Optional[str], default: str) -> str:
+    # The date part of an ISO date or datetime; a missing or malformed date leaves that end open
+    if not value:
+        return default
+    day = value[:10]
+    try:
+        date.fromisoformat(day)
+    except ValueError:
+        return default
+    return day
+
+
+def _span(intervals: Iterable[Interval]) -> Interval:
+    # Earliest start to latest end; open if there's nothing to go on
+    intervals = list(intervals)
+    if not intervals:
+        return OPEN_START, OPEN_END
+    return min(i[0] for i in intervals), max(i[1] for i in intervals)
+
+
+class IntervalIndex:
+    """
+    Centered interval tree answering "which intervals contain day X" in O(log n + k).
+    Records that share an interval (every enrollment of a term, say) are grouped, so the
+    tree only holds the distinct intervals and n is usually tiny.
+    """
+
+    def __init__(self, groups: Dict[Interval, List[int]]):
+        self._groups = groups  # interval -> positions of the records with that interval
+        self._root = self._build(list(groups))
+
+    def _build(self, intervals: List[Interval]):
+        if not intervals:
+            return None
+        points = sorted({point for interval in intervals for point in interval})
+        center = points[len(points) // 2]
+        left, right, overlapping = [], [], []
+        for interval in intervals:
+            if interval[1] < center:
+                left.append(interval)
+            elif interval[0] > center:
+                right.append(interval)
+            else:
+                overlapping.append(interval)
+        # (center, overlapping by start ascending, overlapping by end descending, left, right)
+        return (center, sorted(overlapping), sorted(overlapping, key=itemgetter(1), reverse=True),
+                self._build(left), self._build(right))
+
+    def stab(self, day: str) -> List[int]:
+        """Positions of the records whose interval contains `day`, in no particular order."""
+        positions: List[int] = []
+        node = self._root
+        while node is not None:
+            center, by_start, by_end, left, right = node
+            if day < center:
+                for interval in by_start:
+                    if interval[0] > day:
+                        break
+                    positions.extend(self._groups[interval])
+                node = left
+            elif day > center:
+                for interval in by_end:
+                    if interval[1] < day:
+                        break
+                    positions.extend(self._groups[interval])
+                node = right
+            else:
+                for interval in by_start:
+                    positions.extend(self._groups[interval])
+                break
+        return positions
+
+
+class SnapshotIndexes:
+    """
+    Lookup structures over one immutable snapshot. The sourcedId indexes and the common
+    groupings are built before the snapshot is published (see prebuild); the rest lazily on
+    first use. All of them are thrown away together with the snapshot they belong to.
+    """
+
+    def __init__(self, data: ProcessedOneRosterData):
+        self.data = data
+        # entity type -> (sorted dateLastModified stamps, records in the same order)
+        self._by_modified: Dict[str, Tuple[List[str], List[Any]]] = {}
+        self._by_interval: Dict[str, IntervalIndex] = {}
+        self._active_on_results: Dict[Tuple[str, str], List[Any]] = {}
+        self._session_intervals: Optional[Dict[str, Interval]] = None
+        self._class_intervals: Optional[Dict[str, Interval]] = None
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._grouped: Dict[Tuple[str, str], Dict[str, List[Any]]] = {}
+        # entity type -> type-ahead index (search_index.SnapshotSearchIndex), set when publishing
+        self.search: Optional[Dict[str, Any]] = None
+
+    def prebuild(self, groupings: Iterable[Tuple[str, str]], previous: Optional["SnapshotIndexes"] = None
+                 ) -> "SnapshotIndexes":
+        """
+        Builds the sourcedId index of every entity type and the given (entity type, field)
+        groupings. Indexes of the previous snapshot over a list this one shares are reused.
+        """
+        def shared(entity_type: str) -> bool:
+            return previous is not None and getattr(previous.data, entity_type) is getattr(self.data, entity_type)
+
+        for entity_type in ENTITY_TYPES:
+            if shared(entity_type) and entity_type in previous._by_id:
+                self._by_id[entity_type] = previous._by_id[entity_type]
+            else:
+                self.by_id(entity_type)
+        for key in groupings:
+            if shared(key[0]) and key in previous._grouped:
+                self._grouped[key] = previous._grouped[key]
+            else:
+                self.grouped_by(*key)
+        return self
+
+    def _modified_index(self, entity_type: str) -> Tuple[List[str], List[Any]]:
+        if entity_type not in self._by_modified:
+            ordered = sorted(getattr(self.data, entity_type), key=attrgetter("dateLastModified"))
+            self._by_modified[entity_type] = ([r.dateLastModified for r in ordered], ordered)
+        return self._by_modified[entity_type]
+
+    def modified_since(self, entity_type: str, since: str, inclusive: bool = False) -> List[Any]:
+        """
+        Records of `entity_type` with dateLastModified after `since` (a normalized stamp),
+        oldest change first. O(log n + k) once the index exists.
+        """
+        stamps, records = self._modified_index(entity_type)
+        start = bisect_left(stamps, since) if inclusive else bisect_right(stamps, since)
+        return records[start:]
+
+    def newest_modified(self, entity_type: str) -> List[Any]:
+        """Records of `entity_type` carrying the newest dateLastModified stamp (several can share one)."""
+        stamps, records = self._modified_index(entity_type)
+        return records[bisect_left(stamps, stamps[-1]):] if stamps else []
+
+    # --- Date intervals ---
+    # Sessions run startDate..endDate. A class runs over the span of its terms. An enrollment
+    # runs beginDate..endDate, and any missing end falls back to its class (the usual case:
+    # enrollments only carry dates when they differ from the term).
+
+    def _sessions(self) -> Dict[str, Interval]:
+        if self._session_intervals is None:
+            self._session_intervals = {
+                s.sourcedId: (_iso_day(s.startDate, OPEN_START), _iso_day(s.endDate, OPEN_END))
+                for s in self.data.academicSessions
+            }
+        return self._session_intervals
+
+    def _classes(self) -> Dict[str, Interval]:
+        if self._class_intervals is None:
+            sessions = self._sessions()
+            self._class_intervals = {
+                c.sourcedId: _span(sessions[t] for t in c.termSourcedIds if t in sessions)
+                for c in self.data.classes
+            }
+        return self._class_intervals
+
+    def _record_intervals(self, entity_type: str) -> Iterable[Interval]:
+        if entity_type == "academicSessions":
+            sessions = self._sessions()
+            return (sessions[s.sourcedId] for s in self.data.academicSessions)
+        classes = self._classes()
+        if entity_type == "classes":
+            return (classes[c.sourcedId] for c in self.data.classes)
+        if entity_type == "enrollments":
+            def enrollment_interval(e) -> Interval:
+                class_start, class_end = classes.get(e.classSourcedId, (OPEN_START, OPEN_END))
+                return _iso_day(e.beginDate, class_start), _iso_day(e.endDate, class_end)
+            return (enrollment_interval(e) for e in self.data.enrollments)
+        raise ValueError(f"activeOn is not supported for {entity_type} (only {', '.join(ACTIVE_ON_TYPES)})")
+
+    def _interval_index(self, entity_type: str) -> IntervalIndex:
+        if entity_type not in self._by_interval:
+            groups: Dict[Interval, List[int]] = {}
+            for position, interval in enumerate(self._record_intervals(entity_type)):
+                groups.setdefault(interval, []).append(position)
+            self._by_interval[entity_type] = IntervalIndex(groups)
+        return self._by_interval[entity_type]
+
+    def active_on(self, entity_type: str, day: date) -> List[Any]:
+        """Records of `entity_type` whose date interval contains `day`, in snapshot order."""
+        key = (entity_type, day.isoformat())
+        records = self._active_on_results.get(key)
+        if records is None:
+            positions = sorted(self._interval_index(entity_type).stab(key[1]))
+            all_records = getattr(self.data, entity_type)
+            records = [all_records[p] for p in positions]
+            if len(self._active_on_results) >= _ACTIVE_ON_CACHE_SIZE:
+                del self._active_on_results[next(iter(self._active_on_results))]
+            self._active_on_results[key] = records
+        return records
+
+    def by_id(self, entity_type: str) -> Dict[str, Any]:
+        """sourcedId -> record for `entity_type`."""
+        if entity_type not in self._by_id:
+            self._by_id[entity_type] = {r.sourcedId: r for r in getattr(self.data, entity_type)}
+        return self._by_id[entity_type]
+
+    def grouped_by(self, entity_type: str, field: str) -> Dict[str, List[Any]]:
+        """
+        Records of `entity_type` grouped by a reference field (each element, for list fields
+        like termSourcedIds), in snapshot order: the reverse of that reference.
+        """
+        key = (entity_type, field)
+        if key not in self._grouped:
+            groups: Dict[str, List[Any]] = {}
+            for r in getattr(self.data, entity_type):
+                value = getattr(r, field)
+                for ref in (value if isinstance(value, list) else (value,)):
+                    if ref is not None:
+                        groups.setdefault(ref, []).append(r)
+            self._grouped[key] = groups
+        return self._grouped[key]
+
+    def classes_for_term(self, term_sourced_id: str) -> List[Any]:
+        """Classes that list the academic session in termSourcedIds, in snapshot order."""
+        return self.grouped_by("classes", "termSourcedIds").get(term_sourced_id, [])
@@ -0,0 +1,55 @@
+# app/services/snapshot_store.py
+import os
+import pickle
+import time
+from typing import Any, Dict, Optional, Tuple
+from app.models.oneroster_models import ProcessedOneRosterData
+
+# Where the last completed snapshot is persisted between restarts.
+# Pickle is used because it loads the already-validated models straight back
+# without another pydantic validation pass, which keeps cold start fast.
+SNAPSHOT_PATH = os.getenv("ONEROSTER_SNAPSHOT_PATH", os.path.join("data", "oneroster_snapshot.pkl"))
+SNAPSHOT_FORMAT_VERSION = 2  # Bump when the models change in a way old pickles can't load
+
+
+def save_snapshot(
+        data: ProcessedOneRosterData, built_at: float, record_versions: Dict[str, Any], path: str = SNAPSHOT_PATH
+) -> None:
+    """
+    Persists a completed snapshot, together with its record versions (content hashes and
+    dateLastModified stamps), to disk. Writes to a temp file first and then renames it,
+    so a crash mid-write never leaves a half-written snapshot behind.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    payload = {
+        "version": SNAPSHOT_FORMAT_VERSION, "built_at": built_at, "data": data, "record_versions": record_versions,
+    }
+    with open(tmp_path, "wb") as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path: str = SNAPSHOT_PATH) -> Optional[Tuple[ProcessedOneRosterData, float, Dict[str, Any]]]:
+    """
+    Loads the last persisted snapshot. Returns (data, built_at, record_versions) or None if there is
+    no usable snapshot (missing file, old format, or unreadable pickle).
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            payload = pickle.load(f)
+    except Exception as e:  # Corrupt/incompatible snapshot: just fall back to a fresh sync
+        print(f"Warning: Could not load OneRoster snapshot from {path}: {e}")
+        return None
+    if not isinstance(payload, dict) or payload.get("version") != SNAPSHOT_FORMAT_VERSION:
+        print(f"Warning: Ignoring OneRoster snapshot at {path} with unsupported format.")
+        return None
+    return payload["data"], payload["built_at"], payload["record_versions"]
+
+
+def snapshot_age_seconds(built_at: float) -> float:
+    return max(0.0, time.time() - built_at)
@@ -0,0 +1,134 @@
+# app/services/sync_scheduler.py
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+from app.models.sync_models import SyncJobStatus
+
+SYNC_JITTER_SECONDS = float(os.getenv("ONEROSTER_SYNC_JITTER_SECONDS", "5"))  # Spreads jobs so they don't fire together
+SYNC_MAX_CONCURRENCY = int(os.getenv("ONEROSTER_SYNC_MAX_CONCURRENCY", "2"))
+SYNC_RETRY_DELAY_SECONDS = float(os.getenv("ONEROSTER_SYNC_RETRY_DELAY_SECONDS", "2"))  # First retry after a failed run
+
+
+def _iso(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat() if timestamp else None
+
+
+class SyncJob:
+    def __init__(self, name: str, run: Callable[[], Awaitable[object]], interval_seconds: float,
+                 run_at_start: bool = True):
+        self.name = name
+        self.run = run
+        self.interval_seconds = interval_seconds
+        self.run_at_start = run_at_start
+        self.running = False
+        self.run_count = 0
+        self.failure_count = 0
+        self.consecutive_failures = 0
+        self.last_started_at: Optional[float] = None
+        self.last_finished_at: Optional[float] = None
+        self.last_duration_ms: Optional[float] = None
+        self.last_outcome: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self.next_run_at: Optional[float] = None
+
+    def status(self) -> SyncJobStatus:
+        return SyncJobStatus(
+            name=self.name,
+            intervalSeconds=self.interval_seconds,
+            running=self.running,
+            runCount=self.run_count,
+            failureCount=self.failure_count,
+            lastStartedAt=_iso(self.last_started_at),
+            lastFinishedAt=_iso(self.last_finished_at),
+            lastDurationMs=self.last_duration_ms,
+            lastOutcome=self.last_outcome,
+            lastError=self.last_error,
+            nextRunAt=_iso(self.next_run_at),
+        )
+
+
+class SyncScheduler:
+    """
+    In-process scheduler for source sync jobs. Each job runs on its own interval (plus jitter),
+    never overlaps with itself, and at most `max_concurrency` jobs run at the same time.
+    """
+
+    def __init__(self, max_concurrency: int = SYNC_MAX_CONCURRENCY):
+        self._jobs: Dict[str, SyncJob] = {}
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: List[asyncio.Task] = []
+        self._triggered: Set[asyncio.Task] = set()  # Manual runs; the loop only keeps weak references to tasks
+
+    def add_job(self, name: str, run: Callable[[], Awaitable[object]], interval_seconds: float,
+                run_at_start: bool = True) -> None:
+        """Registers a job. Without run_at_start its first run is one interval after start()."""
+        self._jobs[name] = SyncJob(name, run, interval_seconds, run_at_start)
+
+    def get_job(self, name: str) -> Optional[SyncJob]:
+        return self._jobs.get(name)
+
+    def statuses(self) -> List[SyncJobStatus]:
+        return [job.status() for job in self._jobs.values()]
+
+    async def run_job(self, name: str) -> bool:
+        """
+        Runs a job now. Returns False without running it if it's already running (overlap protection).
+        """
+        job = self._jobs[name]
+        if job.running:
+            return False
+        job.running = True  # Claimed before waiting for a slot, so a queued run also counts as running
+        try:
+            async with self._semaphore:
+                job.last_started_at = time.time()
+                start = time.perf_counter()
+                try:
+                    await job.run()
+                    job.last_outcome, job.last_error = "success", None
+                    job.consecutive_failures = 0
+                except Exception as e:
+                    job.last_outcome, job.last_error = "failed", str(e)
+                    job.failure_count += 1
+                    job.consecutive_failures += 1
+                    print(f"Warning: Sync job '{name}' failed: {e}")
+                job.run_count += 1
+                job.last_duration_ms = (time.perf_counter() - start) * 1000
+                job.last_finished_at = time.time()
+        finally:
+            job.running = False
+        return True
+
+    def trigger(self, name: str) -> bool:
+        """Starts a job in the background right away. Returns False if it's already running."""
+        if self._jobs[name].running:
+            return False
+        task = asyncio.create_task(self.run_job(name))
+        self._triggered.add(task)
+        task.add_done_callback(self._triggered.discard)
+        return True
+
+    async def _job_loop(self, job: SyncJob) -> None:
+        delay = 0.0 if job.run_at_start else job.interval_seconds + random.uniform(0, SYNC_JITTER_SECONDS)
+        while True:
+            job.next_run_at = time.time() + delay
+            await asyncio.sleep(delay)
+            await self.run_job(job.name)
+            if job.consecutive_failures:
+                # Back off from a short retry delay up to the regular interval
+                delay = min(job.interval_seconds, SYNC_RETRY_DELAY_SECONDS * 2 ** (job.consecutive_failures - 1))
+            else:
+                delay = job.interval_seconds + random.uniform(0, SYNC_JITTER_SECONDS)
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._job_loop(job)) for job in self._jobs.values()]
+
+    def stop(self) -> None:
+        for task in self._tasks + list(self._triggered):
+            task.cancel()
+        self._tasks = []
+
+
+scheduler = SyncScheduler()
@@ -0,0 +1,165 @@
+"""
+Gradebook ingest throughput (results/second) and read latency.
+
+Ingest is measured per stage for bulk requests of --batch results: JSON validation, append
+to the result log, then the whole HTTP path (bulk POST through the gradebook router over an
+ASGI transport, no sockets). "re-upsert" replaces every result once, which is what a
+regrade of a whole term looks like to the append-only log (dead rows plus compaction).
+Reads are one page (limit 100) of /lineItems/{id}/results and /students/{id}/results,
+straight from the service and over HTTP.
+
+Run from the repo root:
+    python -m benchmarks.bench_gradebook --classes 500 --students-per-class 30 --line-items-per-class 40
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+import httpx
+from fastapi import FastAPI
+from app.models.gradebook_models import Category, LineItem, Result
+from app.routers import gradebook_router
+from app.services import gradebook_service, oauth
+
+
+def make_gradebook(classes: int, students_per_class: int, line_items_per_class: int
+                   ) -> Tuple[List[Dict], List[Dict], List[Dict], List[str]]:
+    categories = [{"sourcedId": "cat_homework", "title": "Homework"}, {"sourcedId": "cat_exam", "title": "Exams"}]
+    line_items, results = [], []
+    student_pool = max(students_per_class, classes * students_per_class // 4)  # Each student takes ~4 classes
+    for c in range(classes):
+        students = [f"student_{(c * 7 + s) % student_pool}" for s in range(students_per_class)]
+        for n in range(line_items_per_class):
+            line_item_id = f"li_{c}_{n}"
+            line_items.append({
+                "sourcedId": line_item_id, "title": f"Assignment {n}", "assignDate": "2024-09-01",
+                "dueDate": "2024-09-08", "classSourcedId": f"class_{c}", "categorySourcedId": categories[n % 2]["sourcedId"],
+                "resultValueMin": 0, "resultValueMax": 100,
+            })
+            for student in students:
+                results.append({
+                    "sourcedId": f"res_{line_item_id}_{student}", "lineItemSourcedId": line_item_id,
+                    "studentSourcedId": student, "scoreStatus": "fully graded", "score": float(n % 100),
+                    "scoreDate": "2024-09-10", "dateLastModified": "2024-09-10T12:00:00Z",
+                })
+    student_ids = sorted({r["studentSourcedId"] for r in results})
+    return categories, line_items, results, student_ids
+
+
+def reset_store() -> None:
+    gradebook_service._categories.clear()
+    gradebook_service._line_items.clear()
+    gradebook_service._line_items_by_class.clear()
+    gradebook_service._results = gradebook_service.ResultLog()
+
+
+def batches(records: List[Dict], size: int) -> List[bytes]:
+    return [json.dumps(records[i:i + size]).encode() for i in range(0, len(records), size)]
+
+
+def timed(fn: Callable[[], Any]) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+async def latencies_ms(call: Callable[[str], Awaitable[Any]], keys: List[str], samples: int) -> Tuple[float, float]:
+    timings = []
+    for key in random.choices(keys, k=samples):
+        start = time.perf_counter()
+        await call(key)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+async def run(args: argparse.Namespace) -> None:
+    oauth.OAUTH_ENABLED = False  # Gradebook cost only; bench_oauth measures the bearer token check
+    categories, line_items, results, student_ids = make_gradebook(
+        args.classes, args.students_per_class, args.line_items_per_class)
+    bodies = batches(results, args.batch)
+    adapter = gradebook_router._bulk_adapters[Result]
+
+    # --- Service level: validate, then append ---
+    reset_store()
+    await gradebook_service.upsert_categories(gradebook_router._bulk_adapters[Category].validate_json(json.dumps(categories)))
+    for body in batches(line_items, args.batch):
+        await gradebook_service.upsert_line_items(gradebook_router._bulk_adapters[LineItem].validate_json(body))
+    validated, validate_s = timed(lambda: [adapter.validate_json(body) for body in bodies])
+    start = time.perf_counter()
+    for batch in validated:
+        await gradebook_service.upsert_results(batch)
+    append_s = time.perf_counter() - start
+    start = time.perf_counter()
+    for batch in validated:  # Same sourcedIds again: every row is replaced
+        await gradebook_service.upsert_results(batch)
+    reupsert_s = time.perf_counter() - start
+    stats = gradebook_service.get_gradebook_stats()["resultLog"]
+
+    service_line_item = await latencies_ms(
+        lambda key: gradebook_service.get_results_for_line_item(key, limit=100), [li["sourcedId"] for li in line_items],
+        args.samples)
+    service_student = await latencies_ms(
+        lambda key: gradebook_service.get_results_for_student(key, limit=100), student_ids, args.samples)
+
+    # --- HTTP: bulk POSTs and reads through the router ---
+    reset_store()
+    app = FastAPI()
+    app.include_router(gradebook_router.router)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://gradebook") as client:
+        base = "/ims/oneroster/v1p1"
+        (await client.post(f"{base}/categories", content=json.dumps(categories))).raise_for_status()
+        for body in batches(line_items, args.batch):
+            (await client.post(f"{base}/lineItems", content=body)).raise_for_status()
+        start = time.perf_counter()
+        for body in bodies:
+            (await client.post(f"{base}/results", content=body)).raise_for_status()
+        http_ingest_s = time.perf_counter() - start
+
+        async def get(path: str) -> None:
+            (await client.get(path)).raise_for_status()
+        http_line_item = await latencies_ms(
+            lambda key: get(f"{base}/lineItems/{key}/results?limit=100"), [li["sourcedId"] for li in line_items],
+            args.samples)
+        http_student = await latencies_ms(
+            lambda key: get(f"{base}/students/{key}/results?limit=100"), student_ids, args.samples)
+
+    n = len(results)
+    print(f"{n} results ({len(line_items)} line items, {len(student_ids)} students, {len(bodies)} bulk requests "
+          f"of up to {args.batch})")
+    print(f"{'ingest stage':<44}{'seconds':>10}{'results/s':>14}")
+    for name, seconds in [
+        ("validate bulk JSON", validate_s),
+        ("append to result log", append_s),
+        ("validate + append", validate_s + append_s),
+        ("re-upsert all (append + compaction)", reupsert_s),
+        ("bulk POST /results over HTTP (ASGI)", http_ingest_s),
+    ]:
+        print(f"{name:<44}{seconds:>10.3f}{n / seconds:>14,.0f}")
+    print(f"result log after re-upsert: {stats}")
+    print(f"{'read (limit=100)':<44}{'p50 ms':>10}{'p99 ms':>14}")
+    for name, (p50, p99) in [
+        ("service: results for a line item", service_line_item),
+        ("service: results for a student", service_student),
+        ("HTTP: /lineItems/{id}/results", http_line_item),
+        ("HTTP: /students/{id}/results", http_student),
+    ]:
+        print(f"{name:<44}{p50:>10.3f}{p99:>14.3f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--classes", type=int, default=500)
+    parser.add_argument("--students-per-class", type=int, default=30)
+    parser.add_argument("--line-items-per-class", type=int, default=40)
+    parser.add_argument("--batch", type=int, default=5000, help="Results per bulk request")
+    parser.add_argument("--samples", type=int, default=2000, help="Read requests per latency row")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Cost of the OAuth2 bearer token check on the v1p1 routers.
+
+The same read (one page, limit 100, of /lineItems/{id}/results) is served by the gradebook
+router over an ASGI transport (no sockets) to --clients concurrent clients, each with its own
+token, three ways: without auth, with auth and the verified-token cache, and with auth but no
+cache (every request re-verifies the HS256 signature and decodes the claims). The token check
+itself is also timed on its own, cached and uncached.
+
+Run from the repo root:
+    python -m benchmarks.bench_oauth --clients 50 --requests-per-client 200
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from typing import List, Tuple
+import httpx
+from fastapi import FastAPI
+from app.models.gradebook_models import Category, LineItem, Result
+from app.routers import gradebook_router
+from app.services import gradebook_service, oauth
+from benchmarks.bench_gradebook import make_gradebook, reset_store
+
+BENCH_CLIENT_ID, BENCH_CLIENT_SECRET = "bench", "bench-secret"
+
+
+async def seed(classes: int) -> List[str]:
+    reset_store()
+    categories, line_items, results, _ = make_gradebook(classes, 30, 10)
+    await gradebook_service.upsert_categories(gradebook_router._bulk_adapters[Category].validate_json(json.dumps(categories)))
+    await gradebook_service.upsert_line_items(gradebook_router._bulk_adapters[LineItem].validate_json(json.dumps(line_items)))
+    await gradebook_service.upsert_results(gradebook_router._bulk_adapters[Result].validate_json(json.dumps(results)))
+    return [li["sourcedId"] for li in line_items]
+
+
+def issue_tokens(service: oauth.TokenService, count: int) -> List[str]:
+    return [service.issue(BENCH_CLIENT_ID, BENCH_CLIENT_SECRET, "gradebook.readonly")["access_token"]
+            for _ in range(count)]
+
+
+async def serve(client: httpx.AsyncClient, tokens: List[str], line_item_ids: List[str],
+                requests_per_client: int) -> Tuple[float, float, float]:
+    timings: List[float] = []
+
+    async def one_client(token: str) -> None:
+        headers = {"Authorization": f"Bearer {token}"}
+        for key in random.choices(line_item_ids, k=requests_per_client):
+            start = time.perf_counter()
+            (await client.get(f"/ims/oneroster/v1p1/lineItems/{key}/results?limit=100", headers=headers)).raise_for_status()
+            timings.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_client(token) for token in tokens))
+    elapsed = time.perf_counter() - start
+    timings.sort()
+    return len(timings) / elapsed, statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+def authorize_us(service: oauth.TokenService, tokens: List[str], samples: int) -> float:
+    start = time.perf_counter()
+    for token in random.choices(tokens, k=samples):
+        service.authorize(token)
+    return (time.perf_counter() - start) / samples * 1e6
+
+
+async def run(args: argparse.Namespace) -> None:
+    line_item_ids = await seed(args.classes)
+    clients = {BENCH_CLIENT_ID: oauth.OAuthClient(
+        BENCH_CLIENT_ID, oauth._secret_digest(BENCH_CLIENT_SECRET), frozenset(oauth.ALL_SCOPES))}
+    signer = oauth.TokenSigner(b"bench-signing-key")
+    cached = oauth.TokenService(clients, signer, oauth.TokenCache())
+    uncached = oauth.TokenService(clients, signer, oauth.TokenCache(max_entries=0))
+    tokens = issue_tokens(cached, args.clients)
+
+    app = FastAPI()
+    app.include_router(gradebook_router.router)
+    rows = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://oneroster") as client:
+        for name, enabled, service in [
+            ("no auth", False, cached),
+            ("bearer token, cached verification", True, cached),
+            ("bearer token, verified every request", True, uncached),
+        ]:
+            oauth.OAUTH_ENABLED, oauth.token_service = enabled, service
+            await serve(client, tokens, line_item_ids, max(1, args.requests_per_client // 10))  # Warm-up
+            rows.append((name, *await serve(client, tokens, line_item_ids, args.requests_per_client)))
+
+    print(f"{args.clients} concurrent clients x {args.requests_per_client} requests, "
+          f"GET /lineItems/{{id}}/results?limit=100 over HTTP (ASGI)")
+    print(f"{'auth':<40}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, throughput, p50, p99 in rows:
+        print(f"{name:<40}{throughput:>10,.0f}{p50:>10.3f}{p99:>10.3f}")
+    print(f"{'token check alone':<40}{'us/call':>10}")
+    for name, service in [("TokenService.authorize, cached", cached), ("TokenService.authorize, uncached", uncached)]:
+        print(f"{name:<40}{authorize_us(service, tokens, args.samples):>10.2f}")
+    print(f"cache: {cached.cache.stats()}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--classes", type=int, default=100)
+    parser.add_argument("--clients", type=int, default=50, help="Concurrent clients, one token each")
+    parser.add_argument("--requests-per-client", type=int, default=200)
+    parser.add_argument("--samples", type=int, default=100000, help="Calls per authorize micro-timing")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+# benchmarks/bench_sync_pipeline.py
+"""
+Records/second per sync pipeline stage, before and after the typed fast path.
+
+"Before" replays the old hand-off: connectors model_dump() every record, the processor
+re-parses users/courses and dumps them again, and ProcessedOneRosterData(...) validates
+every list once more. "After" hands the validated models straight through.
+Email matching uses a dict in both paths. The "after" merge also runs the SIS/LMS roster
+reconciliation (the LMS rosters mirror the SIS enrollments), which the old path never did.
+The re-merge/re-stamp rows are the steady state: a sync whose sources didn't change.
+The fetch rows read the generated data through the connectors: in-process function calls versus
+the mock routers over an ASGI transport (request routing plus JSON encode/decode, no sockets).
+The segment rows refresh one segment at a time (e.g. only the SIS roster), as the per-segment
+sync jobs do, and show which lists it replaced, the re-merge + re-stamp time and how many of the
+stamped records were reused as is (the merge stages that only depend on other segments are skipped).
+The parse rows compare peak memory of json.loads on the whole SIS students export with the
+streaming parser fed 64 KB chunks (what HttpTransport.iter_json_array does with the body).
+
+Run from the repo root:
+    python -m benchmarks.bench_sync_pipeline --students 50000
+"""
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+from app.connectors import sis_connector, lms_connector, source_transport
+from app.connectors.json_stream import JsonArrayParser
+from app.connectors.oneroster_processor import SOURCE_SEGMENTS, fetch_source_data, fetch_source_segment, merge_source_data
+from app.mock_systems import sis as mock_sis, lms as mock_lms
+from app.models.oneroster_models import ProcessedOneRosterData, User, Course
+from app.services.record_versions import RecordVersionStore
+
+
+def make_source_data(students: int, courses: int) -> Tuple[Dict[str, List[Dict]], Dict[str, List[Dict]]]:
+    sis_orgs = [
+        {"org_id": "DIST01", "org_name": "District", "org_type": "district"},
+        {"org_id": "SCH001", "org_name": "School", "org_type": "school", "parent_org_id": "DIST01"},
+    ]
+    sis_courses = [
+        {"course_code": f"C{c}", "course_title": f"Course {c} - Section A", "school_id": "SCH001", "section": "001"}
+        for c in range(courses)
+    ]
+    sis_students = [
+        {
+            "sis_student_id": f"S{i}", "first_name": f"First{i}", "last_name": f"Last{i}", "grade_level": "5",
+            "email_address": f"student{i}@example.edu",
+            "enrollments": [{"class_id": f"C{(i + k) % courses}", "section": "001"} for k in range(4)],
+        }
+        for i in range(students)
+    ]
+    sis_teachers = [
+        {
+            "sis_teacher_id": f"T{c}", "staff_first_name": f"Teach{c}", "staff_last_name": f"Er{c}",
+            "primary_email": f"teacher{c}@example.edu",
+            "assigned_classes": [{"class_id": f"C{c}", "section": "001", "role": "Primary"}],
+        }
+        for c in range(courses)
+    ]
+    lms_users = [
+        {"lms_username": f"student{i}", "full_name": f"First{i} Last{i}", "role": "student",
+         "email": f"student{i}@example.edu"}
+        for i in range(students)
+    ]
+    lms_users += [
+        {"lms_username": f"teacher{c}", "full_name": f"Teach{c} Er{c}", "role": "teacher",
+         "email": f"teacher{c}@example.edu"}
+        for c in range(courses)
+    ]
+    # LMS rosters mirror the SIS enrollments, so reconciliation sees a fully matched roster
+    rosters: List[List[str]] = [[] for _ in range(courses)]
+    for student in sis_students:
+        for enrollment in student["enrollments"]:
+            rosters[int(enrollment["class_id"][1:])].append(f"student{student['sis_student_id'][1:]}")
+    lms_courses = [
+        {"lms_course_id": f"LMS_C{c}", "course_name": f"Course {c}", "external_sis_course_id": f"C{c}",
+         "lms_teacher_username": f"teacher{c}", "student_usernames_enrolled": rosters[c]}
+        for c in range(courses)
+    ]
+    sis = {"orgs": sis_orgs, "courses": sis_courses, "students": sis_students, "teachers": sis_teachers}
+    lms = {"users": lms_users, "courses": lms_courses}
+    return sis, lms
+
+
+def transform_sources(sis: Dict[str, List[Dict]], lms: Dict[str, List[Dict]]) -> Dict[str, Dict[str, List[Any]]]:
+    """Source-boundary stage: strict validation of raw source records into models (same in both paths)."""
+    courses, classes = sis_connector.transform_sis_courses_and_classes(sis["courses"])
+    users, enrollments = sis_connector.transform_sis_users_and_enrollments(sis["students"], sis["teachers"], sis["courses"])
+    return {
+        "sis": {
+            "orgs": sis_connector.transform_sis_orgs(sis["orgs"]), "users": users, "courses": courses,
+            "classes": classes, "enrollments": enrollments,
+            "academicSessions": sis_connector.get_default_academic_sessions(),
+        },
+        "lms": {"users": lms_connector.transform_lms_users(lms["users"]),
+                "courses": lms_connector.transform_lms_courses(lms["courses"]),
+                "memberships": lms_connector.transform_lms_memberships(lms["courses"])},
+    }
+
+
+def legacy_handoff_and_merge(source_models: Dict[str, Dict[str, List[Any]]]) -> ProcessedOneRosterData:
+    """The previous hand-off: dump in the connectors, re-parse and re-validate in the processor."""
+    sis = {entity: [r.model_dump() for r in records] for entity, records in source_models["sis"].items()}
+    lms = {entity: [r.model_dump() for r in source_models["lms"][entity]] for entity in ("users", "courses")}
+    lms_users = [User(**u) for u in lms["users"]]
+    _ = [Course(**c) for c in lms["courses"]]
+    lms_by_email = {u.email.lower(): u for u in reversed(lms_users) if u.email}
+    final_users = []
+    for sis_user_dict in sis["users"]:
+        user = User(**sis_user_dict)
+        match = lms_by_email.get(user.email.lower()) if user.email else None
+        if match:
+            user.metadata = {**(user.metadata or {}), "lms_username": match.username, "lms_sourcedId": match.sourcedId}
+        final_users.append(user.model_dump())
+    return ProcessedOneRosterData(
+        orgs=sis["orgs"], users=final_users, courses=sis["courses"], classes=sis["classes"],
+        enrollments=sis["enrollments"], academicSessions=sis["academicSessions"],
+    )
+
+
+def install_mock_source_data(sis: Dict[str, List[Dict]], lms: Dict[str, List[Dict]]) -> None:
+    """Serves the generated data from the mock SIS/LMS, so fetches go through the real source paths."""
+    mock_sis.mock_sis_orgs_data, mock_sis.mock_sis_courses_data = sis["orgs"], sis["courses"]
+    mock_sis.mock_sis_students_data, mock_sis.mock_sis_teachers_data = sis["students"], sis["teachers"]
+    mock_lms.mock_lms_users_data, mock_lms.mock_lms_courses_data = lms["users"], lms["courses"]
+
+
+def fetch_and_transform(transport_factory: Callable[[str], source_transport.SourceTransport]) -> Any:
+    """Connector fetch + transform of both sources through the given transport."""
+    async def run():
+        for source in ("sis", "lms"):
+            source_transport.set_transport(source, transport_factory(source))
+        try:
+            return await fetch_source_data()
+        finally:
+            await source_transport.close_transports()
+    return asyncio.run(run())
+
+
+def refresh_segments(source_models: Dict[str, Dict[str, List[Any]]], store: RecordVersionStore,
+                     stamped: ProcessedOneRosterData) -> List[Tuple[str, List[str], float, int, int]]:
+    """Per segment: (name, lists replaced, re-merge + re-stamp seconds, records reused, records)."""
+    async def fetch(source: str, segment: str, current: Dict[str, List[Any]]) -> Dict[str, List[Any]]:
+        source_transport.set_transport(source, source_transport.InProcessTransport(source_transport._in_process_routes(source)))
+        try:
+            return await fetch_source_segment(source, segment, current)
+        finally:
+            await source_transport.close_transports()
+
+    rows = []
+    for source, segments in SOURCE_SEGMENTS.items():
+        for segment in segments:
+            fetched = asyncio.run(fetch(source, segment, source_models[source]))
+            source_models = {**source_models, source: {**source_models[source], **fetched}}
+            start = time.perf_counter()
+            data, _ = store.stamp(stamped, merge_source_data(source_models))
+            seconds = time.perf_counter() - start
+            previous = [r for entity in ("users", "enrollments", "classes", "courses") for r in getattr(stamped, entity)]
+            current = [r for entity in ("users", "enrollments", "classes", "courses") for r in getattr(data, entity)]
+            reused = len({id(r) for r in previous} & {id(r) for r in current})
+            rows.append((f"{source}.{segment}", sorted(fetched), seconds, reused, len(current)))
+            stamped = data
+    return rows
+
+
+def parse_peak_memory(body: bytes) -> Tuple[Tuple[float, int], Tuple[float, int]]:
+    """(seconds, peak bytes) of parsing a JSON array export buffered (json.loads) and streamed."""
+    def buffered() -> int:
+        return len(json.loads(body))
+
+    def streamed() -> int:
+        parser, count, chunk = JsonArrayParser(), 0, source_transport.STREAM_CHUNK_BYTES
+        for start in range(0, len(body), chunk):
+            count += len(parser.feed(body[start:start + chunk]))  # Each record dropped, as after a transform
+        return count + len(parser.close())
+
+    results = []
+    for parse in (buffered, streamed):
+        tracemalloc.start()
+        _, seconds = timed(parse)
+        results.append((seconds, tracemalloc.get_traced_memory()[1]))
+        tracemalloc.stop()
+    return results[0], results[1]
+
+
+def timed(fn: Callable[[], Any]) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=20000)
+    parser.add_argument("--courses", type=int, default=500)
+    args = parser.parse_args()
+
+    sis, lms = make_source_data(args.students, args.courses)
+    install_mock_source_data(sis, lms)
+    _, inprocess_s = timed(lambda: fetch_and_transform(
+        lambda source: source_transport.InProcessTransport(source_transport._in_process_routes(source))))
+    _, asgi_s = timed(lambda: fetch_and_transform(lambda source: source_transport.AsgiTransport()))
+    source_models, transform_s = timed(lambda: transform_sources(sis, lms))
+    record_count = sum(len(records) for source in source_models.values() for entity, records in source.items()
+                       if entity != "memberships")
+
+    legacy, before_s = timed(lambda: legacy_handoff_and_merge(source_models))
+    fast, after_s = timed(lambda: merge_source_data(source_models))
+    assert len(legacy.users) == len(fast.users) and len(legacy.enrollments) == len(fast.enrollments)
+    store = RecordVersionStore()
+    stamped, stamp_s = timed(lambda: store.stamp(None, fast))
+    # Steady state: the next sync sees unchanged sources and reuses the previous merge's records
+    remerged, remerge_s = timed(lambda: merge_source_data(source_models))
+    restamped, restamp_s = timed(lambda: store.stamp(stamped[0], remerged))
+    segment_rows = refresh_segments(source_models, store, restamped[0])
+
+    print(f"{record_count} records ({args.students} students, {args.courses} courses)")
+    print(f"{'stage':<48}{'seconds':>10}{'records/s':>14}")
+    rows = [
+        ("fetch + transform, in-process transport", inprocess_s),
+        ("fetch + transform, ASGI (HTTP+JSON) transport", asgi_s),
+        ("transform (source validation)", transform_s),
+        ("hand-off + merge, before", before_s),
+        ("hand-off + merge, after", after_s),
+        ("stamp content hashes (unchanged)", stamp_s),
+        ("full sync, before", transform_s + before_s + stamp_s),
+        ("full sync, after", transform_s + after_s + stamp_s),
+        ("re-merge, unchanged sources", remerge_s),
+        ("re-stamp, unchanged sources", restamp_s),
+    ]
+    for name, seconds in rows:
+        print(f"{name:<48}{seconds:>10.3f}{record_count / seconds:>14,.0f}")
+    print(f"{'segment refresh':<16}{'replaces':<40}{'merge+stamp s':>14}{'records reused':>22}")
+    for name, replaced, seconds, reused, total in segment_rows:
+        print(f"{name:<16}{', '.join(replaced):<40}{seconds:>14.3f}{f'{reused}/{total}':>22}")
+    students_body = json.dumps(sis["students"]).encode()
+    (buffered_s, buffered_peak), (streamed_s, streamed_peak) = parse_peak_memory(students_body)
+    print(f"parse {len(students_body) / 2**20:.1f} MB students export: json.loads {buffered_s:.3f}s, "
+          f"peak {buffered_peak / 2**20:.1f} MB; streaming {streamed_s:.3f}s, peak {streamed_peak / 2**20:.2f} MB")
+    print(f"hand-off + merge speedup: {before_s / after_s:.1f}x, "
+          f"full sync speedup: {(transform_s + before_s + stamp_s) / (transform_s + after_s + stamp_s):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
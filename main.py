@@ -1,14 +1,48 @@
 # main.py
-from fastapi import FastAPI
-from app.routers import mock_sis_router, mock_lms_router, oneroster_router # Keep existing custom_router
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from app.routers import mock_sis_router, mock_lms_router, oneroster_router, change_router, admin_router, gradebook_router, mock_consumer_router, oauth_router # Keep existing custom_router
 # Import the new standard router
 from app.routers.oneroster_router import oneroster_v1p1_router, custom_router # Import both routers
 from fastapi.middleware.cors import CORSMiddleware
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.admission import AdmissionControlMiddleware
+from app.services import oneroster_data_service, change_feed, gradebook_service
+from app.services.push_engine import engine as push_engine
+from app.services.sync_scheduler import scheduler as sync_scheduler
+from app.connectors import source_transport
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Serve the last persisted snapshot straight away and refresh it in the background,
+    # so the first request after a restart doesn't have to wait for a full sync.
+    oneroster_data_service.load_persisted_snapshot()
+    # The gradebook is pushed to us rather than synced: replay its journal before serving it
+    gradebook_service.load_persisted_gradebook()
+    # Source syncs run on their own schedule, never on the request path
+    oneroster_data_service.register_sync_jobs(sync_scheduler)
+    sync_scheduler.start()
+    # Applies change events pushed by the source systems between full syncs
+    ingest_task = asyncio.create_task(change_feed.run_ingest_worker(oneroster_data_service.apply_source_changes))
+    # Pushes snapshot changes to registered downstream consumers
+    push_task = asyncio.create_task(push_engine.run())
+    yield
+    sync_scheduler.stop()
+    ingest_task.cancel()
+    push_task.cancel()
+    await asyncio.gather(push_task, return_exceptions=True)  # Lets it save checkpoints and close its client
+    await source_transport.close_transports()
+    gradebook_service.close_gradebook_journal()
+
 
 app = FastAPI(
     title="OneRoster PoC Backend",
     description="Backend for simulating source systems and processing OneRoster data, including standard v1.1 API.",
     version="0.3.0", # Increment version
+    lifespan=lifespan,
 )
 
 # --- CORS Middleware (as before) ---
@@ -17,19 +51,46 @@ origins = [
     "http://localhost:8000", "http://localhost:8006", # Or your Uvicorn port
     "http://localhost:3000", "null",
 ]
-app.add_middleware(CORSMiddleware, allow_origins=origins, allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
+app.add_middleware(CORSMiddleware, allow_origins=origins, allow_credentials=True, allow_methods=["*"], allow_headers=["*"],
+                   expose_headers=["X-OneRoster-Generation"])  # Browser clients page with the generation token
 # --- End CORS Middleware ---
 
+# gzip (and br/zstd when installed) for large roster responses; see app/middleware/compression.py for settings
+app.add_middleware(CompressionMiddleware)
+
+# Bulkheads and per-client quotas for the read API (added last, so it runs first and sheds load
+# before any other work is done); see app/middleware/admission.py for settings
+app.add_middleware(AdmissionControlMiddleware)
+
+
+@app.exception_handler(oneroster_data_service.SnapshotUnavailableError)
+async def snapshot_unavailable_handler(request: Request, exc: oneroster_data_service.SnapshotUnavailableError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "5"})
+
 # Include mock system routers
 app.include_router(mock_sis_router.router)
 app.include_router(mock_lms_router.router)
+# Stand-in downstream app for the outbound push (register it with url .../mock/consumer/{name}/changes)
+app.include_router(mock_consumer_router.router)
 
 # Include your custom combined data endpoint router
 app.include_router(custom_router) # This was previously oneroster_router.router
 
+# OAuth2 client credentials token endpoint; the v1p1 routers below require its bearer tokens
+app.include_router(oauth_router.router)
+
 # Include the new standard OneRoster v1.1 API router
 app.include_router(oneroster_v1p1_router)
 
+# OneRoster v1.1 gradebook (categories, lineItems, results pushed by the LMS)
+app.include_router(gradebook_router.router)
+
+# Push-based change ingestion from sources and the SSE change feed for consumers
+app.include_router(change_router.router)
+
+# Admin endpoints (sync job status and manual triggers)
+app.include_router(admin_router.router)
+
 
 @app.get("/")
 async def root():
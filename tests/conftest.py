@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+import sys
+
+# The app is imported as the top-level "app" package, same as main.py and the benchmarks do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
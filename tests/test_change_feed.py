@@ -0,0 +1,44 @@
+# tests/test_change_feed.py
+from app.models.change_models import ChangeOperation
+from app.models.oneroster_models import User
+from app.services.change_feed import ChangeLog
+
+
+def _upsert(sourced_id):
+    user = User(sourcedId=sourced_id, username=sourced_id, givenName="Alex", familyName="Doe", role="student")
+    return "users", ChangeOperation.UPSERT, sourced_id, user
+
+
+def _delete(sourced_id):
+    return "users", ChangeOperation.DELETE, sourced_id, None
+
+
+def test_read_since_returns_the_changes_after_a_seq():
+    log = ChangeLog()
+    assert log.publish([_upsert("u1"), _upsert("u2")]) == 2
+    assert log.publish([_delete("u1")]) == 3
+    assert [(c.seq, c.sourcedId, c.operation) for c in log.read_since(1)] == [
+        (2, "u2", ChangeOperation.UPSERT), (3, "u1", ChangeOperation.DELETE)]
+    assert log.read_since(0)[0].record["sourcedId"] == "u1"
+    assert log.read_since(3) == []  # Up to date
+
+
+def test_evicted_changes_mean_a_full_resync():
+    log = ChangeLog(max_entries=3)
+    log.publish([_upsert(f"u{i}") for i in range(5)])  # seqs 1-5, only 3-5 kept
+    assert log.read_since(1) is None  # Seq 2 is gone
+    assert [c.seq for c in log.read_since(2)] == [3, 4, 5]  # Nothing missing between 2 and the oldest kept
+
+
+def test_seq_from_before_a_restart_is_rejected():
+    log = ChangeLog()
+    log.publish([_upsert("u1")])
+    assert log.read_since(7) is None  # Seqs start over with the process: 7 was issued by an earlier one
+    assert ChangeLog().read_since(1) is None
+    assert ChangeLog().read_since(0) == []
+
+
+def test_publishing_nothing_keeps_the_seq():
+    log = ChangeLog()
+    assert log.publish([]) == 0
+    assert log.last_seq == 0
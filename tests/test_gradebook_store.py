@@ -0,0 +1,121 @@
+# tests/test_gradebook_store.py
+import asyncio
+import pickle
+import pytest
+from app.models.gradebook_models import Category, LineItem, Result
+from app.services import gradebook_service
+from app.services.gradebook_store import GradebookJournal
+
+
+def _category(sourced_id="cat_hw"):
+    return Category(sourcedId=sourced_id, title="Homework")
+
+
+def _line_item(sourced_id="li_1", class_id="class_1"):
+    return LineItem(sourcedId=sourced_id, title="Assignment 1", assignDate="2024-09-01", dueDate="2024-09-08",
+                    classSourcedId=class_id, categorySourcedId="cat_hw")
+
+
+def _result(sourced_id, score, student="student_1", line_item="li_1"):
+    return Result(sourcedId=sourced_id, lineItemSourcedId=line_item, studentSourcedId=student,
+                  scoreStatus="fully graded", score=score, scoreDate="2024-09-10")
+
+
+def _restart():
+    """Drops the in-memory gradebook, as a new process would start with."""
+    gradebook_service.close_gradebook_journal()
+    gradebook_service._categories.clear()
+    gradebook_service._line_items.clear()
+    gradebook_service._line_items_by_class.clear()
+    gradebook_service._results = gradebook_service.ResultLog()
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    _restart()
+    yield str(tmp_path / "gradebook_log.pkl")
+    _restart()
+
+
+def test_append_and_read_back(log_path):
+    journal = GradebookJournal(log_path, fsync=False)
+    journal.append("categories", [_category()])
+    journal.append("results", [_result("r1", 1.0), _result("r2", 2.0)])
+    journal.close()
+
+    frames = list(GradebookJournal(log_path).replay())
+    assert [(kind, [r.sourcedId for r in records]) for kind, records in frames] == [
+        ("categories", ["cat_hw"]), ("results", ["r1", "r2"])]
+    assert frames[1][1][1].score == 2.0
+
+
+def test_torn_last_frame_is_cut_off(log_path):
+    journal = GradebookJournal(log_path, fsync=False)
+    journal.append("categories", [_category()])
+    journal.close()
+    with open(log_path, "ab") as f:
+        f.write(pickle.dumps(("categories", [_category("cat_exam")]))[:-10])  # Crash mid-write
+
+    journal = GradebookJournal(log_path, fsync=False)
+    assert [records[0].sourcedId for _, records in journal.replay()] == ["cat_hw"]
+    journal.append("categories", [_category("cat_quiz")])  # Lands right after the last good frame
+    journal.close()
+    assert [records[0].sourcedId for _, records in GradebookJournal(log_path).replay()] == ["cat_hw", "cat_quiz"]
+
+
+def test_unsupported_log_is_moved_aside(log_path):
+    with open(log_path, "wb") as f:
+        pickle.dump({"version": -1}, f)
+    assert list(GradebookJournal(log_path).replay()) == []
+    with open(f"{log_path}.unsupported", "rb") as f:
+        assert pickle.load(f) == {"version": -1}
+
+
+def test_writes_survive_a_restart(log_path):
+    gradebook_service.load_persisted_gradebook(GradebookJournal(log_path, fsync=False))
+
+    async def write():
+        await gradebook_service.upsert_categories([_category()])
+        await gradebook_service.upsert_line_items([_line_item()])
+        await gradebook_service.upsert_results([_result("r1", 1.0), _result("r2", 2.0, student="student_2")])
+        await gradebook_service.upsert_results([_result("r1", 9.0)])  # Regrade
+    asyncio.run(write())
+
+    _restart()
+    gradebook_service.load_persisted_gradebook(GradebookJournal(log_path, fsync=False))
+
+    async def read():
+        assert (await gradebook_service.get_category_by_id("cat_hw")).title == "Homework"
+        assert [li.sourcedId for li in await gradebook_service.get_line_items_for_class("class_1")] == ["li_1"]
+        assert (await gradebook_service.get_result_by_id("r1")).score == 9.0
+        assert [r.sourcedId for r in await gradebook_service.get_results_for_line_item("li_1")] == ["r2", "r1"]
+        assert [r.sourcedId for r in await gradebook_service.get_results_for_student("student_2")] == ["r2"]
+    asyncio.run(read())
+    assert gradebook_service.get_gradebook_stats()["resultLog"]["results"] == 2
+
+
+def test_rejected_write_is_not_journaled(log_path):
+    gradebook_service.load_persisted_gradebook(GradebookJournal(log_path, fsync=False))
+    with pytest.raises(gradebook_service.UnknownReferenceError):
+        asyncio.run(gradebook_service.upsert_results([_result("r1", 1.0, line_item="li_missing")]))
+    _restart()
+    assert list(GradebookJournal(log_path).replay()) == []
+
+
+def test_superseded_log_is_compacted_on_load(log_path, monkeypatch):
+    monkeypatch.setattr(gradebook_service, "COMPACT_MIN_DEAD_ROWS", 10)
+    gradebook_service.load_persisted_gradebook(GradebookJournal(log_path, fsync=False))
+
+    async def write():
+        await gradebook_service.upsert_categories([_category()])
+        await gradebook_service.upsert_line_items([_line_item()])
+        for score in range(20):
+            await gradebook_service.upsert_results([_result("r1", float(score))])
+    asyncio.run(write())
+
+    _restart()
+    gradebook_service.load_persisted_gradebook(GradebookJournal(log_path, fsync=False))
+    assert asyncio.run(gradebook_service.get_result_by_id("r1")).score == 19.0
+    _restart()
+    frames = list(GradebookJournal(log_path).replay())
+    assert sum(len(records) for _, records in frames) == 3
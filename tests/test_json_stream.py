@@ -0,0 +1,67 @@
+# tests/test_json_stream.py
+import json
+import pytest
+from app.connectors.json_stream import JsonArrayParser
+
+PAYLOAD = json.dumps([
+    1, -2.5, 1.5e3, -0.25e-2, 12345678901234567890, "plain", 'quote " and \\ backslash', "unicode é 中 🎉",
+    True, False, None, [], {}, {"nested": [1, {"deep": "x"}], "n": 3.75}, 0,
+], ensure_ascii=False).encode()
+
+
+def _parse(chunks):
+    parser = JsonArrayParser()
+    elements = []
+    for chunk in chunks:
+        elements += parser.feed(chunk)
+    return elements + parser.close()
+
+
+def test_every_two_chunk_split():
+    expected = json.loads(PAYLOAD)
+    for cut in range(len(PAYLOAD) + 1):
+        assert _parse([PAYLOAD[:cut], PAYLOAD[cut:]]) == expected, cut
+
+
+def test_one_byte_chunks():
+    # Numbers, strings and multi-byte characters all get split somewhere
+    assert _parse([PAYLOAD[i:i + 1] for i in range(len(PAYLOAD))]) == json.loads(PAYLOAD)
+
+
+@pytest.mark.parametrize("chunks, expected", [
+    ([b"[1", b"2]"], [12]),
+    ([b"[1.", b"5]"], [1.5]),
+    ([b"[1.5e", b"3]"], [1500.0]),
+    ([b"[-", b"7]"], [-7]),
+    ([b'["ab', b'c"]'], ["abc"]),
+    ([b'["a\\', b'"b"]'], ['a"b']),
+    ([b"[tr", b"ue,nu", b"ll]"], [True, None]),
+])
+def test_values_split_across_chunks(chunks, expected):
+    assert _parse(chunks) == expected
+
+
+def test_number_is_only_emitted_once_it_cannot_continue():
+    parser = JsonArrayParser()
+    assert parser.feed(b"[10") == []  # Could still be 100, 10.5 ...
+    assert parser.feed(b"0,") == [100]
+    assert parser.feed(b"7") == []
+    with pytest.raises(ValueError):
+        parser.close()  # The array never ended
+
+
+def test_whitespace_and_empty_array():
+    assert _parse([b" \n[ ", b" ]\n "]) == []
+    assert _parse([b"[ 1 ,", b"\t2 ]"]) == [1, 2]
+
+
+@pytest.mark.parametrize("body", [b"{}", b"[1 2]", b"[1,]]", b"[1] x", b"[,1]"])
+def test_malformed_arrays_raise(body):
+    with pytest.raises(ValueError):
+        _parse([body])
+
+
+def test_oversized_element_is_rejected():
+    parser = JsonArrayParser(max_element_bytes=16)
+    with pytest.raises(ValueError):
+        parser.feed(b'["' + b"x" * 64)
@@ -0,0 +1,112 @@
+# tests/test_oauth.py
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from app.routers import oauth_router
+from app.services import oauth
+
+LMS_SCOPES = (oauth.SCOPE_ROSTER_CORE, oauth.SCOPE_GRADEBOOK_WRITE)
+
+
+def _service(cache=None):
+    clients = {
+        "lms": oauth.OAuthClient("lms", oauth._secret_digest("lms-secret"), oauth.normalize_scopes(LMS_SCOPES)),
+        "ops": oauth.OAuthClient("ops", oauth._secret_digest("ops-secret"), frozenset(oauth.ALL_SCOPES)),
+    }
+    return oauth.TokenService(clients, oauth.TokenSigner(b"test-key"), cache or oauth.TokenCache())
+
+
+def test_issued_token_grants_the_requested_scopes():
+    service = _service()
+    token = service.issue("lms", "lms-secret", oauth.SCOPE_ROSTER_CORE)
+    assert token["scope"] == oauth.SCOPE_ROSTER_CORE
+    assert service.authorize(token["access_token"]) == {oauth.SCOPE_ROSTER_CORE}
+    everything = service.issue("lms", "lms-secret")  # No scope asked: all the client may have
+    assert service.authorize(everything["access_token"]) == set(LMS_SCOPES)
+
+
+def test_wrong_secret_and_ungranted_scope_are_refused():
+    service = _service()
+    with pytest.raises(oauth.InvalidClientError):
+        service.issue("lms", "wrong")
+    with pytest.raises(oauth.InvalidClientError):
+        service.issue("nobody", "lms-secret")
+    with pytest.raises(oauth.InvalidScopeError):
+        service.issue("lms", "lms-secret", oauth.SCOPE_ADMIN)
+
+
+def test_expired_token_is_rejected(monkeypatch):
+    service = _service()
+    monkeypatch.setattr(oauth, "TOKEN_TTL_SECONDS", -1)
+    token = service.issue("lms", "lms-secret")["access_token"]
+    with pytest.raises(oauth.InvalidTokenError, match="expired"):
+        service.authorize(token)
+    assert service.cache.stats()["entries"] == 0  # Never cached
+
+
+def test_tampered_or_foreign_token_is_rejected():
+    service = _service()
+    header, payload, signature = service.issue("lms", "lms-secret")["access_token"].split(".")
+    forged_payload = oauth._b64encode(oauth._b64decode(payload).replace(b"roster-core", b"roster"))
+    with pytest.raises(oauth.InvalidTokenError):
+        service.authorize(f"{header}.{forged_payload}.{signature}")
+    foreign = oauth.TokenService(service.clients, oauth.TokenSigner(b"other-key"), oauth.TokenCache())
+    with pytest.raises(oauth.InvalidTokenError):
+        service.authorize(foreign.issue("lms", "lms-secret")["access_token"])
+    with pytest.raises(oauth.InvalidTokenError):
+        service.authorize("not.a.jwt.at-all")
+
+
+def test_cache_serves_repeat_lookups_until_the_token_expires():
+    cache = oauth.TokenCache(ttl_seconds=300)
+    cache.put("t", frozenset({"s"}), expires_at=1_000.0, now=900.0)
+    assert cache.get("t", now=950.0) == {"s"}
+    assert cache.get("t", now=1_000.0) is None  # Token expiry comes before the cache TTL
+    assert cache.stats()["entries"] == 0
+    cache.put("t", frozenset({"s"}), expires_at=10_000.0, now=900.0)
+    assert cache.get("t", now=1_199.0) == {"s"}
+    assert cache.get("t", now=1_200.0) is None  # Cache TTL
+
+
+def test_cache_evicts_least_recently_used():
+    cache = oauth.TokenCache(max_entries=2)
+    for token in ("a", "b"):
+        cache.put(token, frozenset(), expires_at=100.0, now=0.0)
+    cache.get("a", now=1.0)
+    cache.put("c", frozenset(), expires_at=100.0, now=1.0)
+    assert [cache.get(t, now=2.0) is not None for t in ("a", "b", "c")] == [True, False, True]
+
+
+def test_authorize_verifies_once_then_hits_the_cache():
+    service = _service()
+    token = service.issue("lms", "lms-secret")["access_token"]
+    service.authorize(token)
+    service.authorize(token)
+    assert (service.cache.hits, service.cache.misses) == (1, 1)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(oauth, "OAUTH_ENABLED", True)
+    monkeypatch.setattr(oauth, "token_service", _service())
+    app = FastAPI()
+
+    @app.get("/admin-only", dependencies=[Depends(oauth_router.require_admin_scope)])
+    async def admin_only():
+        return {}
+
+    return TestClient(app)
+
+
+def _bearer(client_id, scope=None):
+    token = oauth.token_service.issue(client_id, f"{client_id}-secret", scope)["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_scope_checks_on_routes(client):
+    assert client.get("/admin-only").status_code == 401
+    assert client.get("/admin-only", headers={"Authorization": "Bearer garbage"}).status_code == 401
+    response = client.get("/admin-only", headers=_bearer("lms"))
+    assert response.status_code == 403
+    assert 'error="insufficient_scope"' in response.headers["www-authenticate"]
+    assert client.get("/admin-only", headers=_bearer("ops", oauth.SCOPE_ADMIN)).status_code == 200
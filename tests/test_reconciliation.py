@@ -0,0 +1,54 @@
+# tests/test_reconciliation.py
+from app.connectors.reconciliation import reconcile_lms_with_sis
+from app.models.oneroster_models import Class, Course, Enrollment
+
+
+def _course(code, prefix="sis"):
+    return Course(sourcedId=f"{prefix}_course_{code}", title=code, courseCode=code)
+
+
+def _class(code, section):
+    return Class(sourcedId=f"sis_class_{code}_{section}", title=f"{code}-{section}", classType="scheduled",
+                 courseSourcedId=f"sis_course_{code}", schoolSourcedId="sis_org_SCH001")
+
+
+def _enrollment(user, code, section, role="student"):
+    return Enrollment(sourcedId=f"sis_enr_{user}_{code}_{section}", userSourcedId=f"sis_user_{user}",
+                      classSourcedId=f"sis_class_{code}_{section}", schoolSourcedId="sis_org_SCH001", role=role)
+
+
+def _membership(username, code, role="student"):
+    return {"lmsCourseId": f"LMS_{code}", "lmsCourseSourcedId": f"lms_course_{code}", "lmsUsername": username,
+            "lmsUserSourcedId": f"lms_user_{username}", "role": role}
+
+
+SIS_COURSES, SIS_CLASSES, LMS_COURSES = [_course("SCI5")], [_class("SCI5", "001")], [_course("SCI5", prefix="lms")]
+USER_MATCHES = {"lms_user_bob": "sis_user_S1002", "lms_user_alice": "sis_user_S1001"}
+
+
+def _reconcile(enrollments, memberships, previous=None):
+    return reconcile_lms_with_sis(SIS_COURSES, SIS_CLASSES, enrollments, LMS_COURSES, memberships, USER_MATCHES,
+                                  previous=previous)
+
+
+def test_membership_is_not_merged_into_another_section_of_the_course():
+    # The SIS has Bob in section 002, which it has no class record for
+    _, _, enrollments, report, _ = _reconcile([_enrollment("S1002", "SCI5", "002")], [_membership("bob", "SCI5")])
+    assert [e.sourcedId for e in enrollments] == ["sis_enr_S1002_SCI5_002"]
+    assert report["lmsOnlyEnrollments"] == 0
+    assert report["matchedEnrollments"] == 1
+
+
+def test_membership_without_sis_enrollment_in_the_course_is_merged():
+    _, _, enrollments, report, _ = _reconcile([], [_membership("alice", "SCI5")])
+    assert [(e.userSourcedId, e.classSourcedId) for e in enrollments] == [("sis_user_S1001", "sis_class_SCI5_001")]
+    assert report["lmsOnlyEnrollments"] == 1
+
+
+def test_unchanged_inputs_get_the_previous_records_back():
+    sis_enrollments, memberships = [], [_membership("alice", "SCI5")]
+    courses, classes, enrollments, _, records = _reconcile(sis_enrollments, memberships)
+    again = _reconcile(sis_enrollments, memberships, previous=records)
+    assert again[0][0] is courses[0] and again[1][0] is classes[0] and again[2][0] is enrollments[0]
+    fresh = _reconcile(sis_enrollments, memberships)  # Without the previous run's records: new copies
+    assert fresh[1][0] is not classes[0]
@@ -0,0 +1,60 @@
+# tests/test_record_versions.py
+from app.models.change_models import ChangeOperation
+from app.models.oneroster_models import ProcessedOneRosterData, StatusType, User
+from app.services.record_versions import RecordVersionStore
+
+
+def _user(sourced_id, given_name="Alex"):
+    return User(sourcedId=sourced_id, username=sourced_id.lower(), givenName=given_name, familyName="Doe",
+                role="student", dateLastModified="2024-01-01T00:00:00Z")
+
+
+def _snapshot(*users):
+    return ProcessedOneRosterData.model_construct(users=list(users))
+
+
+def test_stamping_does_not_modify_merged_records():
+    store = RecordVersionStore()
+    original = _user("S1")
+    first, changes = store.stamp(None, _snapshot(original))
+    assert original.dateLastModified == "2024-01-01T00:00:00Z"
+    assert first.users[0] is not original
+    assert first.users[0].dateLastModified != original.dateLastModified
+    assert [(c[0], c[1], c[2]) for c in changes] == [("users", ChangeOperation.UPSERT, "S1")]
+
+
+def test_same_merged_object_keeps_its_stamped_copy():
+    store = RecordVersionStore()
+    unchanged, edited = _user("S1"), _user("S2")
+    first, _ = store.stamp(None, _snapshot(unchanged, edited))
+    second, changes = store.stamp(first, _snapshot(unchanged, _user("S2", given_name="Sam")))
+    assert second.users[0] is first.users[0]  # Shared with the older generation, not stamped again
+    assert second.users[1].dateLastModified > first.users[1].dateLastModified
+    assert first.users[1].givenName == "Alex"  # The older generation's record is untouched
+    assert [c[2] for c in changes] == ["S2"]
+
+
+def test_refetched_unchanged_record_keeps_its_stamp():
+    store = RecordVersionStore()
+    first, _ = store.stamp(None, _snapshot(_user("S1")))
+    second, changes = store.stamp(first, _snapshot(_user("S1")))  # New object, same content
+    assert second.users[0].dateLastModified == first.users[0].dateLastModified
+    assert changes == []
+
+
+def test_removed_record_becomes_a_tombstone():
+    store = RecordVersionStore()
+    first, _ = store.stamp(None, _snapshot(_user("S1")))
+    second, changes = store.stamp(first, _snapshot())
+    assert second.users[0].status == StatusType.TOBEDELETED
+    assert first.users[0].status == StatusType.ACTIVE
+    assert [(c[1], c[2]) for c in changes] == [(ChangeOperation.DELETE, "S1")]
+
+
+def test_unchanged_list_is_carried_over():
+    store = RecordVersionStore()
+    first, _ = store.stamp(None, _snapshot(_user("S1"), _user("S2")))
+    merged = _snapshot(*first.users)  # e.g. a merge stage that reused its previous output
+    second, changes = store.stamp(first, merged)
+    assert second.users is first.users
+    assert changes == []
@@ -0,0 +1,58 @@
+# tests/test_search_index.py
+import random
+from app.models.change_models import ChangeOperation
+from app.models.oneroster_models import ProcessedOneRosterData, StatusType, User
+from app.services.search_index import SearchIndexer, _rank
+
+NAMES = ["alice", "alina", "bob", "bobby", "carol", "smith", "smythe", "jones", "jonas", "malice"]
+
+
+def _user(i, given, family, status=StatusType.ACTIVE):
+    return User(sourcedId=f"u{i}", username=f"{given}{i}", givenName=given, familyName=family, role="student",
+                status=status)
+
+
+def _data(users, classes=()):
+    return ProcessedOneRosterData.model_construct(users=users, classes=classes, courses=[])
+
+
+def _ranked(index, query, limit):
+    # Records tied on the same matched word may come in any order: compare what decides the rank
+    results = index.search(query, limit)
+    driver = index.base.plan(query)[0]
+    return [_rank(index.base.record_words(r), driver) for r in results], {r.sourcedId for r in results}
+
+
+def test_updated_index_answers_like_a_fresh_build():
+    rng = random.Random(7)
+    users = [_user(i, rng.choice(NAMES), rng.choice(NAMES)) for i in range(200)]
+    indexer = SearchIndexer(overlay_max_records=10_000)
+    indexes = indexer.update(_data(users), (), None)
+    for _ in range(5):  # Several snapshots, each changing a few users
+        users = list(users)
+        changes = []
+        for i in rng.sample(range(len(users)), 15):
+            if rng.random() < 0.3:
+                users[i] = _user(i, users[i].givenName, users[i].familyName, status=StatusType.TOBEDELETED)
+                changes.append(("users", ChangeOperation.DELETE, users[i].sourcedId, None))
+            else:
+                users[i] = _user(i, rng.choice(NAMES), rng.choice(NAMES))
+                changes.append(("users", ChangeOperation.UPSERT, users[i].sourcedId, users[i]))
+        indexes = indexer.update(_data(users), changes, indexes)
+        fresh = SearchIndexer().update(_data(users), (), None)
+        for query in ["ali", "bob", "smith", "lic", "jon s", "mal", "a"]:
+            assert _ranked(indexes["users"], query, 10)[0] == _ranked(fresh["users"], query, 10)[0], query
+            assert _ranked(indexes["users"], query, 1000) == _ranked(fresh["users"], query, 1000), query
+    assert indexer.builds == 3  # users, classes, courses once; every later snapshot was an update
+
+
+def test_too_many_changes_rebuild_the_index():
+    users, classes = [_user(i, "alice", "smith") for i in range(5)], []
+    indexer = SearchIndexer(overlay_max_records=2)
+    indexes = indexer.update(_data(users, classes), (), None)
+    renamed = [_user(i, "bob", "smith") for i in range(5)]
+    changes = [("users", ChangeOperation.UPSERT, u.sourcedId, u) for u in renamed]
+    updated = indexer.update(_data(renamed, classes), changes, indexes)
+    assert updated["users"].changed == {}
+    assert [u.givenName for u in updated["users"].search("bob")] == ["bob"] * 5
+    assert updated["classes"] is indexes["classes"]  # Same (empty) list: index carried over
@@ -0,0 +1,122 @@
+# tests/test_snapshot_generations.py
+import asyncio
+import pytest
+from fastapi import HTTPException
+from app.models.oneroster_models import ProcessedOneRosterData, User
+from app.routers import oneroster_router
+from app.services import oneroster_data_service
+from app.services.snapshot_generations import (
+    GenerationExpiredError, GenerationStore, _list_delta,
+)
+
+
+def _user(sourced_id):
+    return User(sourcedId=sourced_id, username=sourced_id, givenName="Alex", familyName="Doe", role="student")
+
+
+def _data(users):
+    return ProcessedOneRosterData.model_construct(
+        orgs=[], users=users, courses=[], classes=[], enrollments=[], academicSessions=[])
+
+
+def _ids(records):
+    return {id(r) for r in records}
+
+
+# --- _list_delta ---
+
+def test_list_delta_of_shared_records():
+    records = [_user(f"u{i}") for i in range(3000)]  # Spans several walk blocks
+    assert _list_delta(records, list(records)) == (set(), set())
+
+
+def test_list_delta_finds_replaced_inserted_and_removed_records():
+    old = [_user(f"u{i}") for i in range(100)]
+    new = list(old)
+    new[10] = _user("u10")  # Replaced (e.g. edited)
+    del new[50]  # Removed
+    new.insert(70, _user("new"))  # Inserted
+    new.append(_user("last"))
+    departed, arrived = _list_delta(old, new)
+    assert departed == _ids([old[10], old[50]])
+    assert arrived == _ids([new[10], new[70], new[-1]])
+
+
+def test_list_delta_moved_record_is_not_a_change():
+    old = [_user(f"u{i}") for i in range(100)]
+    new = list(old)
+    new.insert(80, new.pop(5))  # Moved towards the end
+    new.insert(2, new.pop(60))  # Moved towards the start
+    assert _list_delta(old, new) == (set(), set())
+
+
+def test_list_delta_gives_up_on_a_refetched_list():
+    old = [_user(f"u{i}") for i in range(100)]
+    assert _list_delta(old, [_user(f"u{i}") for i in range(100)]) is None
+
+
+# --- Generation retention ---
+
+def test_old_generation_is_charged_for_the_records_it_alone_keeps():
+    store = GenerationStore()
+    users = [_user(f"u{i}") for i in range(40)]
+    first = store.publish(_data(users))
+    first.touch()
+    second_users = list(users)
+    second_users[0], second_users[1] = _user("u0"), _user("u1")
+    second = store.publish(_data(second_users))
+    second.touch()
+    assert first.unique_records == {"users": 2}
+    third_users = list(second_users)
+    third_users[0], third_users[2] = _user("u0"), _user("u2")
+    store.publish(_data(third_users))
+    assert first.unique_records == {"users": 3}  # u0, u1 of the first, and u2 it shared with the second
+    assert second.unique_records == {"users": 2}  # Its u0, and u2
+    assert store.stats()["retainedBytes"] == 5 * store._record_bytes["users"]
+
+
+def test_generations_beyond_the_memory_budget_are_evicted():
+    store = GenerationStore(memory_budget_bytes=1)
+    first = store.publish(_data([_user("u0")]))
+    first.touch()
+    store.publish(_data([_user("u0")]))  # The first now alone holds its u0: over budget
+    with pytest.raises(GenerationExpiredError):
+        store.resolve(first.token)
+    assert store.stats()["expiredTokenLookups"] == 1
+
+
+def test_untouched_generation_is_not_retained():
+    store = GenerationStore()
+    users = [_user("u0")]
+    first = store.publish(_data(users))
+    store.publish(_data(users))
+    with pytest.raises(GenerationExpiredError):
+        store.resolve(first.token)
+
+
+def test_generation_sharing_every_record_costs_nothing():
+    store = GenerationStore(memory_budget_bytes=1)
+    users = [_user("u0")]
+    first = store.publish(_data(users))
+    first.touch()
+    store.publish(_data(users))
+    assert store.resolve(first.token) is first
+
+
+# --- Token responses ---
+
+def _resolve(token):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(oneroster_router._resolve_generation(token))
+    return error.value.status_code
+
+
+def test_expired_and_malformed_tokens_map_to_410_and_400(monkeypatch):
+    store = GenerationStore(max_retained=0)
+    monkeypatch.setattr(oneroster_data_service, "_generations", store)
+    first = store.publish(_data([_user("u0")]))
+    first.touch()
+    store.publish(_data([_user("u0")]))
+    assert _resolve(first.token) == 410
+    assert _resolve("not-a-token") == 400
+    assert _resolve(f"deadbeef-{first.number}") == 400  # Issued by another server process
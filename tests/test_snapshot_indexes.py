@@ -0,0 +1,89 @@
+# tests/test_snapshot_indexes.py
+import random
+from datetime import date
+import pytest
+from app.models.oneroster_models import AcademicSession, Class, Enrollment, ProcessedOneRosterData
+from app.services.snapshot_indexes import OPEN_END, OPEN_START, IntervalIndex, SnapshotIndexes
+
+GROUPINGS = (("enrollments", "classSourcedId"), ("classes", "termSourcedIds"))
+
+
+def _class(sourced_id, terms=("term_fall",)):
+    return Class(sourcedId=sourced_id, title=sourced_id, classType="scheduled", courseSourcedId="course_1",
+                 schoolSourcedId="school_1", termSourcedIds=list(terms))
+
+
+def _enrollment(sourced_id, class_id, begin=None, end=None):
+    return Enrollment(sourcedId=sourced_id, userSourcedId=f"user_{sourced_id}", classSourcedId=class_id,
+                      schoolSourcedId="school_1", role="student", beginDate=begin, endDate=end)
+
+
+def _session(sourced_id, start, end):
+    return AcademicSession(sourcedId=sourced_id, title=sourced_id, startDate=start, endDate=end, type="term")
+
+
+def _data(**lists):
+    return ProcessedOneRosterData.model_construct(**{
+        "orgs": [], "users": [], "courses": [], "classes": [], "enrollments": [], "academicSessions": [], **lists})
+
+
+def test_prebuild_builds_ids_and_groupings():
+    data = _data(classes=[_class("c1"), _class("c2", terms=("term_fall", "term_spring"))],
+                 enrollments=[_enrollment("e1", "c1"), _enrollment("e2", "c2"), _enrollment("e3", "c1")])
+    indexes = SnapshotIndexes(data).prebuild(GROUPINGS)
+    assert set(indexes._by_id) == {"orgs", "users", "courses", "classes", "enrollments", "academicSessions"}
+    assert set(indexes._grouped) == set(GROUPINGS)
+    assert indexes.by_id("classes")["c2"] is data.classes[1]
+    assert [e.sourcedId for e in indexes.grouped_by("enrollments", "classSourcedId")["c1"]] == ["e1", "e3"]
+    assert [c.sourcedId for c in indexes.classes_for_term("term_spring")] == ["c2"]
+
+
+def test_prebuild_reuses_indexes_of_shared_lists():
+    classes = [_class("c1")]
+    previous = SnapshotIndexes(_data(classes=classes, enrollments=[_enrollment("e1", "c1")])).prebuild(GROUPINGS)
+    current = SnapshotIndexes(_data(classes=classes, enrollments=[_enrollment("e2", "c1")])).prebuild(GROUPINGS, previous)
+    assert current.by_id("classes") is previous.by_id("classes")
+    assert current.grouped_by("classes", "termSourcedIds") is previous.grouped_by("classes", "termSourcedIds")
+    assert current.by_id("enrollments") is not previous.by_id("enrollments")
+    assert list(current.by_id("enrollments")) == ["e2"]
+
+
+# --- activeOn ---
+
+def test_interval_index_matches_a_scan():
+    rng = random.Random(3)
+    days = [f"2024-{m:02d}-{d:02d}" for m in range(1, 13) for d in (1, 10, 20)]
+    intervals = [tuple(sorted(rng.sample(days, 2))) for _ in range(300)] + [(OPEN_START, days[5]), (days[30], OPEN_END)]
+    groups = {}
+    for position, interval in enumerate(intervals):
+        groups.setdefault(interval, []).append(position)
+    index = IntervalIndex(groups)
+    for day in days + ["2023-12-31", "2025-01-01", "2024-06-15"]:
+        assert sorted(index.stab(day)) == [p for p, (start, end) in enumerate(intervals) if start <= day <= end], day
+
+
+def test_active_on_uses_terms_and_enrollment_dates():
+    data = _data(
+        academicSessions=[_session("term_fall", "2024-08-15", "2024-12-20"),
+                          _session("term_spring", "2025-01-06", "2025-06-01"),
+                          _session("year", "2024-08-15", "TBD")],  # Unparseable end: open-ended
+        classes=[_class("fall"), _class("both", terms=("term_fall", "term_spring")),
+                 _class("no_terms", terms=())],
+        enrollments=[_enrollment("e_fall", "fall"), _enrollment("e_late", "fall", begin="2024-10-01"),
+                     _enrollment("e_dropped", "both", end="2024-09-30T12:00:00Z"),
+                     _enrollment("e_bad_date", "fall", begin="not a date"),
+                     _enrollment("e_dangling", "missing_class")])
+    indexes = SnapshotIndexes(data)
+
+    def active(entity_type, day):
+        return [r.sourcedId for r in indexes.active_on(entity_type, date.fromisoformat(day))]
+
+    assert active("academicSessions", "2024-12-20") == ["term_fall", "year"]  # End date is inclusive
+    assert active("academicSessions", "2030-01-01") == ["year"]
+    assert active("classes", "2025-02-01") == ["both", "no_terms"]  # Spans its terms; no terms, always
+    assert active("classes", "2024-12-31") == ["both", "no_terms"]  # Between terms, inside the span
+    assert active("enrollments", "2024-09-01") == ["e_fall", "e_dropped", "e_bad_date", "e_dangling"]
+    assert active("enrollments", "2024-11-01") == ["e_fall", "e_late", "e_bad_date", "e_dangling"]
+    assert active("enrollments", "2024-08-01") == ["e_dangling"]  # Before the fall term
+    with pytest.raises(ValueError):
+        indexes.active_on("users", date(2024, 9, 1))